@@ -3,10 +3,10 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
 
 from app.core.database import get_db
 from app.core.config import settings
+from app.core import sql_profiler
 from app.schemas.user import TokenData
 from app.crud import crud_user
 from app.models.user import User
@@ -24,6 +24,9 @@ def get_current_user(
     Decodes the token, validates its signature and expiration,
     and fetches the corresponding user from the database.
     """
+    # Imported here so python-jose stays off the startup path
+    from jose import jwt, JWTError
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -43,6 +46,6 @@ def get_current_user(
     user = crud_user.get_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
-    
 
+    sql_profiler.mark_caller(user)
     return user
\ No newline at end of file
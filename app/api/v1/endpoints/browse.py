@@ -6,9 +6,9 @@ from uuid import UUID
 from app.core.database import get_db
 from app.api.v1 import deps
 from app.models.user import User as UserModel
-from app.models.folder import Folder
-from app.models.file import File
+from app.crud import crud_folder
 from app.schemas.browse import BrowseResponse
+from app.schemas.folder import Folder as FolderSchema
 
 router = APIRouter()
 
@@ -27,18 +27,16 @@ def browse_content(
     """
     if folder_id:
         # Get a specific folder's content
-        folder = db.query(Folder).filter(Folder.id == folder_id, Folder.owner_id == current_user.id).first()
+        folder = crud_folder.get_folder(db, folder_id=folder_id, owner_id=current_user.id)
         if not folder:
             raise HTTPException(status_code=404, detail="Folder not found or you don't have permission to access it.")
         
-        # Manually load files and subfolders for the response model
-        folder.files = db.query(File).filter(File.parent_folder_id == folder_id).all()
-        folder.subfolders = db.query(Folder).filter(Folder.parent_folder_id == folder_id).all()
-        return folder
+        # Load files and subfolders for the response model, skipping trashed items
+        subfolders, files = crud_folder.get_folder_contents(db, folder_id=folder_id, owner_id=current_user.id)
+        return {**FolderSchema.model_validate(folder).model_dump(), "files": files, "subfolders": subfolders}
     else:
         # Get root content (items with no parent folder)
-        root_folders = db.query(Folder).filter(Folder.owner_id == current_user.id, Folder.parent_folder_id == None).all()
-        root_files = db.query(File).filter(File.owner_id == current_user.id, File.parent_folder_id == None).all()
+        root_folders, root_files = crud_folder.get_folder_contents(db, folder_id=None, owner_id=current_user.id)
         
         # Construct a "virtual" root folder to hold the response
         root_node = {
@@ -6,6 +6,8 @@ from app.models.user import User as UserModel
 from app.core.database import get_db
 from app.api.v1 import deps
 from app.crud import crud_bulk
+from app.services.storage_service import BaseStorageService, get_storage_service
+from app.services import public_links
 
 router = APIRouter()
 
@@ -17,11 +19,13 @@ def bulk_delete_items(
     current_user: UserModel = Depends(deps.get_current_user)
 ):
     """
-    Perform a bulk delete of files and folders.
+    Perform a bulk delete of files and folders. Deleted items go to the trash.
     """
     if not bulk_in.file_ids and not bulk_in.folder_ids:
         raise HTTPException(status_code=400, detail="No file or folder IDs provided.")
     result = crud_bulk.bulk_delete(db=db, bulk_in=bulk_in, owner_id=current_user.id)
+    for file_id in bulk_in.file_ids:
+        public_links.invalidate_public_file(file_id)
     return {"message": "Bulk delete operation completed.", **result}
 
 @router.post("/move", response_model=BulkOperationResponse)
@@ -36,6 +40,8 @@ def bulk_move_items(
     """
     if not bulk_in.file_ids and not bulk_in.folder_ids:
         raise HTTPException(status_code=400, detail="No file or folder IDs provided.")
+    if crud_bulk.target_inside_selection(db, bulk_in=bulk_in, owner_id=current_user.id):
+        raise HTTPException(status_code=400, detail="Cannot move a folder into itself or one of its subfolders.")
     result = crud_bulk.bulk_move(db=db, bulk_in=bulk_in, owner_id=current_user.id)
     if result is None:
         raise HTTPException(status_code=404, detail="Target folder not found or access denied.")
@@ -47,7 +53,8 @@ def bulk_copy_items(
     *,
     db: Session = Depends(get_db),
     bulk_in: BulkCopyRequest,
-    current_user: UserModel = Depends(deps.get_current_user)
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
 ):
     """
     Perform a bulk copy of files and folders.
@@ -55,9 +62,10 @@ def bulk_copy_items(
     if not bulk_in.file_ids and not bulk_in.folder_ids:
         raise HTTPException(status_code=400, detail="No file or folder IDs provided.")
 
-    # TODO: Add validation to prevent copying a folder into itself or a subfolder.
+    if crud_bulk.target_inside_selection(db, bulk_in=bulk_in, owner_id=current_user.id):
+        raise HTTPException(status_code=400, detail="Cannot copy a folder into itself or one of its subfolders.")
 
-    result = crud_bulk.bulk_copy(db=db, bulk_in=bulk_in, owner=current_user)
+    result = crud_bulk.bulk_copy(db=db, bulk_in=bulk_in, owner=current_user, storage_service=storage_service)
     if result is None:
         raise HTTPException(status_code=404, detail="Target folder not found or access denied.")
 
@@ -1,10 +1,16 @@
+import base64
 import hashlib
+import mimetypes
 import uuid
+from bisect import bisect_right
+from itertools import accumulate
+from urllib.parse import quote
 from pathlib import Path
-from fastapi import APIRouter, Depends, UploadFile, File as FastAPIFile, Form, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, UploadFile, File as FastAPIFile, Form, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from app.schemas.permission import PermissionCreate, Permission
+from app.schemas.permission import PermissionCreate, Permission, SharedFileListResponse
 from app.crud import crud_permission
 from uuid import UUID
 from app.schemas.file import File as FileSchema
@@ -12,27 +18,37 @@ from app.models.user import User as UserModel
 from app.core.database import get_db
 from app.api.v1 import deps
 from app.crud import crud_file, crud_folder
-from app.schemas.file import FileCreate, FileUpdate, FileMove
+from app.schemas.file import FileCreate, FileUpdate, FileMove, FileBatchCreateRequest, FileBatchCreateResponse
 from app.services.storage_service import get_storage_service, BaseStorageService
+from app.services.upload_service import split_relative_path, store_uploads
 from app.schemas.upload import (
     UploadSessionInitiateRequest,
     UploadSessionInitiateResponse,
     UploadChunkResponse,
 )
-from app.crud import crud_upload_session
+from app.crud import crud_upload_session, crud_quota, crud_search, crud_extraction, crud_delta
+from app.schemas.extraction import ExtractionJob, FileUploadResponse
+from app.services import delta_service, extraction_service, public_links
+from app.schemas.delta import DeltaParams, DeltaUploadInitiateRequest, DeltaUploadInitiateResponse
+from app.schemas.search import SearchResponse
 from app.core.config import settings
+from app.core.http_cache import file_etag, is_not_modified, not_modified, validator_headers
 # File: app/api/v1/endpoints/files.py
 router = APIRouter()
 
-@router.post("/upload", response_model=FileSchema, status_code=status.HTTP_201_CREATED)
+@router.post("/upload", response_model=FileUploadResponse, status_code=status.HTTP_201_CREATED)
 def upload_file(
     *,
     db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
     parent_folder_id: uuid.UUID | None = Form(None),
+    extract: bool = Form(False),
     file: UploadFile = FastAPIFile(...),
     current_user: UserModel = Depends(deps.get_current_user),
     storage_service: BaseStorageService = Depends(get_storage_service)
 ):
+    if extract and not extraction_service.archive_format(file.filename):
+        raise HTTPException(status_code=400, detail="Only zip and tar archives can be extracted.")
     if parent_folder_id:
         parent_folder = crud_folder.get_folder(db, folder_id=parent_folder_id, owner_id=current_user.id)
         if not parent_folder:
@@ -42,10 +58,16 @@ def upload_file(
     file_size = len(file_content)
     file.file.seek(0)
     
-    if current_user.used_storage + file_size > current_user.storage_quota:
+    reservation_id = crud_quota.reserve(db, user_id=current_user.id, size=file_size)
+    if not reservation_id:
         raise HTTPException(status_code=400, detail="Insufficient storage quota.")
 
-    saved_path, saved_filename = storage_service.save(file=file, user_id=str(current_user.id))
+    try:
+        saved_path, saved_filename = storage_service.save(file=file, user_id=str(current_user.id))
+    except Exception:
+        crud_quota.release(db, reservation_id=reservation_id)
+        db.commit()
+        raise
     
     file_hash = hashlib.sha256(file_content).hexdigest()
     
@@ -59,13 +81,260 @@ def upload_file(
         owner_id=current_user.id,
         parent_folder_id=parent_folder_id
     )
-    db_file = crud_file.create_file(db=db, file_in=file_in)
-    return db_file
+    try:
+        # Releases the reservation itself if the record can't be created
+        db_file = crud_file.create_file(db=db, file_in=file_in, reservation_id=reservation_id)
+    except Exception:
+        storage_service.delete(saved_path)
+        raise
+    return _with_extraction(db, background_tasks, db_file, extract)
+
+def _with_extraction(db: Session, background_tasks: BackgroundTasks, db_file, extract: bool) -> dict:
+    """Queues the expansion of an uploaded archive if asked to, and builds the upload response."""
+    job = None
+    if extract:
+        job = crud_extraction.create_job(db, source_file=db_file)
+        background_tasks.add_task(extraction_service.run_extraction, job.id)
+    return {**FileSchema.model_validate(db_file).model_dump(), "extraction_job_id": job.id if job else None}
+
+@router.post("/upload/multi", response_model=FileBatchCreateResponse, status_code=status.HTTP_201_CREATED)
+async def upload_files(
+    *,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Upload many files in one multipart request.
+
+    Form fields: `files` (repeated), an optional `paths` per file giving its
+    path relative to `parent_folder_id` (e.g. `photos/2024/a.jpg`; missing
+    folders are created), and an optional `parent_folder_id`. Files are
+    written to storage in parallel and all records are created in one
+    transaction. Per-file failures are reported by index.
+    """
+    # Parsed here rather than through File(...) params to lift Starlette's
+    # default limit of 1000 files per request.
+    form = await request.form(
+        max_files=settings.MULTI_UPLOAD_MAX_FILES,
+        max_fields=settings.MULTI_UPLOAD_MAX_FILES + 10
+    )
+    try:
+        uploads = [part for part in form.getlist("files") if not isinstance(part, str)]
+        paths = form.getlist("paths")
+        parent_folder_id = form.get("parent_folder_id") or None
+        if not uploads:
+            raise HTTPException(status_code=400, detail="No files provided.")
+        if paths and len(paths) != len(uploads):
+            raise HTTPException(status_code=400, detail="Provide exactly one path per file.")
+        try:
+            parent_folder_id = uuid.UUID(parent_folder_id) if parent_folder_id else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid parent_folder_id.")
+        return await run_in_threadpool(
+            _upload_files, db, uploads, paths, parent_folder_id, current_user, storage_service
+        )
+    finally:
+        await form.close()
+
+def _upload_files(
+    db: Session,
+    uploads: list[UploadFile],
+    paths: list[str],
+    parent_folder_id: uuid.UUID | None,
+    current_user: UserModel,
+    storage_service: BaseStorageService
+) -> dict:
+    parent_folder = None
+    if parent_folder_id:
+        parent_folder = crud_folder.get_folder(db, folder_id=parent_folder_id, owner_id=current_user.id)
+        if not parent_folder:
+            raise HTTPException(status_code=404, detail="Parent folder not found or access denied.")
+
+    results = [{"index": index} for index in range(len(uploads))]
+    accepted = []
+    for index, upload in enumerate(uploads):
+        relative_path = split_relative_path(paths[index] if paths else upload.filename)
+        if not relative_path:
+            results[index]["error"] = "Invalid file path."
+        else:
+            accepted.append((index, upload, relative_path))
+    if not accepted:
+        return {"created": 0, "failed": len(results), "results": results}
+
+    reservation_id = crud_quota.reserve(db, user_id=current_user.id, size=sum(u.size or 0 for _, u, _ in accepted))
+    if not reservation_id:
+        raise HTTPException(status_code=400, detail="Insufficient storage quota.")
+
+    stored = store_uploads(storage_service, [u for _, u, _ in accepted], str(current_user.id))
+    written = []
+    for (index, upload, relative_path), saved in zip(accepted, stored):
+        if saved is None:
+            results[index]["error"] = "Could not write file to storage."
+        else:
+            written.append((index, upload, relative_path, saved))
+
+    folder_ids = crud_folder.ensure_folder_paths(
+        db, owner_id=current_user.id, parent_folder=parent_folder,
+        relative_paths={relative_path[:-1] for _, _, relative_path, _ in written}
+    )
+    files_in = [
+        FileCreate(
+            original_name=relative_path[-1],
+            filename=saved_filename,
+            file_path=saved_path,
+            size=upload.size,
+            mime_type=upload.content_type or "application/octet-stream",
+            hash_sha256=file_hash,
+            owner_id=current_user.id,
+            parent_folder_id=folder_ids[relative_path[:-1]]
+        )
+        for _, upload, relative_path, (saved_path, saved_filename, file_hash) in written
+    ]
+    # Also settles the reservation, including the part held for failed writes
+    file_ids = crud_file.create_files_batch(db, files_in=files_in, reservation_id=reservation_id)
+    if not files_in:
+        crud_quota.release(db, reservation_id=reservation_id)
+        db.commit()
+    for (index, _, _, _), file_id in zip(written, file_ids):
+        results[index]["id"] = file_id
+
+    return {"created": len(file_ids), "failed": len(results) - len(file_ids), "results": results}
+
+@router.post("/batch", response_model=FileBatchCreateResponse, status_code=status.HTTP_201_CREATED)
+def register_files_batch(
+    *,
+    db: Session = Depends(get_db),
+    batch_in: FileBatchCreateRequest,
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Register up to 10,000 objects that are already in storage as files.
+    Their content is not read, so their hashes are recorded as unverified.
+
+    Items whose parent folder is missing, whose path lies outside the user's
+    storage area, is already registered or appears twice in the batch, or
+    whose object does not exist are reported as failed; the rest are created
+    together. Sizes are read from storage rather than taken from the request,
+    and the quota is checked once against their total.
+    """
+    parent_ids = {f.parent_folder_id for f in batch_in.files if f.parent_folder_id}
+    valid_parents = crud_folder.get_visible_folder_ids(db, folder_ids=parent_ids, owner_id=current_user.id)
+    # Two records sharing an object would lose it when either is purged
+    registered = crud_file.get_referenced_paths(
+        db, owner_id=current_user.id, file_paths=[f.file_path for f in batch_in.files]
+    )
+
+    results = [{"index": index} for index in range(len(batch_in.files))]
+    candidates, seen = [], set()
+    for index, item in enumerate(batch_in.files):
+        if item.parent_folder_id and item.parent_folder_id not in valid_parents:
+            results[index]["error"] = "Parent folder not found or access denied."
+        elif not storage_service.belongs_to(item.file_path, str(current_user.id)):
+            results[index]["error"] = "File path is outside the user's storage."
+        elif len(Path(item.file_path).name) > 255:
+            results[index]["error"] = "File name is too long."
+        elif item.file_path in registered:
+            results[index]["error"] = "File path is already registered."
+        elif item.file_path in seen:
+            results[index]["error"] = "File path appears more than once in the batch."
+        else:
+            seen.add(item.file_path)
+            candidates.append((index, item))
+
+    to_create = []
+    sizes = storage_service.get_sizes([item.file_path for _, item in candidates])
+    for (index, item), size in zip(candidates, sizes):
+        if size is None:
+            results[index]["error"] = "File not found in storage."
+        else:
+            to_create.append((index, FileCreate(
+                **item.model_dump(exclude={"size"}),
+                size=size,
+                hash_verified=False,
+                filename=Path(item.file_path).name,
+                owner_id=current_user.id
+            )))
+
+    if to_create:
+        reservation_id = crud_quota.reserve(db, user_id=current_user.id, size=sum(f.size for _, f in to_create))
+        if not reservation_id:
+            raise HTTPException(status_code=400, detail="Insufficient storage quota.")
+        file_ids = crud_file.create_files_batch(db, files_in=[f for _, f in to_create], reservation_id=reservation_id)
+        for (index, _), file_id in zip(to_create, file_ids):
+            if file_id is None:
+                # Registered by a concurrent request since the check above
+                results[index]["error"] = "File path is already registered."
+            else:
+                results[index]["id"] = file_id
+
+    created = sum(1 for result in results if result.get("id"))
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@router.get("/search", response_model=SearchResponse)
+def search_files(
+    *,
+    db: Session = Depends(get_db),
+    q: str = Query(..., min_length=3, max_length=255),
+    cursor: str | None = Query(None, max_length=1024),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Search the current user's files and folders by name.
+
+    Matches are case-insensitive substrings of the name, ranked exact match
+    first, then prefix matches, then everything else. Queries shorter than
+    three characters are rejected since they cannot use the trigram index.
+    Pages are fetched by passing the previous page's `next_cursor` as `cursor`.
+    """
+    try:
+        results, next_cursor, truncated = crud_search.search_items(
+            db, owner_id=current_user.id, query=q, cursor=cursor, limit=limit
+        )
+    except crud_search.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "query": q, "limit": limit, "has_more": next_cursor is not None, "next_cursor": next_cursor,
+        "truncated": truncated, "results": results
+    }
+
+@router.get("/shared-with-me", response_model=SharedFileListResponse)
+def list_shared_with_me(
+    *,
+    db: Session = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    List the files other users have shared with the current user.
+    """
+    rows, has_more = crud_permission.list_shared_with_me(db, user=current_user, skip=skip, limit=limit)
+    results = [
+        {
+            "id": f.id,
+            "original_name": f.original_name,
+            "mime_type": f.mime_type,
+            "size": f.size,
+            "owner_id": f.owner_id,
+            "updated_at": f.updated_at,
+            "permission_type": p.permission_type,
+            "granted_by": p.granted_by,
+            "expires_at": p.expires_at,
+            "shared_at": p.created_at,
+        }
+        for f, p in rows
+    ]
+    return {"skip": skip, "limit": limit, "has_more": has_more, "results": results}
 
 @router.get("/{file_id}/download")
 def download_file(
     *,
     db: Session = Depends(get_db),
+    request: Request,
     file_id: uuid.UUID,
     current_user: UserModel = Depends(deps.get_current_user),
     storage_service: BaseStorageService = Depends(get_storage_service)
@@ -73,23 +342,48 @@ def download_file(
     db_file = crud_file.get_file_by_id(db, file_id=file_id)
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found.")
-        
-    # Simplified permission check needed here
-    # if not crud_permission.has_read_permission(db, db_file=db_file, user=current_user):
-    #     raise HTTPException(status_code=403, detail="Not enough permissions.")
 
-    download_url = storage_service.get_download_url(file_path=db_file.file_path, filename=db_file.original_name)
-    
+    if not crud_permission.has_read_permission(db, db_file=db_file, user=current_user):
+        raise HTTPException(status_code=403, detail="Not enough permissions.")
+
     if settings.STORAGE_TYPE == 's3':
-        return RedirectResponse(url=download_url)
+        # The presigned URL expires, so the redirect must never be cached or
+        # revalidated; the object store answers conditional requests itself
+        download_url = storage_service.get_download_url(file_path=db_file.file_path, filename=db_file.original_name)
+        return RedirectResponse(url=download_url, headers={"Cache-Control": "no-store"})
+
+    # Answer revalidations before touching storage
+    headers = validator_headers(file_etag(db_file), db_file.updated_at)
+    if is_not_modified(request, headers["ETag"], db_file.updated_at):
+        return not_modified(headers)
+
+    if settings.DOWNLOAD_OFFLOAD_MODE:
+        return _offload_download(storage_service, db_file, headers)
     else:
-        return FileResponse(path=download_url, media_type=db_file.mime_type, filename=db_file.original_name)
+        download_url = storage_service.get_download_url(file_path=db_file.file_path, filename=db_file.original_name)
+        return FileResponse(path=download_url, media_type=db_file.mime_type, filename=db_file.original_name, headers=headers)
+
+def _offload_download(storage_service: BaseStorageService, db_file, headers: dict) -> Response:
+    """
+    Hands the transfer of a local file to the reverse proxy, which serves it
+    with sendfile; the response from Python itself has no body.
+    """
+    if settings.DOWNLOAD_OFFLOAD_MODE == "x-accel-redirect":
+        location = settings.DOWNLOAD_OFFLOAD_PREFIX.rstrip("/") + "/" + quote(storage_service.relative_path(db_file.file_path))
+        headers = {**headers, "X-Accel-Redirect": location}
+    else:
+        # x-sendfile; the mode is checked when the settings load
+        headers = {**headers, "X-Sendfile": str(storage_service.absolute_path(db_file.file_path))}
+    headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(db_file.original_name)}"
+    return Response(media_type=db_file.mime_type, headers=headers)
 
 
 @router.get("/{file_id}/info", response_model=FileSchema)
 def get_file_info(
     *,
     db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
     file_id: uuid.UUID,
     current_user: UserModel = Depends(deps.get_current_user)
 ):
@@ -102,7 +396,13 @@ def get_file_info(
     
     if not crud_permission.has_read_permission(db, db_file=db_file, user=current_user):
         raise HTTPException(status_code=403, detail="Not enough permissions.")
-    
+
+    # Metadata changes (e.g. a rename) bump updated_at without changing the content
+    variant = f"info-{int(db_file.updated_at.timestamp() * 1_000_000)}"
+    headers = validator_headers(file_etag(db_file, variant=variant), db_file.updated_at)
+    if is_not_modified(request, headers["ETag"], db_file.updated_at):
+        return not_modified(headers)
+    response.headers.update(headers)
     return db_file
 
 @router.delete("/{file_id}")
@@ -113,7 +413,7 @@ def delete_file(
     current_user: UserModel = Depends(deps.get_current_user)
 ):
     """
-    Delete a file (uses storage service via CRUD layer).
+    Move a file to the trash. It can be restored until it is purged.
     """
     deleted_file = crud_file.delete_file(db=db, file_id=file_id, owner_id=current_user.id)
     if not deleted_file:
@@ -121,7 +421,8 @@ def delete_file(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found or you don't have permission to access it.",
         )
-    return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "File deleted successfully"})
+    public_links.invalidate_public_file(file_id)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "File moved to trash"})
 
 @router.put("/{file_id}/rename", response_model=FileSchema)
 def rename_file(
@@ -176,18 +477,51 @@ def initiate_upload_session(
 ):
     """
     Initiate a chunked file upload session.
+
+    The full file size is reserved against the user's quota and the
+    temporary storage budget up front. While the budget is taken by other
+    uploads the request fails with 503 and a Retry-After header.
     """
-    session = crud_upload_session.create_session(
-        db=db, 
-        filename=session_in.filename, 
-        total_size=session_in.total_size, 
-        owner=current_user
+    session = _open_upload_session(
+        db, filename=session_in.filename, total_size=session_in.total_size,
+        reserve_size=session_in.total_size, current_user=current_user
     )
     return {
         "session_token": session.session_token,
-        "expires_at": session.expires_at
+        "expires_at": session.expires_at,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE
     }
 
+def _open_upload_session(db: Session, *, filename: str, total_size: int, reserve_size: int, current_user: UserModel):
+    """
+    Reserves `reserve_size` bytes of quota and opens an upload session that
+    stages `total_size` bytes in temp storage.
+    """
+    reservation_id = crud_quota.reserve(
+        db, user_id=current_user.id, size=reserve_size, ttl=crud_upload_session.SESSION_TTL
+    )
+    if not reservation_id:
+        raise HTTPException(status_code=400, detail="Insufficient storage quota.")
+
+    try:
+        return crud_upload_session.create_session(
+            db=db, 
+            filename=filename, 
+            total_size=total_size, 
+            owner=current_user,
+            reservation_id=reservation_id
+        )
+    except crud_upload_session.TempStorageFull as e:
+        db.rollback()
+        crud_quota.release(db, reservation_id=reservation_id)
+        db.commit()
+        if e.retryable:
+            raise HTTPException(
+                status_code=503, detail=e.detail,
+                headers={"Retry-After": str(settings.UPLOAD_SESSION_REAP_INTERVAL_SECONDS)}
+            )
+        raise HTTPException(status_code=507, detail=e.detail)
+
 @router.post("/upload/chunk", response_model=UploadChunkResponse)
 def upload_chunk(
     *,
@@ -203,33 +537,165 @@ def upload_chunk(
     if not session or session.status not in ['pending', 'uploading']:
         raise HTTPException(status_code=404, detail="Upload session not found or already completed.")
 
+    offset = session.uploaded_size
+    remaining = session.total_size - offset
+    if file.size is not None and file.size > remaining:
+        raise HTTPException(status_code=400, detail="Chunk exceeds the declared file size.")
+
+    # The temp file is preallocated to the full size, so chunks are written in
+    # place, a buffer at a time rather than read into memory whole
+    chunk_size = 0
+    temp_path = Path(session.temp_file_path)
     try:
-        with open(session.temp_file_path, "ab") as f:
-            chunk_size = f.write(file.file.read())
-    except Exception as e:
+        with open(temp_path, "r+b" if temp_path.exists() else "wb") as f:
+            f.seek(offset)
+            while data := file.file.read(settings.UPLOAD_STREAM_BUFFER_SIZE):
+                chunk_size += len(data)
+                if chunk_size > remaining:
+                    raise HTTPException(status_code=400, detail="Chunk exceeds the declared file size.")
+                f.write(data)
+    except OSError as e:
         raise HTTPException(status_code=500, detail=f"Could not write chunk: {e}")
-    
-    updated_session = crud_upload_session.update_session_size(db, db_session=session, chunk_size=chunk_size)
-    
+
+    if not crud_upload_session.advance_session(db, db_session=session, offset=offset, chunk_size=chunk_size):
+        raise HTTPException(status_code=409, detail="The session was advanced by another request.")
+    return _chunk_response(session)
+
+@router.put("/upload/{session_token}/chunks/{index}", response_model=UploadChunkResponse)
+async def put_chunk(
+    *,
+    db: Session = Depends(get_db),
+    request: Request,
+    session_token: str,
+    index: int,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Upload chunk `index` of a session as a raw `application/octet-stream` body.
+
+    Chunk `index` covers bytes `index * chunk_size` onwards, where
+    `chunk_size` comes from the initiate response; every chunk but the last
+    must be exactly that long, and chunks are sent in order. Resending a chunk
+    that was already stored is a no-op. An optional `Content-MD5` (base64) or
+    `X-Content-SHA256` (hex) header is checked before the chunk is accepted.
+    The body is streamed to the temp file and never held in memory whole.
+    """
+    session = await run_in_threadpool(
+        crud_upload_session.get_session_by_token, db, token=session_token, owner_id=current_user.id
+    )
+    if not session or session.status not in ['pending', 'uploading']:
+        raise HTTPException(status_code=404, detail="Upload session not found or already completed.")
+
+    offset = index * settings.UPLOAD_CHUNK_SIZE
+    if index < 0 or offset >= max(session.total_size, 1):
+        raise HTTPException(status_code=400, detail="Chunk index is out of range.")
+    expected_size = min(settings.UPLOAD_CHUNK_SIZE, session.total_size - offset)
+
+    checks = {}
+    if "content-md5" in request.headers:
+        try:
+            checks["md5"] = (hashlib.md5(), base64.b64decode(request.headers["content-md5"], validate=True).hex())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Content-MD5 is not valid base64.")
+    if "x-content-sha256" in request.headers:
+        checks["sha256"] = (hashlib.sha256(), request.headers["x-content-sha256"].lower())
+
+    return await _receive_chunk(
+        db, request, session, index=index, offset=offset, expected_size=expected_size,
+        next_index=session.uploaded_size // settings.UPLOAD_CHUNK_SIZE, checks=checks
+    )
+
+async def _receive_chunk(
+    db: Session,
+    request: Request,
+    session,
+    *,
+    index: int,
+    offset: int,
+    expected_size: int,
+    next_index: int,
+    checks: dict
+) -> dict:
+    """
+    Streams a raw request body into the session's temp file at `offset` and
+    advances the session. Chunks must arrive in order; one that is already
+    stored is acknowledged without being written again.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is None:
+        raise HTTPException(status_code=411, detail="Content-Length is required.")
+    if not content_length.isdigit() or int(content_length) != expected_size:
+        raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected_size} bytes.")
+    if offset + expected_size <= session.uploaded_size:
+        # Already stored, e.g. a retry after a lost response
+        return _chunk_response(session)
+    if offset != session.uploaded_size:
+        raise HTTPException(status_code=409, detail=f"Expected chunk {next_index}, got chunk {index}.")
+
+    temp_path = Path(session.temp_file_path)
+    f = await run_in_threadpool(open, temp_path, "r+b" if temp_path.exists() else "wb")
+    try:
+        await run_in_threadpool(f.seek, offset)
+        written = 0
+        buffer = bytearray()
+        async for data in request.stream():
+            written += len(data)
+            if written > expected_size:
+                raise HTTPException(status_code=400, detail="Chunk is longer than its Content-Length.")
+            buffer += data
+            if len(buffer) >= settings.UPLOAD_STREAM_BUFFER_SIZE:
+                await run_in_threadpool(_write_chunk_buffer, f, bytes(buffer), checks)
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(_write_chunk_buffer, f, bytes(buffer), checks)
+    finally:
+        await run_in_threadpool(f.close)
+
+    if written != expected_size:
+        raise HTTPException(status_code=400, detail="Chunk is shorter than its Content-Length.")
+    for name, (digest, expected) in checks.items():
+        if digest.hexdigest() != expected:
+            raise HTTPException(status_code=400, detail=f"Chunk {name} checksum mismatch.")
+
+    # Bytes past uploaded_size are only counted here, so a rejected chunk is simply overwritten by its retry
+    if not await run_in_threadpool(
+        crud_upload_session.advance_session, db, db_session=session, offset=offset, chunk_size=written
+    ):
+        raise HTTPException(status_code=409, detail="The session was advanced by another request.")
+    return _chunk_response(session)
+
+def _write_chunk_buffer(f, data: bytes, checks: dict):
+    for digest, _ in checks.values():
+        digest.update(data)
+    f.write(data)
+
+def _chunk_response(session) -> dict:
     return {
-        "session_token": updated_session.session_token,
-        "uploaded_size": updated_session.uploaded_size,
-        "total_size": updated_session.total_size,
-        "status": updated_session.status
+        "session_token": session.session_token,
+        "uploaded_size": session.uploaded_size,
+        "total_size": session.total_size,
+        "status": session.status
     }
 
-@router.post("/upload/complete", response_model=FileSchema)
+@router.post("/upload/complete", response_model=FileUploadResponse)
 def complete_upload_session(
     *,
     db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
     session_token: str = Form(...),
     parent_folder_id: uuid.UUID | None = Form(None),
+    extract: bool = Form(False),
     current_user: UserModel = Depends(deps.get_current_user),
     storage_service: BaseStorageService = Depends(get_storage_service)
 ):
-    session = crud_upload_session.get_session_by_token(db, token=session_token, owner_id=current_user.id)
+    # Locked until the file record is committed, so a repeated request can't complete it twice
+    session = crud_upload_session.lock_open_session(db, token=session_token, owner_id=current_user.id)
     if not session:
-        raise HTTPException(status_code=404, detail="Upload session not found.")
+        raise HTTPException(status_code=404, detail="Upload session not found or already completed.")
+    if crud_delta.get_delta_upload(db, upload_session_id=session.id):
+        raise HTTPException(status_code=400, detail="Delta uploads are completed with POST /files/delta/{session_token}/complete.")
+    if extract and not extraction_service.archive_format(session.filename):
+        raise HTTPException(status_code=400, detail="Only zip and tar archives can be extracted.")
     
     if session.uploaded_size != session.total_size:
         raise HTTPException(status_code=400, detail="File upload is incomplete.")
@@ -258,11 +724,221 @@ def complete_upload_session(
         parent_folder_id=parent_folder_id,
         upload_session_id=session.id
     )
-    db_file = crud_file.create_file(db=db, file_in=file_in)
     crud_upload_session.complete_session(db, db_session=session)
-    
+    db_file = crud_file.create_file(db=db, file_in=file_in, reservation_id=session.quota_reservation_id)
+    temp_path.unlink(missing_ok=True)
+
+    return _with_extraction(db, background_tasks, db_file, extract)
+
+@router.get("/delta/params", response_model=DeltaParams)
+def get_delta_params(current_user: UserModel = Depends(deps.get_current_user)):
+    """
+    The content-defined chunking parameters delta upload clients must use.
+    """
+    return delta_service.chunking_params()
+
+@router.post("/delta/initiate", response_model=DeltaUploadInitiateResponse)
+def initiate_delta_upload(
+    *,
+    db: Session = Depends(get_db),
+    delta_in: DeltaUploadInitiateRequest,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Start a delta upload from the file's chunk list (see GET /files/delta/params).
+
+    Chunks already in the user's chunk index, from earlier delta uploads, are
+    reused; the response lists the ones to upload. With `file_id` the file's
+    content is replaced and only the growth in size counts against the quota.
+    """
+    chunks = [(c.sha256.lower(), c.size) for c in delta_in.chunks]
+    if len(chunks) > settings.DELTA_MAX_CHUNKS:
+        raise HTTPException(status_code=400, detail=f"A file can have at most {settings.DELTA_MAX_CHUNKS} chunks.")
+    if any(size > settings.DELTA_CHUNK_MAX_SIZE for _, size in chunks):
+        raise HTTPException(status_code=400, detail="A chunk is larger than the maximum chunk size.")
+    if sum(size for _, size in chunks) != delta_in.size:
+        raise HTTPException(status_code=400, detail="The chunk sizes do not add up to the file size.")
+
+    reserve_size = delta_in.size
+    parent_folder_id = delta_in.parent_folder_id
+    if delta_in.file_id:
+        target = crud_file.get_file(db, file_id=delta_in.file_id, owner_id=current_user.id)
+        if not target:
+            raise HTTPException(status_code=404, detail="File not found or access denied.")
+        reserve_size = max(delta_in.size - target.size, 0)
+        parent_folder_id = target.parent_folder_id
+    elif parent_folder_id and not crud_folder.get_folder(db, folder_id=parent_folder_id, owner_id=current_user.id):
+        raise HTTPException(status_code=404, detail="Parent folder not found or access denied.")
+
+    stored = crud_delta.find_stored_chunks(db, owner_id=current_user.id, hashes={sha256 for sha256, _ in chunks})
+    missing, seen = [], set()
+    for position, (sha256, _) in enumerate(chunks):
+        if sha256 not in stored and sha256 not in seen:
+            missing.append(position)
+            seen.add(sha256)
+    missing_size = sum(chunks[position][1] for position in missing)
+
+    session = _open_upload_session(
+        db, filename=delta_in.filename, total_size=missing_size,
+        reserve_size=reserve_size, current_user=current_user
+    )
+    crud_delta.create_delta_upload(
+        db, db_session=session, file_id=delta_in.file_id, parent_folder_id=parent_folder_id,
+        size=delta_in.size, hash_sha256=delta_in.sha256.lower(), chunks=chunks, missing=missing
+    )
+    return {
+        "session_token": session.session_token,
+        "expires_at": session.expires_at,
+        "missing": missing,
+        "missing_size": missing_size
+    }
+
+@router.put("/delta/{session_token}/chunks/{n}", response_model=UploadChunkResponse)
+async def put_delta_chunk(
+    *,
+    db: Session = Depends(get_db),
+    request: Request,
+    session_token: str,
+    n: int,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Upload the n-th missing chunk of a delta upload as a raw body.
+
+    Chunks are sent in the order of `missing`, and each one is checked
+    against the SHA-256 given for it at initiation.
+    """
+    session = await run_in_threadpool(
+        crud_upload_session.get_session_by_token, db, token=session_token, owner_id=current_user.id
+    )
+    if not session or session.status not in ['pending', 'uploading']:
+        raise HTTPException(status_code=404, detail="Upload session not found or already completed.")
+    delta = await run_in_threadpool(crud_delta.get_delta_upload, db, upload_session_id=session.id)
+    if not delta:
+        raise HTTPException(status_code=404, detail="Upload session is not a delta upload.")
+    if not 0 <= n < len(delta.missing):
+        raise HTTPException(status_code=400, detail="Chunk number is out of range.")
+
+    ends = list(accumulate(delta.chunks[position][1] for position in delta.missing))
+    sha256, size = delta.chunks[delta.missing[n]]
+    return await _receive_chunk(
+        db, request, session, index=n, offset=ends[n] - size, expected_size=size,
+        next_index=bisect_right(ends, session.uploaded_size), checks={"sha256": (hashlib.sha256(), sha256)}
+    )
+
+@router.post("/delta/{session_token}/complete", response_model=FileSchema)
+def complete_delta_upload(
+    *,
+    db: Session = Depends(get_db),
+    session_token: str,
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Assemble the file from the uploaded and the already stored chunks.
+
+    The new object is streamed together in storage and checked against the
+    declared hash before the file record is created or updated. The session
+    row stays locked until then, so a repeated request can't complete it twice.
+    """
+    session = crud_upload_session.lock_open_session(db, token=session_token, owner_id=current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found or already completed.")
+    delta = crud_delta.get_delta_upload(db, upload_session_id=session.id)
+    if not delta:
+        raise HTTPException(status_code=404, detail="Upload session is not a delta upload.")
+    if session.uploaded_size != session.total_size:
+        raise HTTPException(status_code=400, detail="Some chunks have not been uploaded yet.")
+
+    target = None
+    if delta.file_id:
+        target = crud_file.get_file(db, file_id=delta.file_id, owner_id=current_user.id)
+        if not target:
+            raise HTTPException(status_code=404, detail="File not found or access denied.")
+
+    chunks = [(sha256, size) for sha256, size in delta.chunks]
+    staged = {chunks[position][0] for position in delta.missing}
+    reused = {sha256 for sha256, _ in chunks} - staged
+    stored = crud_delta.find_stored_chunks(db, owner_id=current_user.id, hashes=reused)
+    if reused - stored.keys():
+        raise HTTPException(status_code=409, detail="Some chunks are no longer stored; start a new delta upload.")
+
+    temp_path = Path(session.temp_file_path)
+    try:
+        saved_path, saved_filename = delta_service.assemble(
+            storage_service,
+            temp_path=temp_path,
+            segments=delta_service.plan_segments(chunks, delta.missing, stored),
+            user_id=str(current_user.id),
+            filename=session.filename,
+            size=delta.size,
+            hash_sha256=delta.hash_sha256
+        )
+    except delta_service.DeltaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Settled in the same commit as the file record, which also releases the row lock
+    crud_upload_session.complete_session(db, db_session=session)
+    if target:
+        crud_delta.index_file_chunks(db, file_id=target.id, owner_id=current_user.id, chunks=chunks)
+        db_file = crud_file.replace_file_content(
+            db, db_file=target, file_path=saved_path, filename=saved_filename,
+            size=delta.size, hash_sha256=delta.hash_sha256, reservation_id=session.quota_reservation_id
+        )
+        public_links.invalidate_public_file(db_file.id)
+    else:
+        file_in = FileCreate(
+            original_name=session.filename,
+            filename=saved_filename,
+            file_path=saved_path,
+            size=delta.size,
+            mime_type=mimetypes.guess_type(session.filename)[0] or "application/octet-stream",
+            hash_sha256=delta.hash_sha256,
+            owner_id=current_user.id,
+            parent_folder_id=delta.parent_folder_id,
+            upload_session_id=session.id
+        )
+        db_file = crud_file.create_file(db=db, file_in=file_in, reservation_id=session.quota_reservation_id)
+        crud_delta.index_file_chunks(db, file_id=db_file.id, owner_id=current_user.id, chunks=chunks)
+        db.commit()
+    temp_path.unlink(missing_ok=True)
     return db_file
 
+@router.post("/{file_id}/extract", response_model=ExtractionJob, status_code=status.HTTP_202_ACCEPTED)
+def extract_archive(
+    *,
+    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    file_id: uuid.UUID,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Expand a stored zip or tar archive into a folder next to it, in the background.
+    """
+    db_file = crud_file.get_file(db, file_id=file_id, owner_id=current_user.id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found.")
+    if not extraction_service.archive_format(db_file.original_name):
+        raise HTTPException(status_code=400, detail="Only zip and tar archives can be extracted.")
+    job = crud_extraction.create_job(db, source_file=db_file)
+    background_tasks.add_task(extraction_service.run_extraction, job.id)
+    return job
+
+@router.get("/extractions/{job_id}", response_model=ExtractionJob)
+def get_extraction_job(
+    *,
+    db: Session = Depends(get_db),
+    job_id: uuid.UUID,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Get the progress of an archive extraction.
+    """
+    job = crud_extraction.get_job(db, job_id=job_id, owner_id=current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Extraction job not found.")
+    return job
+
 @router.post("/{file_id}/share", response_model=Permission)
 def share_file(
     *,
@@ -312,6 +988,34 @@ def make_file_public(
 
     # 4. Update the is_public flag in the database
     crud_file.set_public_status(db, db_file=db_file, is_public=True)
+    # A recent miss for this link is cached too; drop it so the link works right away
+    public_links.invalidate_public_file(file_id)
 
     public_url = storage_service.get_public_url(file_path=db_file.file_path)
-    return {"message": "File is now public.", "public_url": public_url}
\ No newline at end of file
+    return {"message": "File is now public.", "public_url": public_url}
+
+
+@router.post("/{file_id}/unpublish", status_code=status.HTTP_200_OK)
+def make_file_private(
+    *,
+    db: Session = Depends(get_db),
+    file_id: uuid.UUID,
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Stops serving a file publicly. Edge caches may keep serving the old
+    redirect for up to PUBLIC_LINK_CACHE_TTL_SECONDS.
+    """
+    db_file = crud_file.get_file(db, file_id=file_id, owner_id=current_user.id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found or you are not the owner.")
+
+    try:
+        storage_service.make_private(file_path=db_file.file_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not update file permissions in storage: {e}")
+
+    crud_file.set_public_status(db, db_file=db_file, is_public=False)
+    public_links.invalidate_public_file(file_id)
+    return {"message": "File is no longer public."}
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+from urllib.parse import quote
 from uuid import UUID
 
 from app.schemas.folder import Folder, FolderCreate, FolderWithContent, FolderUpdate, FolderMove
 from app.models.user import User as UserModel
 from app.core.database import get_db
 from app.api.v1 import deps
-from app.crud import crud_folder
+from app.crud import crud_folder, crud_archive
+from app.schemas.archive import ArchiveRequest
+from app.services.storage_service import BaseStorageService, get_storage_service
+from app.services.archive_service import stream_zip
 
 router = APIRouter()
 
@@ -30,6 +34,56 @@ def create_folder(
     return folder
 
 
+@router.post("/archive")
+def download_selection_archive(
+    *,
+    db: Session = Depends(get_db),
+    archive_in: ArchiveRequest,
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Download a selection of files and folders as a single streamed ZIP.
+    """
+    if not archive_in.file_ids and not archive_in.folder_ids:
+        raise HTTPException(status_code=400, detail="No file or folder IDs provided.")
+    entries = crud_archive.get_archive_entries(
+        db, owner_id=current_user.id, folder_ids=archive_in.folder_ids, file_ids=archive_in.file_ids
+    )
+    if not entries:
+        raise HTTPException(status_code=404, detail="None of the selected items were found.")
+    return _zip_response(storage_service, entries, "archive.zip")
+
+
+@router.get("/{folder_id}/archive")
+def download_folder_archive(
+    *,
+    db: Session = Depends(get_db),
+    folder_id: UUID,
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Download a folder and everything in it as a ZIP, streamed as it is built.
+    """
+    folder = crud_folder.get_folder(db=db, folder_id=folder_id, owner_id=current_user.id)
+    if not folder:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Folder not found or you don't have permission to access it.",
+        )
+    entries = crud_archive.get_archive_entries(db, owner_id=current_user.id, folder_ids=[folder.id], file_ids=[])
+    return _zip_response(storage_service, entries, f"{folder.name}.zip")
+
+
+def _zip_response(storage_service: BaseStorageService, entries: list, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_zip(storage_service, entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"},
+    )
+
+
 @router.get("/{folder_id}", response_model=FolderWithContent)
 def read_folder(
     *,
@@ -49,7 +103,8 @@ def read_folder(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Folder not found or you don't have permission to access it.",
         )
-    return folder
+    subfolders, files = crud_folder.get_folder_contents(db, folder_id=folder.id, owner_id=current_user.id)
+    return {**Folder.model_validate(folder).model_dump(), "subfolders": subfolders, "files": files}
 
 @router.put("/{folder_id}/rename", response_model=Folder)
 def rename_folder(
@@ -123,8 +178,8 @@ def delete_folder(
     current_user: UserModel = Depends(deps.get_current_user)
 ):
     """
-    Delete a folder and all of its contents.
-    This action is irreversible.
+    Move a folder and all of its contents to the trash.
+    It can be restored from the trash until it is purged.
     """
     success = crud_folder.delete_folder(db=db, folder_id=folder_id, owner_id=current_user.id)
     if not success:
@@ -132,4 +187,4 @@ def delete_folder(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Folder not found or you don't have permission to access it.",
         )
-    return JSONResponse(content={"message": "Folder and its contents deleted successfully"})
+    return JSONResponse(content={"message": "Folder and its contents moved to trash"})
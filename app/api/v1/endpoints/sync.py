@@ -0,0 +1,98 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from uuid import UUID
+
+from app.core.database import get_db
+from app.api.v1 import deps
+from app.models.user import User as UserModel
+from app.crud import crud_folder, crud_sync
+from app.schemas.file import FileBatchCreateResponse
+from app.schemas.sync import SyncDiffRequest, SyncDiffResponse, SyncRegisterRequest
+from app.services.storage_service import get_storage_service, BaseStorageService
+from app.services.upload_service import split_relative_path
+
+router = APIRouter()
+
+@router.post("/diff", response_model=SyncDiffResponse)
+def diff_tree(
+    *,
+    db: Session = Depends(get_db),
+    diff_in: SyncDiffRequest,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Compare a local tree against a folder (or the root) in one request.
+
+    The client sends a manifest of `(path, size, sha256, mtime)` for every
+    file below the folder, with paths relative to it, and gets back what to
+    upload, register, download, delete and rename on each side. Paths in
+    `registerable` have content the user already stores and can be created
+    with POST /sync/register instead of being uploaded. Paths in `duplicates`
+    hold several server files and are left out of every other list.
+    """
+    root_folder = _get_root_folder(db, diff_in.folder_id, current_user.id)
+    entries = []
+    seen = set()
+    for index, entry in enumerate(diff_in.entries):
+        relative_path = split_relative_path(entry.path)
+        if not relative_path:
+            raise HTTPException(status_code=400, detail=f"Invalid path at entry {index}.")
+        path = "/".join(relative_path)
+        if path in seen:
+            raise HTTPException(status_code=400, detail=f"Duplicate path at entry {index}.")
+        seen.add(path)
+        entries.append((path, entry.size, entry.sha256.lower(), entry.mtime))
+
+    return crud_sync.diff_manifest(
+        db, owner_id=current_user.id, root_folder=root_folder,
+        entries=entries, last_synced_at=diff_in.last_synced_at
+    )
+
+@router.post("/register", response_model=FileBatchCreateResponse, status_code=status.HTTP_201_CREATED)
+def register_by_content(
+    *,
+    db: Session = Depends(get_db),
+    register_in: SyncRegisterRequest,
+    current_user: UserModel = Depends(deps.get_current_user),
+    storage_service: BaseStorageService = Depends(get_storage_service)
+):
+    """
+    Create files from content the user already stores, without uploading it.
+
+    Each item names a path below `folder_id` and the size and SHA-256 of its
+    content; the stored object of a live file with that content is copied
+    server-side. Items with no matching content are reported as failed and
+    should be uploaded instead. So are items whose path repeats an earlier
+    item's or already holds a file, rather than creating a second file there.
+    """
+    root_folder = _get_root_folder(db, register_in.folder_id, current_user.id)
+    results = [{"index": index} for index in range(len(register_in.files))]
+    items, item_indexes = [], []
+    for index, item in enumerate(register_in.files):
+        relative_path = split_relative_path(item.path)
+        if not relative_path:
+            results[index]["error"] = "Invalid file path."
+            continue
+        items.append((relative_path, item.size, item.sha256.lower()))
+        item_indexes.append(index)
+
+    outcomes = crud_sync.register_by_content(
+        db, owner=current_user, root_folder=root_folder, items=items, storage_service=storage_service
+    ) if items else []
+    created = 0
+    for index, outcome in zip(item_indexes, outcomes):
+        if isinstance(outcome, UUID):
+            results[index]["id"] = outcome
+            created += 1
+        else:
+            results[index]["error"] = outcome
+
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+def _get_root_folder(db: Session, folder_id: UUID | None, owner_id: UUID):
+    if not folder_id:
+        return None
+    folder = crud_folder.get_folder(db, folder_id=folder_id, owner_id=owner_id)
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found or access denied.")
+    return folder
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from uuid import UUID
+
+from app.schemas.trash import TrashListResponse
+from app.schemas.file import File as FileSchema
+from app.schemas.folder import Folder as FolderSchema
+from app.models.user import User as UserModel
+from app.core.database import get_db
+from app.api.v1 import deps
+from app.crud import crud_trash
+
+router = APIRouter()
+
+@router.get("/", response_model=TrashListResponse)
+def list_trash(
+    *,
+    db: Session = Depends(get_db),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    List the files and folders in the current user's trash.
+    """
+    results, has_more = crud_trash.list_trash(db, owner_id=current_user.id, skip=skip, limit=limit)
+    return {"skip": skip, "limit": limit, "has_more": has_more, "results": results}
+
+@router.post("/files/{file_id}/restore", response_model=FileSchema)
+def restore_file(
+    *,
+    db: Session = Depends(get_db),
+    file_id: UUID,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Restore a file from the trash. If its folder no longer exists, it is
+    restored to the root.
+    """
+    db_file = crud_trash.get_trashed_file(db, file_id=file_id, owner_id=current_user.id)
+    if not db_file:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found in trash.")
+    return crud_trash.restore_file(db, db_file=db_file)
+
+@router.post("/folders/{folder_id}/restore", response_model=FolderSchema)
+def restore_folder(
+    *,
+    db: Session = Depends(get_db),
+    folder_id: UUID,
+    current_user: UserModel = Depends(deps.get_current_user)
+):
+    """
+    Restore a folder and all of its contents from the trash. If its parent
+    no longer exists, it is restored to the root.
+    """
+    db_folder = crud_trash.get_trashed_folder(db, folder_id=folder_id, owner_id=current_user.id)
+    if not db_folder:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Folder not found in trash.")
+    return crud_trash.restore_folder(db, db_folder=db_folder)
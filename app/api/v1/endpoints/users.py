@@ -2,13 +2,17 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from app.schemas.user import User
+from app.models.user import User as UserModel
+from app.core.database import get_db
+from app.crud import crud_quota
 from app.api.v1 import deps
 
 router = APIRouter()
 
 @router.get("/me", response_model=User)
 def read_users_me(
-    current_user: User = Depends(deps.get_current_user)
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(deps.get_current_user)
 ):
     """
     Get current user.
@@ -16,4 +20,5 @@ def read_users_me(
     This endpoint is protected and requires a valid JWT token.
     It returns the details of the currently authenticated user.
     """
-    return current_user
+    user = User.model_validate(current_user)
+    return user.model_copy(update={"used_storage": crud_quota.get_used_storage(db, user=current_user)})
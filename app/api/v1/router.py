@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import health, auth, users, folders, files, bulk, browse, public 
+from app.api.v1.endpoints import health, auth, users, folders, files, bulk, browse, public, trash, sync
 
 
 # Master router for the v1 API
@@ -14,4 +14,6 @@ api_router.include_router(public.router, prefix="/public", tags=["Public"]) # pu
 api_router.include_router(files.router, prefix="/files", tags=["Files"]) # Files router
 api_router.include_router(bulk.router, prefix="/bulk", tags=["Bulk Operations"]) # Bulk router
 api_router.include_router(browse.router, prefix="/browse", tags=["Browse"]) # Browse router
+api_router.include_router(trash.router, prefix="/trash", tags=["Trash"]) # Trash router
+api_router.include_router(sync.router, prefix="/sync", tags=["Sync"]) # Sync router
 
@@ -0,0 +1,208 @@
+"""
+Admission control for the expensive route classes: per-client token buckets
+and concurrency caps, plus global load shedding when the process is already
+overloaded. Used by app/middleware/admission.py.
+
+State is per process, like app/core/cache.py: with several workers each one
+enforces the limits on its own share of the traffic.
+"""
+import ipaddress
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from app.core.config import settings
+
+class RouteClass:
+    """A group of routes sharing one set of limits. `key_by` is "user" or "ip"."""
+    def __init__(self, name: str, pattern: str, methods: tuple[str, ...], key_by: str = "user"):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.methods = methods
+        self.key_by = key_by
+
+# Paths are matched below the /api/v1 prefix. Everything else is admitted as is.
+ROUTE_CLASSES = [
+    # Nobody is logged in yet, and password hashing is slow by design
+    RouteClass("auth", r"^/auth/(token|register)$", ("POST",), key_by="ip"),
+    RouteClass("upload", r"^/files/(upload(/.*)?|delta/.+|batch)$", ("POST", "PUT")),
+    RouteClass("download", r"^/files/[^/]+/download$|^/folders/([^/]+/)?archive$", ("GET", "HEAD", "POST")),
+    RouteClass("public", r"^/public/[^/]+$", ("GET", "HEAD"), key_by="ip"),
+    RouteClass("bulk", r"^/bulk/.+$|^/files/[^/]+/extract$|^/sync/(diff|register)$", ("POST",)),
+]
+
+API_PREFIX = "/api/v1"
+
+def classify(method: str, path: str) -> RouteClass | None:
+    if not path.startswith(API_PREFIX):
+        return None
+    path = path[len(API_PREFIX):]
+    for route_class in ROUTE_CLASSES:
+        if method in route_class.methods and route_class.pattern.match(path):
+            return route_class
+    return None
+
+class Limiter:
+    """
+    A token bucket and an in-flight count per client key, for one route class.
+
+    `rate_per_minute` tokens are added continuously up to `burst`; each request
+    takes one. At most `concurrency` requests per key run at once. Zero turns
+    either limit off. Only the event loop calls this, so there is no locking.
+    """
+    def __init__(self, *, rate_per_minute: int, burst: int, concurrency: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60
+        self.burst = max(burst, 1)
+        self.concurrency = concurrency
+        self.max_keys = max_keys
+        # key -> (tokens, last refill); idle keys fall off the end, and a
+        # forgotten bucket comes back full, which is what it would have refilled to
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._in_flight: dict[str, int] = {}
+
+    def acquire(self, key: str, now: float | None = None) -> tuple[str, int] | None:
+        """
+        Admits a request for `key`, or returns `(reason, retry after seconds)`.
+        An admitted request must be followed by `release(key)`.
+        """
+        if self.concurrency and self._in_flight.get(key, 0) >= self.concurrency:
+            return "concurrency", 1
+
+        if self.rate:
+            now = time.monotonic() if now is None else now
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return "rate", max(1, math.ceil((1 - tokens) / self.rate))
+            self._buckets[key] = (tokens - 1, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        return None
+
+    def release(self, key: str):
+        count = self._in_flight.get(key, 0) - 1
+        if count > 0:
+            self._in_flight[key] = count
+        else:
+            self._in_flight.pop(key, None)
+
+class SlidingWindowPercentile:
+    """
+    A percentile of the values recorded over the last `window_seconds`, or 0
+    while fewer than `min_samples` were recorded, so a lone outlier in a
+    quiet window can't trip it. Recomputed at most every `refresh_seconds`,
+    as it is read on every expensive request. Thread-safe.
+    """
+    def __init__(self, window_seconds: float, *, percentile: float = 0.5, min_samples: int = 1, refresh_seconds: float = 0.25):
+        self.window_seconds = window_seconds
+        self.percentile = percentile
+        self.min_samples = max(min_samples, 1)
+        self.refresh_seconds = refresh_seconds
+        self._values: deque[tuple[float, float]] = deque()
+        self._cached = (float("-inf"), 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, value: float):
+        now = time.monotonic()
+        with self._lock:
+            self._values.append((now, value))
+            self._expire(now)
+
+    def value(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            computed_at, value = self._cached
+            if now - computed_at < self.refresh_seconds:
+                return value
+            self._expire(now)
+            if len(self._values) < self.min_samples:
+                value = 0.0
+            else:
+                ordered = sorted(v for _, v in self._values)
+                value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+            self._cached = (now, value)
+            return value
+
+    def _expire(self, now: float):
+        while self._values and self._values[0][0] < now - self.window_seconds:
+            self._values.popleft()
+
+# Fed by the pool on every checkout (see instrumentation.InstrumentedQueuePool)
+POOL_CHECKOUT_WAIT = SlidingWindowPercentile(settings.SHED_WINDOW_SECONDS, min_samples=settings.SHED_MIN_SAMPLES)
+
+def overload_reason() -> str | None:
+    """
+    Why new expensive requests should be shed right now, if they should: the
+    recent median wait for a pooled connection, or the calls queued for a
+    worker thread, is over its threshold. Must run on the event loop.
+    """
+    if settings.SHED_DB_POOL_WAIT_MS and POOL_CHECKOUT_WAIT.value() * 1000 > settings.SHED_DB_POOL_WAIT_MS:
+        return "db_pool_wait"
+    if settings.SHED_THREADPOOL_QUEUE_DEPTH:
+        from anyio import to_thread
+        if to_thread.current_default_thread_limiter().statistics().tasks_waiting > settings.SHED_THREADPOOL_QUEUE_DEPTH:
+            return "threadpool_queue"
+    return None
+
+def _parse_networks(value: str) -> list:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+TRUSTED_PROXIES = _parse_networks(settings.TRUSTED_PROXIES)
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_address(scope) -> str:
+    """
+    The address of the client behind a request. When the peer is one of
+    TRUSTED_PROXIES, this is the nearest X-Forwarded-For entry that isn't a
+    trusted proxy itself; entries further left are the client's own claims.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not TRUSTED_PROXIES or not _is_trusted_proxy(peer):
+        return peer
+    forwarded = ",".join(
+        value.decode("latin-1") for name, value in scope["headers"] if name == b"x-forwarded-for"
+    )
+    for address in reversed([a.strip() for a in forwarded.split(",") if a.strip()]):
+        if not _is_trusted_proxy(address):
+            return address
+    return peer
+
+@lru_cache(maxsize=4096)
+def token_subject(token: str) -> str | None:
+    """
+    The subject of a validly signed access token, or None. Expiry is not
+    checked: the result only picks whose limits a request counts against,
+    and the endpoint still rejects the token.
+    """
+    # Imported here so python-jose stays off the startup path
+    from jose import jwt, JWTError
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"verify_exp": False})
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return str(subject) if subject is not None else None
+
+def build_limiters() -> dict[str, Limiter]:
+    """One limiter per route class, from the RATE_LIMIT_* and CONCURRENCY_LIMIT_* settings."""
+    return {
+        name: Limiter(
+            rate_per_minute=getattr(settings, f"RATE_LIMIT_{name.upper()}_PER_MINUTE"),
+            burst=getattr(settings, f"RATE_LIMIT_{name.upper()}_BURST"),
+            concurrency=getattr(settings, f"CONCURRENCY_LIMIT_{name.upper()}"),
+        )
+        for name in sorted({route_class.name for route_class in ROUTE_CLASSES})
+    }
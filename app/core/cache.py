@@ -0,0 +1,67 @@
+"""
+A small per-process TTL cache with request coalescing.
+
+Each worker keeps its own copy, so invalidation only reaches the worker that
+made the change; other workers catch up when their entry expires. Keep TTLs
+short for anything that can be revoked.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Generic, Hashable, TypeVar
+
+V = TypeVar("V")
+
+class TTLCache(Generic[V]):
+    def __init__(self, *, ttl_seconds: float, negative_ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[V | None, float]] = OrderedDict()
+        self._loading: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], V | None]) -> V | None:
+        """
+        Returns the cached value for `key`, calling `loader` on a miss.
+
+        A `None` result is cached too, for the shorter negative TTL. Concurrent
+        misses for the same key wait for a single call to `loader`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[0]
+            future = self._loading.get(key)
+            is_loader = future is None
+            if is_loader:
+                future = self._loading[key] = Future()
+
+        if not is_loader:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        ttl = self.ttl_seconds if value is not None else self.negative_ttl_seconds
+        with self._lock:
+            # An invalidation during the load wins over the value loaded before it
+            if self._loading.pop(key, None) is future:
+                self._entries[key] = (value, time.monotonic() + ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._loading.pop(key, None)
@@ -1,5 +1,6 @@
 
 import os
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -22,8 +23,170 @@ class Settings(BaseSettings):
     S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "S3_SECRET_ACCESS_KEY")
     S3_BUCKET_NAME: str = os.getenv("S3_BUCKET_NAME", "storafe1")
     S3_REGION: str = os.getenv("S3_REGION", "fr-par")
+    # Number of storage objects copied in parallel by bulk copy, and looked up
+    # in parallel by batch registration.
+    STORAGE_COPY_CONCURRENCY: int = int(os.getenv("STORAGE_COPY_CONCURRENCY", "8"))
+    # Number of files written to storage in parallel by multi-file uploads.
+    UPLOAD_WRITE_CONCURRENCY: int = int(os.getenv("UPLOAD_WRITE_CONCURRENCY", "8"))
+    MULTI_UPLOAD_MAX_FILES: int = int(os.getenv("MULTI_UPLOAD_MAX_FILES", "10000"))
+    # --- Upload Sessions ---
+    # Bytes that in-flight chunked uploads may hold in temp storage; 0 disables the budget.
+    UPLOAD_TEMP_BUDGET_BYTES: int = int(os.getenv("UPLOAD_TEMP_BUDGET_BYTES", str(20 * 1024 ** 3)))
+    # Free space always left on the temp disk, whatever the budget says.
+    UPLOAD_TEMP_MIN_FREE_BYTES: int = int(os.getenv("UPLOAD_TEMP_MIN_FREE_BYTES", str(1024 ** 3)))
+    UPLOAD_SESSION_REAP_INTERVAL_SECONDS: int = int(os.getenv("UPLOAD_SESSION_REAP_INTERVAL_SECONDS", "600"))
+    UPLOAD_SESSION_REAP_BATCH_SIZE: int = int(os.getenv("UPLOAD_SESSION_REAP_BATCH_SIZE", "500"))
+    # Size of every chunk but the last for PUT /upload/{token}/chunks/{index}.
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+    # Request body bytes gathered before each write to the temp file.
+    UPLOAD_STREAM_BUFFER_SIZE: int = int(os.getenv("UPLOAD_STREAM_BUFFER_SIZE", str(1024 * 1024)))
+
+    # --- Delta Uploads ---
+    # Content-defined chunking parameters clients must use, see delta_service.
+    DELTA_CHUNK_MIN_SIZE: int = int(os.getenv("DELTA_CHUNK_MIN_SIZE", str(256 * 1024)))
+    DELTA_CHUNK_AVG_SIZE: int = int(os.getenv("DELTA_CHUNK_AVG_SIZE", str(1024 * 1024)))
+    DELTA_CHUNK_MAX_SIZE: int = int(os.getenv("DELTA_CHUNK_MAX_SIZE", str(4 * 1024 * 1024)))
+    DELTA_MAX_CHUNKS: int = int(os.getenv("DELTA_MAX_CHUNKS", "20000"))
+
+    # --- ZIP Archives ---
+    # Objects read ahead while streaming an archive, and chunks buffered per object.
+    ARCHIVE_PREFETCH_FILES: int = int(os.getenv("ARCHIVE_PREFETCH_FILES", "4"))
+    ARCHIVE_PREFETCH_CHUNKS: int = int(os.getenv("ARCHIVE_PREFETCH_CHUNKS", "4"))
+    ARCHIVE_CHUNK_SIZE: int = int(os.getenv("ARCHIVE_CHUNK_SIZE", str(1024 * 1024)))
+    # --- Archive Extraction ---
+    EXTRACT_MAX_ENTRIES: int = int(os.getenv("EXTRACT_MAX_ENTRIES", "10000"))
+    EXTRACT_MAX_EXPANDED_SIZE: int = int(os.getenv("EXTRACT_MAX_EXPANDED_SIZE", str(10 * 1024 ** 3)))
+    # Expanded bytes allowed per archive byte, per entry and overall
+    EXTRACT_MAX_COMPRESSION_RATIO: int = int(os.getenv("EXTRACT_MAX_COMPRESSION_RATIO", "100"))
+    # Entries written to storage before their records are committed
+    EXTRACT_BATCH_SIZE: int = int(os.getenv("EXTRACT_BATCH_SIZE", "500"))
+    # --- Search ---
+    # Matches ranked per query, per type; a broader query is ranked among the first ones found.
+    SEARCH_MAX_CANDIDATES: int = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+    # --- Public Links ---
+    # Per-worker cache of public file URLs; also used as the edge cache max-age.
+    PUBLIC_LINK_CACHE_TTL_SECONDS: int = int(os.getenv("PUBLIC_LINK_CACHE_TTL_SECONDS", "60"))
+    PUBLIC_LINK_NEGATIVE_CACHE_TTL_SECONDS: int = int(os.getenv("PUBLIC_LINK_NEGATIVE_CACHE_TTL_SECONDS", "10"))
+    PUBLIC_LINK_CACHE_SIZE: int = int(os.getenv("PUBLIC_LINK_CACHE_SIZE", "10000"))
+    # --- Download Offload (local storage only) ---
+    # '' streams through Python; 'x-accel-redirect' (nginx) or 'x-sendfile'
+    # (Apache/lighttpd) hand the transfer to the web server after auth checks.
+    # For nginx, map DOWNLOAD_OFFLOAD_PREFIX to the storage root, e.g.
+    #   location /_protected/ { internal; alias /app/storage/local/files/; }
+    DOWNLOAD_OFFLOAD_MODE: str = os.getenv("DOWNLOAD_OFFLOAD_MODE", "").lower()
+    DOWNLOAD_OFFLOAD_PREFIX: str = os.getenv("DOWNLOAD_OFFLOAD_PREFIX", "/_protected/")
     PUBLIC_SHARING_ALLOWED_USERS: str = os.getenv("PUBLIC_SHARING_ALLOWED_USERS", "")
 
+    # --- Quota Ledger ---
+    # Number of delta rows per user that concurrent writers spread over.
+    QUOTA_DELTA_SHARDS: int = int(os.getenv("QUOTA_DELTA_SHARDS", "8"))
+    # How long a reservation for a single-request upload is held.
+    QUOTA_RESERVATION_TTL_MINUTES: int = int(os.getenv("QUOTA_RESERVATION_TTL_MINUTES", "60"))
+    QUOTA_RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("QUOTA_RECONCILE_INTERVAL_SECONDS", "300"))
+    # Users whose drift is checked per transaction.
+    QUOTA_RECONCILE_BATCH_SIZE: int = int(os.getenv("QUOTA_RECONCILE_BATCH_SIZE", "500"))
+
+    # --- Trash ---
+    TRASH_RETENTION_DAYS: int = int(os.getenv("TRASH_RETENTION_DAYS", "30"))
+    TRASH_PURGE_BATCH_SIZE: int = int(os.getenv("TRASH_PURGE_BATCH_SIZE", "500"))
+    TRASH_PURGE_INTERVAL_SECONDS: int = int(os.getenv("TRASH_PURGE_INTERVAL_SECONDS", "3600"))
+
+    # --- Replaced storage objects ---
+    # How long an object replaced by new content stays readable, for downloads and delta assemblies already using it.
+    STORAGE_DELETE_GRACE_SECONDS: int = int(os.getenv("STORAGE_DELETE_GRACE_SECONDS", "3600"))
+    STORAGE_DELETE_BATCH_SIZE: int = int(os.getenv("STORAGE_DELETE_BATCH_SIZE", "500"))
+    STORAGE_DELETE_INTERVAL_SECONDS: int = int(os.getenv("STORAGE_DELETE_INTERVAL_SECONDS", "600"))
+
+    # --- Background Jobs ---
+    # Disable on serverless deployments and run the scripts/ equivalents from cron instead.
+    BACKGROUND_TASKS_ENABLED: bool = os.getenv("BACKGROUND_TASKS_ENABLED", "true").lower() == "true"
+
+    # --- Response pipeline ---
+    SECURITY_HEADERS_ENABLED: bool = os.getenv("SECURITY_HEADERS_ENABLED", "true").lower() == "true"
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    # JSON bodies smaller than this go out uncompressed.
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+
+    # --- Database connections ---
+    # "queue" keeps a connection pool per process (long-lived workers); "null"
+    # opens a connection per session (serverless), ideally through an external
+    # pooler. Defaults to "null" on Vercel.
+    DB_POOL_MODE: str = os.getenv("DB_POOL_MODE", "null" if os.getenv("VERCEL") else "queue")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    # Seconds to wait for a pooled connection before failing.
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Pooled connections older than this (seconds) are replaced, before servers or proxies drop them.
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # Checks every connection with a round trip on checkout.
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    DB_CONNECT_TIMEOUT: int = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+    # DATABASE_URL points at a transaction-mode pooler (e.g. PgBouncer): no server-side prepared statements.
+    DB_EXTERNAL_POOLER: bool = os.getenv("DB_EXTERNAL_POOLER", "false").lower() == "true"
+
+    # --- Metrics ---
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # GET /metrics requires "Authorization: Bearer <token>", and is not served
+    # without a token unless METRICS_PUBLIC is set (e.g. on a private network).
+    METRICS_AUTH_TOKEN: str = os.getenv("METRICS_AUTH_TOKEN", "")
+    METRICS_PUBLIC: bool = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+    # Adds a Server-Timing header (db, storage, app) to every response; for debugging.
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+    # --- SQL profiling ---
+    # Profiles the queries of every request: logs likely N+1 patterns and slow
+    # statements, and sends admin callers X-DB-* summary headers.
+    SQL_PROFILER_ENABLED: bool = os.getenv("SQL_PROFILER_ENABLED", "false").lower() == "true"
+    # A statement shape run this many times in one request is reported as a likely N+1.
+    SQL_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+    SQL_SLOW_QUERY_MS: int = int(os.getenv("SQL_SLOW_QUERY_MS", "500"))
+
+    # --- Admission control ---
+    # Per-client token buckets (requests per minute, burst) and caps on requests
+    # in progress for the expensive route classes; 0 turns a limit off. Auth and
+    # public links are limited per client address, the rest per user.
+    ADMISSION_CONTROL_ENABLED: bool = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+    # Comma-separated addresses or networks of the reverse proxies in front of
+    # the app, whose X-Forwarded-For is trusted for the client address. Behind
+    # a proxy every request otherwise comes from the proxy's address, so the
+    # per-address limits (auth, public) are off by default: set this first.
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "")
+    RATE_LIMIT_UPLOAD_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_UPLOAD_PER_MINUTE", "1200"))
+    RATE_LIMIT_UPLOAD_BURST: int = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "200"))
+    CONCURRENCY_LIMIT_UPLOAD: int = int(os.getenv("CONCURRENCY_LIMIT_UPLOAD", "8"))
+    RATE_LIMIT_DOWNLOAD_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_DOWNLOAD_PER_MINUTE", "1200"))
+    RATE_LIMIT_DOWNLOAD_BURST: int = int(os.getenv("RATE_LIMIT_DOWNLOAD_BURST", "200"))
+    CONCURRENCY_LIMIT_DOWNLOAD: int = int(os.getenv("CONCURRENCY_LIMIT_DOWNLOAD", "8"))
+    RATE_LIMIT_BULK_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_BULK_PER_MINUTE", "30"))
+    RATE_LIMIT_BULK_BURST: int = int(os.getenv("RATE_LIMIT_BULK_BURST", "10"))
+    CONCURRENCY_LIMIT_BULK: int = int(os.getenv("CONCURRENCY_LIMIT_BULK", "2"))
+    # Suggested once TRUSTED_PROXIES is right: 30 per minute, burst 10, 4 at once
+    RATE_LIMIT_AUTH_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", "0"))
+    RATE_LIMIT_AUTH_BURST: int = int(os.getenv("RATE_LIMIT_AUTH_BURST", "10"))
+    CONCURRENCY_LIMIT_AUTH: int = int(os.getenv("CONCURRENCY_LIMIT_AUTH", "0"))
+    RATE_LIMIT_PUBLIC_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PUBLIC_PER_MINUTE", "0"))
+    RATE_LIMIT_PUBLIC_BURST: int = int(os.getenv("RATE_LIMIT_PUBLIC_BURST", "200"))
+    CONCURRENCY_LIMIT_PUBLIC: int = int(os.getenv("CONCURRENCY_LIMIT_PUBLIC", "0"))
+    # Requests in these classes get 503 while the median wait for a pooled DB
+    # connection over the last SHED_WINDOW_SECONDS (once there are at least
+    # SHED_MIN_SAMPLES checkouts in it), or the number of calls queued for a
+    # worker thread, is above these thresholds; 0 turns one off.
+    SHED_DB_POOL_WAIT_MS: int = int(os.getenv("SHED_DB_POOL_WAIT_MS", "250"))
+    SHED_THREADPOOL_QUEUE_DEPTH: int = int(os.getenv("SHED_THREADPOOL_QUEUE_DEPTH", "40"))
+    SHED_WINDOW_SECONDS: int = int(os.getenv("SHED_WINDOW_SECONDS", "5"))
+    SHED_MIN_SAMPLES: int = int(os.getenv("SHED_MIN_SAMPLES", "20"))
+    SHED_RETRY_AFTER_SECONDS: int = int(os.getenv("SHED_RETRY_AFTER_SECONDS", "2"))
+
+    @field_validator("DOWNLOAD_OFFLOAD_MODE")
+    @classmethod
+    def check_download_offload_mode(cls, value: str) -> str:
+        """Fails at startup rather than on every download."""
+        value = value.lower()
+        if value not in ("", "x-accel-redirect", "x-sendfile"):
+            raise ValueError("DOWNLOAD_OFFLOAD_MODE must be empty, 'x-accel-redirect' or 'x-sendfile'.")
+        return value
+
     @property
     def PUBLIC_SHARING_USER_LIST(self) -> list[str]:
         """Returns the allowed users as a list of emails."""
@@ -1,18 +1,64 @@
+from functools import lru_cache
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import NullPool
 
 from app.core.config import settings
+from app.core.instrumentation import InstrumentedQueuePool, instrument_engine
+
+def engine_options() -> dict:
+    """
+    Engine arguments for DB_POOL_MODE:
+
+    - "queue": a pool per process, for long-lived workers. Connections are
+      recycled after DB_POOL_RECYCLE seconds; DB_POOL_PRE_PING adds a round
+      trip on every checkout to catch connections dropped in between.
+    - "null": a connection per session, closed afterwards, for serverless
+      instances that may be frozen or discarded at any time. Point
+      DATABASE_URL at an external pooler (e.g. PgBouncer in transaction
+      mode) so connecting stays cheap.
+    """
+    connect_args = {"connect_timeout": settings.DB_CONNECT_TIMEOUT}
+    if settings.DB_EXTERNAL_POOLER and make_url(settings.DATABASE_URL).get_driver_name() == "psycopg":
+        # Prepared statements live on one server connection, which a
+        # transaction-mode pooler doesn't keep; psycopg2 never prepares.
+        connect_args["prepare_threshold"] = None
+
+    if settings.DB_POOL_MODE == "null":
+        return {"poolclass": NullPool, "connect_args": connect_args}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+@lru_cache
+def get_engine() -> Engine:
+    """The process-wide engine, created on first use so importing the app never touches the database driver."""
+    engine = create_engine(settings.DATABASE_URL, **engine_options())
+    instrument_engine(engine)
+    return engine
+
+def __getattr__(name: str):
+    # `from app.core.database import engine` keeps working, creating the engine then
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Create the SQLAlchemy engine
-# The pool_pre_ping argument will check for "stale" connections and reconnect if necessary.
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True
-)
+class LazyEngineSession(Session):
+    """A Session bound to the process-wide engine unless given another bind."""
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
 
 # Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=LazyEngineSession, autocommit=False, autoflush=False)
 
 # Create a Base class for our models to inherit from
 Base = declarative_base()
@@ -25,4 +71,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,63 @@
+"""
+Helpers for HTTP validators (ETag / Last-Modified) and conditional requests.
+
+Files carry the SHA-256 of their content, which makes a natural strong ETag:
+it only changes when the bytes change, whichever worker or storage backend
+serves them.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+def content_etag(hash_sha256: str, *, variant: str | None = None) -> str:
+    """A strong ETag for a file's content, or for another representation of it (`variant`)."""
+    return f'"{hash_sha256}-{variant}"' if variant else f'"{hash_sha256}"'
+
+def file_etag(db_file, *, variant: str | None = None) -> str:
+    """
+    `content_etag` for a file record. A hash the client only claimed (batch
+    registration) can't vouch for the bytes, so those files are tagged by
+    record and last change instead.
+    """
+    if db_file.hash_verified:
+        return content_etag(db_file.hash_sha256, variant=variant)
+    return content_etag(f"{db_file.id.hex}-{int(db_file.updated_at.timestamp() * 1_000_000)}", variant=variant)
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def validator_headers(etag: str, last_modified: datetime, cache_control: str = "private, no-cache") -> dict:
+    """
+    Headers that let clients revalidate instead of refetching. The default
+    Cache-Control makes browsers ask every time, which is cheap with a 304.
+    """
+    return {"ETag": etag, "Last-Modified": http_date(last_modified), "Cache-Control": cache_control}
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """
+    Evaluates If-None-Match, or If-Modified-Since when there is no
+    If-None-Match (RFC 9110 section 13.2.2).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,200 @@
+"""
+Wiring of app/core/metrics.py into the app: the request middleware, the
+SQLAlchemy engine and pool hooks, and the collectors read at scrape time.
+Storage calls are instrumented in app/services/storage_service.py.
+"""
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from starlette.datastructures import MutableHeaders
+from starlette.routing import replace_params
+
+from app.core import admission, metrics, sql_profiler
+
+logger = logging.getLogger(__name__)
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(elapsed)
+            admission.POOL_CHECKOUT_WAIT.add(elapsed)
+            metrics.add_request_timing("db-wait", elapsed)
+
+def instrument_engine(engine):
+    """Times every statement, new connections and how long connections stay checked out."""
+    @event.listens_for(engine, "do_connect")
+    def _connect(dialect, connection_record, cargs, cparams):
+        # Returning a connection replaces the dialect's own connect call
+        start = time.perf_counter()
+        connection = dialect.loaded_dbapi.connect(*cargs, **cparams)
+        elapsed = time.perf_counter() - start
+        metrics.DB_CONNECT_DURATION.observe(elapsed)
+        metrics.add_request_timing("db-connect", elapsed)
+        return connection
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        _observe_query(conn, statement, parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        if context.connection is not None and context.statement:
+            _observe_query(context.connection, context.statement, context.parameters)
+
+    @event.listens_for(engine.pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine.pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            metrics.DB_CONNECTION_HOLD.observe(time.perf_counter() - checked_out_at)
+
+def _observe_query(conn, statement: str, parameters):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    metrics.DB_QUERY_DURATION.observe(elapsed, operation=operation)
+    metrics.add_request_timing("db", elapsed)
+    sql_profiler.record(statement, parameters, elapsed)
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency by route template and
+    status, and the number of requests in flight. With `server_timing` it also
+    adds a Server-Timing header with the time spent in the database and storage.
+    """
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = metrics.start_request_timing() if self.server_timing else None
+        status = 500
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", metrics.server_timing_header(timings, time.perf_counter() - start)
+                    )
+            await send(message)
+
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
+            metrics.HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, method=scope["method"], route=_route_template(scope), status=status
+            )
+
+def _route_template(scope) -> str:
+    """
+    The matched route's path template (e.g. `/api/v1/files/{file_id}`), which
+    keeps the label set bounded. Unmatched paths share one series.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if not path_format:
+        return "<unmatched>"
+    # Routers that keep the route unprefixed leave the prefix in front of it
+    # in the path; it holds no parameters, so it can be kept as is
+    rendered, _ = replace_params(path_format, route.param_convertors, dict(scope.get("path_params", {})))
+    path = scope["path"]
+    if path != rendered and path.endswith(rendered):
+        return path[:-len(rendered)] + path_format
+    return path_format
+
+class SQLProfilerMiddleware:
+    """
+    Pure ASGI middleware profiling the queries of every request (see
+    app/core/sql_profiler.py). Logs likely N+1 patterns, and sends admin
+    callers X-DB-Query-Count, X-DB-Query-Time and X-DB-Repeated-Queries.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        query_profile, token = sql_profiler.start_profile()
+
+        async def send_with_summary(message):
+            if message["type"] == "http.response.start" and query_profile.expose:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(query_profile.count)
+                headers["X-DB-Query-Time"] = f"{query_profile.total_seconds * 1000:.1f}"
+                headers["X-DB-Repeated-Queries"] = str(len(query_profile.repeated()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_summary)
+        finally:
+            sql_profiler.finish_profile(query_profile, token)
+            for shape, count, seconds in query_profile.repeated():
+                logger.warning(
+                    "Possible N+1 on %s %s: %d queries, %.1f ms: %s",
+                    scope["method"], _route_template(scope), count, seconds * 1000, shape[:300]
+                )
+
+def register_collectors():
+    """
+    Registers the scrape-time collectors for the pool, the threadpool and
+    upload sessions. The upload session counts come from the database, so
+    that collector runs in a worker thread.
+    """
+    def pool_stats():
+        from app.core.database import get_engine
+        pool = get_engine().pool
+        if isinstance(pool, QueuePool):
+            yield "db_pool_size", "gauge", "Configured pool size.", {}, pool.size()
+            yield "db_pool_checked_out", "gauge", "Connections currently checked out.", {}, pool.checkedout()
+            yield "db_pool_overflow", "gauge", "Connections open beyond the pool size.", {}, max(pool.overflow(), 0)
+
+    def threadpool_stats():
+        from anyio import to_thread
+        stats = to_thread.current_default_thread_limiter().statistics()
+        yield "threadpool_threads_busy", "gauge", "Worker threads running sync endpoints and jobs.", {}, stats.borrowed_tokens
+        yield "threadpool_threads_total", "gauge", "Worker thread limit.", {}, stats.total_tokens
+        yield "threadpool_tasks_waiting", "gauge", "Calls queued for a worker thread.", {}, stats.tasks_waiting
+
+    def upload_session_stats():
+        from app.core.database import SessionLocal
+        from app.crud import crud_upload_session
+        db = SessionLocal()
+        try:
+            counts = crud_upload_session.count_open_sessions(db)
+            temp_bytes = crud_upload_session.get_temp_bytes_in_flight(db)
+        finally:
+            db.close()
+        for status in crud_upload_session.OPEN_STATUSES:
+            yield "upload_sessions_open", "gauge", "Upload sessions in progress, by status.", {"status": status}, counts.get(status, 0)
+        yield "upload_temp_bytes_in_flight", "gauge", "Temp storage held by open upload sessions.", {}, temp_bytes
+
+    metrics.register_collector(pool_stats)
+    metrics.register_collector(threadpool_stats)
+    metrics.register_collector(upload_session_stats, blocking=True)
@@ -0,0 +1,219 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Metrics are plain counters, gauges and histograms kept in this process and
+rendered on GET /metrics. With several workers every process keeps its own
+numbers, so scrape each worker (or run one worker per container). Recording a
+sample is a dict lookup and a few additions under a lock, cheap enough for
+every request, query and storage call.
+
+Values that are only worth reading at scrape time (pool occupancy, upload
+session counts, threadpool usage) are registered as collectors instead.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+# Latency buckets in seconds, from sub-millisecond queries to multi-minute uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_metrics: list["_Metric"] = []
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, dict, float]]]] = []
+_blocking_collectors: list[Callable[[], Iterable[tuple[str, str, str, dict, float]]]] = []
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (the last one is +Inf), sum
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list[str]:
+        with self.lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = self._labels(key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+def register_collector(func: Callable[[], Iterable[tuple[str, str, str, dict, float]]], *, blocking: bool = False):
+    """
+    Registers a function called on every scrape. It yields samples as
+    `(name, kind, help, labels, value)` tuples. A `blocking` collector does
+    I/O (e.g. queries the database) and is run by `collect_blocking()`, in a
+    worker thread, rather than by `render()` on the event loop.
+    """
+    (_blocking_collectors if blocking else _collectors).append(func)
+
+def _collect(collectors) -> list[tuple[str, str, str, dict, float]]:
+    samples = []
+    for collector in collectors:
+        try:
+            samples.extend(list(collector()))
+        except Exception as e:
+            print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+    return samples
+
+def collect_blocking() -> list[tuple[str, str, str, dict, float]]:
+    """Runs the blocking collectors; call it off the event loop and pass the result to `render()`."""
+    return _collect(_blocking_collectors)
+
+def render(blocking_samples: Iterable[tuple[str, str, str, dict, float]] = ()) -> str:
+    """Renders every metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+
+    described = set()
+    for name, kind, help_text, labels, value in [*_collect(_collectors), *blocking_samples]:
+        if name not in described:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        lines.append(f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- Per-request timings for the Server-Timing header ---
+# Holds a dict of phase -> [total seconds, count] while a request is traced.
+_request_timings: ContextVar[dict | None] = ContextVar("request_timings", default=None)
+
+def start_request_timing() -> dict:
+    """Starts collecting per-phase timings for the current request."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+def add_request_timing(phase: str, seconds: float):
+    """Adds time spent in a phase (e.g. db, storage) to the current request, if it is traced."""
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+def server_timing_header(timings: dict, total_seconds: float) -> str:
+    parts = [f'{phase};dur={seconds * 1000:.1f};desc="{count}"' for phase, (seconds, count) in timings.items()]
+    parts.append(f"app;dur={total_seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+class timed:
+    """Context manager that observes its duration on a histogram and the request's timings."""
+    __slots__ = ("histogram", "phase", "labels", "start")
+
+    def __init__(self, histogram: Histogram, phase: str | None = None, **labels):
+        self.histogram = histogram
+        self.phase = phase
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed, **self.labels)
+        if self.phase:
+            add_request_timing(self.phase, elapsed)
+        return False
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+# --- HTTP ---
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to complete a request, by route template.", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled.")
+
+# --- Database ---
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Time spent executing SQL statements.", ("operation",))
+DB_POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.")
+DB_CONNECTION_HOLD = Histogram("db_connection_hold_seconds", "Time a pooled connection stays checked out.")
+DB_CONNECT_DURATION = Histogram("db_connect_duration_seconds", "Time to open a new database connection.")
+
+# --- Admission control ---
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests turned away by admission control.", ("route_class", "reason")
+)
+
+# --- Storage ---
+STORAGE_OPERATION_DURATION = Histogram(
+    "storage_operation_duration_seconds", "Latency of storage backend calls.", ("backend", "operation")
+)
+STORAGE_BYTES = Counter("storage_bytes_total", "Bytes moved through storage backend calls.", ("backend", "operation"))
@@ -0,0 +1,131 @@
+import importlib.util
+import logging
+import re
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.core.database import get_engine
+
+# Versioned, forward-only schema migrations. Each file in migrations/ is named
+# NNNN_description.py and defines `upgrade(connection)`; applied versions are
+# recorded in schema_migrations, so every run only applies what is new.
+#
+# A migration runs in a transaction of its own, together with the row that
+# records it, unless it sets `TRANSACTIONAL = False`: then it runs on an
+# autocommit connection, as CREATE INDEX CONCURRENTLY requires, and must be
+# safe to re-run should it fail halfway.
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+
+# Progress of a run; migrations log warnings on it rather than printing
+logger = logging.getLogger(__name__)
+
+# Held for the whole run, so two deploys never migrate at once
+LOCK_KEY = 7310593
+
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+class Migration:
+    def __init__(self, version: int, name: str, path: Path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f"migrations.m{self.version:04d}_{self.name}", self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+        return self._module
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.name}"
+
+def discover() -> list[Migration]:
+    """Every migration in migrations/, in version order."""
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.py"):
+        match = _FILENAME.match(path.name)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+def _ensure_version_table(connection):
+    connection.execute(text("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """))
+
+def applied_versions(connection) -> set[int]:
+    _ensure_version_table(connection)
+    return set(connection.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+def _record(connection, migration: Migration):
+    connection.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name},
+    )
+
+def pending(connection) -> list[Migration]:
+    applied = applied_versions(connection)
+    return [m for m in discover() if m.version not in applied]
+
+def upgrade(target: int | None = None) -> list[Migration]:
+    """
+    Applies every pending migration up to `target` (all of them by default),
+    in order, and returns the ones applied. Stops at the first failure.
+    """
+    engine = get_engine()
+    applied = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            for migration in pending(lock_connection):
+                if target is not None and migration.version > target:
+                    break
+                logger.info("Applying %s...", migration)
+                start = time.perf_counter()
+                if migration.transactional:
+                    with engine.begin() as connection:
+                        migration.module.upgrade(connection)
+                        _record(connection, migration)
+                else:
+                    migration.module.upgrade(lock_connection)
+                    _record(lock_connection, migration)
+                logger.info("Applied %s in %.1fs", migration, time.perf_counter() - start)
+                applied.append(migration)
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+    return applied
+
+def create_index_concurrently(connection, name: str, definition: str, *, unique: bool = False):
+    """
+    Runs `CREATE [UNIQUE] INDEX CONCURRENTLY IF NOT EXISTS <name> <definition>` on an
+    autocommit connection. A concurrent build that failed leaves an INVALID
+    index behind, which IF NOT EXISTS would happily skip; it is dropped and
+    rebuilt instead.
+    """
+    is_valid = connection.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if is_valid is False:
+        logger.warning("Rebuilding invalid index %s...", name)
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    logger.info("  %s", name)
+    connection.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} {definition}"))
@@ -1,14 +1,17 @@
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Any, Union
 
-from jose import jwt
-from passlib.context import CryptContext
-
 from app.core.config import settings
 
-# A CryptContext for hashing passwords.
+# python-jose and passlib/bcrypt are imported on first use rather than at
+# startup, which keeps them off the cold-start path of serverless deployments.
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache
+def pwd_context():
+    """The CryptContext for hashing passwords, created on first use."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -22,7 +25,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         True if the password is correct, False otherwise.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """
@@ -34,7 +37,7 @@ def get_password_hash(password: str) -> str:
     Returns:
         The resulting password hash.
     """
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: timedelta = None
@@ -56,6 +59,8 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     
+    from jose import jwt
+
     to_encode = {"exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
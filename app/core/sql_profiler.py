@@ -0,0 +1,165 @@
+"""
+Per-request SQL profiling.
+
+Every statement run while a profile is active is counted against it by
+shape: the SQL with its bound parameters stripped and expanded IN lists
+collapsed, so `SELECT ... WHERE id = ?` run once per row shows up as one
+shape with a high count. That is what N+1 patterns (lazy relationships,
+per-row lookups in loops, refreshes after commit) look like.
+
+With SQL_PROFILER_ENABLED, app/core/instrumentation.py profiles every
+request, logs shapes repeated SQL_N_PLUS_ONE_THRESHOLD times or more and
+statements slower than SQL_SLOW_QUERY_MS (with parameter values redacted),
+and sends summary headers to admin callers. Tests can use `profile()` and
+`assert_max_queries()` whether or not it is enabled:
+
+    with sql_profiler.assert_max_queries(5):
+        client.get("/api/v1/browse/")
+"""
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_REPEATED_PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryProfile:
+    """Queries run during one request (or one `profile()` block), by shape."""
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        # shape -> [count, total seconds]
+        self.shapes: dict[str, list] = {}
+        # Set for admin callers, who get the summary headers
+        self.expose = False
+        self.lock = threading.Lock()
+
+    def add(self, shape: str, seconds: float, count: int = 1):
+        with self.lock:
+            self.count += count
+            self.total_seconds += seconds
+            entry = self.shapes.setdefault(shape, [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+
+    def merge(self, other: "QueryProfile"):
+        with other.lock:
+            shapes = [(shape, count, seconds) for shape, (count, seconds) in other.shapes.items()]
+        for shape, count, seconds in shapes:
+            self.add(shape, seconds, count)
+
+    def repeated(self, threshold: int | None = None) -> list[tuple[str, int, float]]:
+        """Shapes run at least `threshold` times, most frequent first: likely N+1 patterns."""
+        threshold = threshold or settings.SQL_N_PLUS_ONE_THRESHOLD
+        with self.lock:
+            found = [(shape, count, seconds) for shape, (count, seconds) in self.shapes.items() if count >= threshold]
+        return sorted(found, key=lambda item: -item[1])
+
+    def report(self) -> str:
+        """One line per shape, most frequent first."""
+        with self.lock:
+            shapes = sorted(self.shapes.items(), key=lambda item: -item[1][0])
+        lines = [f"{self.count} queries in {self.total_seconds * 1000:.1f} ms"]
+        lines += [f"  {count:>4}x {seconds * 1000:8.1f} ms  {shape[:300]}" for shape, (count, seconds) in shapes]
+        return "\n".join(lines)
+
+_current: ContextVar[QueryProfile | None] = ContextVar("query_profile", default=None)
+# Profiles opened with profile(); they also receive the queries of requests
+# finished while they are open, which run in other threads or contexts.
+_listeners: list[QueryProfile] = []
+_listeners_lock = threading.Lock()
+
+def start_profile() -> tuple[QueryProfile, object]:
+    """Starts profiling the current context. Returns the profile and a token for `finish_profile`."""
+    query_profile = QueryProfile()
+    return query_profile, _current.set(query_profile)
+
+def finish_profile(query_profile: QueryProfile, token):
+    _current.reset(token)
+    with _listeners_lock:
+        listeners = [listener for listener in _listeners if listener is not query_profile]
+    for listener in listeners:
+        listener.merge(query_profile)
+
+def mark_caller(user):
+    """Lets admin users see the profile of their request in the response headers."""
+    query_profile = _current.get()
+    if query_profile is not None and getattr(user, "role", None) == "admin":
+        query_profile.expose = True
+
+def record(statement: str, parameters, seconds: float):
+    """Called by the engine hooks for every statement."""
+    query_profile = _current.get()
+    if query_profile is None:
+        with _listeners_lock:
+            listeners = list(_listeners)
+        if not listeners and not settings.SQL_PROFILER_ENABLED:
+            return
+    shape = statement_shape(statement)
+    if query_profile is not None:
+        query_profile.add(shape, seconds)
+    else:
+        for listener in listeners:
+            listener.add(shape, seconds)
+
+    if settings.SQL_PROFILER_ENABLED and seconds * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query (%.0f ms): %s params=%s",
+            seconds * 1000, _WHITESPACE.sub(" ", statement).strip()[:2000], redact_parameters(parameters)
+        )
+
+def statement_shape(statement: str) -> str:
+    """The statement with parameters replaced by `?` and IN lists collapsed."""
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _REPEATED_PLACEHOLDERS.sub("?, ...", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+def redact_parameters(parameters):
+    """Replaces bound values with their type, so logs never carry user data or secrets."""
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: show the first row and how many there were
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} rows"]
+        return [_redact(value) for value in parameters]
+    return _redact(parameters)
+
+def _redact(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+@contextmanager
+def profile():
+    """
+    Profiles the queries run inside the block, including those of requests
+    the app handles meanwhile (e.g. through TestClient). Meant for tests and
+    scripts: while it is open, concurrent requests are counted as well.
+    """
+    query_profile, token = start_profile()
+    with _listeners_lock:
+        _listeners.append(query_profile)
+    try:
+        yield query_profile
+    finally:
+        with _listeners_lock:
+            _listeners.remove(query_profile)
+        _current.reset(token)
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fails with the per-shape report if the block runs more than `limit` queries."""
+    with profile() as query_profile:
+        yield query_profile
+    if query_profile.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries.\n{query_profile.report()}")
@@ -0,0 +1,38 @@
+"""
+A small in-process scheduler for periodic maintenance jobs.
+
+Jobs are plain synchronous callables that run in the threadpool, so they can
+use a regular SQLAlchemy session. On serverless deployments, where the process
+doesn't outlive the request, set BACKGROUND_TASKS_ENABLED=false and run the
+equivalent scripts/ entry points from a cron job instead.
+"""
+import asyncio
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+_jobs: list[tuple[str, float, Callable[[], object]]] = []
+_running: list[asyncio.Task] = []
+
+def register_periodic_job(name: str, interval_seconds: float, func: Callable[[], object]):
+    """Registers a job to run every `interval_seconds` once the app has started."""
+    _jobs.append((name, interval_seconds, func))
+
+async def _run_periodically(name: str, interval_seconds: float, func: Callable[[], object]):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(func)
+        except Exception as e:
+            # A failing job must never take the scheduler down with it
+            print(f"Periodic job '{name}' failed: {e}")
+
+def start_periodic_jobs():
+    for name, interval_seconds, func in _jobs:
+        _running.append(asyncio.create_task(_run_periodically(name, interval_seconds, func)))
+
+async def stop_periodic_jobs():
+    for task in _running:
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+    _running.clear()
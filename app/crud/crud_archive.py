@@ -0,0 +1,94 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import cast, select, Text
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import PurePosixPath
+from uuid import UUID
+
+from app.models import File, Folder
+from app.crud import crud_folder
+
+@dataclass
+class ArchiveEntry:
+    """A file (or, with no file_path, an empty directory) to put in an archive."""
+    name: str
+    file_path: str | None
+    size: int
+    mime_type: str | None
+    modified: datetime
+
+def get_archive_entries(db: Session, *, owner_id: UUID, folder_ids: list[UUID], file_ids: list[UUID]) -> list[ArchiveEntry]:
+    """
+    Lists everything a ZIP of the selected files and folders should contain.
+
+    Each selected folder becomes a top-level directory holding its live
+    subtree; selected files sit at the top level. Names inside the archive
+    are built from folder names along the tree, and clashes get a " (n)"
+    suffix. Everything is loaded up front so the archive can be streamed
+    after the database session is gone.
+    """
+    roots = db.query(Folder).filter(
+        Folder.id.in_(folder_ids),
+        Folder.owner_id == owner_id,
+        Folder.deleted_at.is_(None),
+        ~crud_folder.under_trashed_folder(Folder.parent_folder_id)
+    ).all() if folder_ids else []
+    # A folder inside another selected folder is archived as part of it
+    root_paths = [f.path for f in roots]
+    roots = [f for f in roots if not any(f.path.startswith(f"{p}/") for p in root_paths)]
+
+    entries = []
+    if roots:
+        child = aliased(Folder)
+        tree = select(Folder.id, cast(Folder.name, Text).label("rel_path"), Folder.updated_at).where(
+            Folder.id.in_([f.id for f in roots])
+        ).cte("tree", recursive=True)
+        tree = tree.union_all(
+            select(child.id, tree.c.rel_path + "/" + child.name, child.updated_at)
+            .where(child.parent_folder_id == tree.c.id, child.deleted_at.is_(None))
+        )
+        folders = db.execute(select(tree.c.id, tree.c.rel_path, tree.c.updated_at).order_by(tree.c.rel_path)).all()
+        files = db.execute(
+            select(tree.c.rel_path, File.original_name, File.file_path, File.size, File.mime_type, File.updated_at)
+            .join(tree, File.parent_folder_id == tree.c.id)
+            .where(File.deleted_at.is_(None))
+            .order_by(tree.c.rel_path, File.original_name)
+        ).all()
+        non_empty = {f.rel_path for f in files} | {
+            str(PurePosixPath(f.rel_path).parent) for f in folders
+        }
+        # Directories only need their own entry when nothing inside implies them
+        entries += [
+            ArchiveEntry(f"{f.rel_path}/", None, 0, None, f.updated_at)
+            for f in folders if f.rel_path not in non_empty
+        ]
+        entries += [
+            ArchiveEntry(f"{f.rel_path}/{f.original_name}", f.file_path, f.size, f.mime_type, f.updated_at)
+            for f in files
+        ]
+
+    if file_ids:
+        entries += [
+            ArchiveEntry(f.original_name, f.file_path, f.size, f.mime_type, f.updated_at)
+            for f in db.query(File).filter(
+                File.id.in_(file_ids),
+                File.owner_id == owner_id,
+                File.deleted_at.is_(None),
+                ~crud_folder.under_trashed_folder(File.parent_folder_id)
+            ).order_by(File.original_name)
+        ]
+
+    _deduplicate_names(entries)
+    return entries
+
+def _deduplicate_names(entries: list[ArchiveEntry]) -> None:
+    """Renames entries in place so no two share a name in the archive."""
+    taken = set()
+    for entry in entries:
+        name, counter = entry.name, 1
+        while name in taken:
+            path = PurePosixPath(entry.name.rstrip("/"))
+            name = str(path.with_name(f"{path.stem} ({counter}){path.suffix}")) + ("/" if entry.file_path is None else "")
+            counter += 1
+        entry.name = name
+        taken.add(name)
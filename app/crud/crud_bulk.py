@@ -1,58 +1,55 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from uuid import UUID, uuid4
-import os
-import shutil
-import hashlib
-from pathlib import Path
+from sqlalchemy import func, text
+from uuid import UUID
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
+from app.core.config import settings
 from app.models import File, Folder, User
 from app.schemas.bulk import BulkDeleteRequest, BulkMoveRequest, BulkCopyRequest
-from . import crud_folder
+from app.services.storage_service import BaseStorageService
+from . import crud_folder, crud_quota
 
 def bulk_delete(db: Session, *, bulk_in: BulkDeleteRequest, owner_id: UUID) -> dict:
     """
-    Performs a bulk deletion of files and folders owned by a user.
+    Moves a selection of files and folders owned by a user to the trash.
+
+    Only the selected rows are marked, so the cost follows the size of the
+    selection rather than of the subtrees below it. Storage and quota are
+    released later by the trash purger.
     """
-    # --- File Deletion ---
-    files_to_delete = db.query(File).filter(File.id.in_(bulk_in.file_ids), File.owner_id == owner_id).all()
-    total_size_deleted = 0
-    deleted_files_count = 0
+    files_to_delete = _visible_files(db, file_ids=bulk_in.file_ids, owner_id=owner_id).all()
+
+    # Every selected item leaves the rollups of its own parent, as if deleted
+    # one at a time. A trashed folder's rollups then only cover what comes
+    # back with it, and the files and folders selected inside it, which stay
+    # in the trash when it is restored, are restored (and counted) on their own.
 
+    # --- File Deletion ---
+    removed_per_parent = defaultdict(lambda: [0, 0])
     for file in files_to_delete:
-        total_size_deleted += file.size
-        file_path = Path(file.file_path)
-        try:
-            if file_path.is_file():
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error deleting file from storage: {e}") # Log this error
-        db.delete(file)
-        deleted_files_count += 1
+        removed_per_parent[file.parent_folder_id][0] += file.size
+        removed_per_parent[file.parent_folder_id][1] += 1
+    crud_folder.adjust_rollups_many(db, deltas=[
+        (parent_id, -size, -count, 0) for parent_id, (size, count) in removed_per_parent.items()
+    ])
+    deleted_files_count = db.query(File).filter(File.id.in_([f.id for f in files_to_delete])).update(
+        {File.deleted_at: func.now()}, synchronize_session=False
+    )
 
     # --- Folder Deletion ---
-    # This will delete the specified folders and rely on the database's
-    # `ON DELETE CASCADE` to handle deleting sub-folders and files within them.
-    # A more robust implementation would first query all descendants to delete
-    # physical files and update user quota accurately.
-    files_to_delete = db.query(File).filter(File.id.in_(bulk_in.file_ids), File.owner_id == owner_id).all()
-    total_size_deleted = 0
-    deleted_files_count = 0
-    for file in files_to_delete:
-        total_size_deleted += file.size
-        file_path = Path(file.file_path)
-        try:
-            if file_path.is_file(): os.remove(file_path)
-        except Exception as e: print(f"Error deleting file from storage: {e}")
-        db.delete(file)
-        deleted_files_count += 1
-    folders_to_delete = db.query(Folder).filter(Folder.id.in_(bulk_in.folder_ids), Folder.owner_id == owner_id).all()
-    deleted_folders_count = 0
+    # Read after the file deltas, which selected folders may have shrunk.
+    # Descendants of the marked folders are hidden from lookups until the
+    # purger removes them together with their storage objects.
+    folders_to_delete = _visible_folders(db, folder_ids=bulk_in.folder_ids, owner_id=owner_id).populate_existing().all()
+    folder_deltas = []
     for folder in folders_to_delete:
-        db.delete(folder)
-        deleted_folders_count += 1
-    if total_size_deleted > 0:
-        db.query(User).filter(User.id == owner_id).update({User.used_storage: User.used_storage - total_size_deleted})
+        size, files, folders = _carried_rollups(folder, folders_to_delete)
+        folder_deltas.append((folder.parent_folder_id, -size, -files, -folders))
+    crud_folder.adjust_rollups_many(db, deltas=folder_deltas)
+    deleted_folders_count = db.query(Folder).filter(Folder.id.in_([f.id for f in folders_to_delete])).update(
+        {Folder.deleted_at: func.now()}, synchronize_session=False
+    )
     db.commit()
     return {"deleted_files": deleted_files_count, "deleted_folders": deleted_folders_count}
 
@@ -60,118 +57,224 @@ def bulk_delete(db: Session, *, bulk_in: BulkDeleteRequest, owner_id: UUID) -> d
 def bulk_move(db: Session, *, bulk_in: BulkMoveRequest, owner_id: UUID) -> dict:
     """
     Performs a bulk move of files and folders.
+
+    Files are re-parented with one UPDATE and all selected folder subtrees are
+    rewritten with another, however many folders are selected.
     """
-    ttarget_parent_path = "/"
-    if bulk_in.target_parent_folder_id:
-        target_folder = crud_folder.get_folder(db, folder_id=bulk_in.target_parent_folder_id, owner_id=owner_id)
+    target_id = bulk_in.target_parent_folder_id
+    target_parent_path = "/"
+    if target_id:
+        target_folder = crud_folder.get_folder(db, folder_id=target_id, owner_id=owner_id)
         if not target_folder: return None
         target_parent_path = target_folder.path
-    files_moved_count = db.query(File).filter(File.id.in_(bulk_in.file_ids), File.owner_id == owner_id).update({"parent_folder_id": bulk_in.target_parent_folder_id}, synchronize_session=False)
-    folders_to_move = db.query(Folder).filter(Folder.id.in_(bulk_in.folder_ids), Folder.owner_id == owner_id).all()
-    folders_moved_count = 0
+
+    # Shift the rollups per source folder before the files leave it
+    moved_from = _visible_files(db, file_ids=bulk_in.file_ids, owner_id=owner_id).with_entities(
+        File.parent_folder_id, func.count(File.id), func.coalesce(func.sum(File.size), 0)
+    ).group_by(File.parent_folder_id).all()
+    file_deltas = []
+    for source_folder_id, file_count, size in moved_from:
+        if source_folder_id != target_id:
+            file_deltas.append((source_folder_id, -size, -file_count, 0))
+            file_deltas.append((target_id, size, file_count, 0))
+    crud_folder.adjust_rollups_many(db, deltas=file_deltas)
+
+    # Read after the file deltas, so selected files inside selected folders
+    # have already left the folders' rollups and are not counted twice
+    folders_to_move = _visible_folders(db, folder_ids=bulk_in.folder_ids, owner_id=owner_id).populate_existing().all()
+    folder_deltas = []
     for folder in folders_to_move:
-        old_path = folder.path
-        new_path = f"{target_parent_path}/{folder.name}".replace("//", "/")
-        db.query(Folder).filter(Folder.path.like(f"{old_path}/%")).update({Folder.path: func.replace(Folder.path, old_path, new_path)}, synchronize_session=False)
-        folder.path = new_path
-        folder.parent_folder_id = bulk_in.target_parent_folder_id
-        db.add(folder)
-        folders_moved_count += 1
+        size, files, folders = _carried_rollups(folder, folders_to_move)
+        if folder.parent_folder_id != target_id:
+            folder_deltas.append((folder.parent_folder_id, -size, -files, -folders))
+            folder_deltas.append((target_id, size, files, folders))
+    crud_folder.adjust_rollups_many(db, deltas=folder_deltas)
+
+    files_moved_count = _visible_files(db, file_ids=bulk_in.file_ids, owner_id=owner_id).update({"parent_folder_id": target_id}, synchronize_session=False)
+    crud_folder.move_subtrees(
+        db, folder_ids=[f.id for f in folders_to_move], new_parent_id=target_id, new_parent_path=target_parent_path
+    )
     db.commit()
-    return {"moved_files": files_moved_count, "moved_folders": folders_moved_count}
+    return {"moved_files": files_moved_count, "moved_folders": len(folders_to_move)}
 
-def bulk_copy(db: Session, *, bulk_in: BulkCopyRequest, owner: User) -> dict:
+
+# Clones every selected folder subtree, and the files in it, in one statement.
+# New folder IDs are generated and remapped in SQL; the file rows point at
+# storage objects that were already copied, passed in as parallel arrays.
+_COPY_TREES_SQL = """
+WITH RECURSIVE subtree AS (
+    SELECT f.id, f.parent_folder_id, f.name, f.total_size, f.file_count, f.folder_count,
+           CAST(:target_path || '/' || f.name AS text) AS new_path, TRUE AS is_root
+    FROM folders f
+    WHERE f.id = ANY(CAST(:folder_ids AS uuid[]))
+    UNION ALL
+    SELECT f.id, f.parent_folder_id, f.name, f.total_size, f.file_count, f.folder_count,
+           s.new_path || '/' || f.name, FALSE
+    FROM folders f
+    JOIN subtree s ON f.parent_folder_id = s.id
+    WHERE f.deleted_at IS NULL
+),
+mapping AS MATERIALIZED (
+    SELECT subtree.*, gen_random_uuid() AS new_id FROM subtree
+),
+new_folders AS (
+    INSERT INTO folders (id, name, path, parent_folder_id, owner_id, total_size, file_count, folder_count)
+    SELECT m.new_id, m.name, m.new_path,
+           CASE WHEN m.is_root THEN CAST(:target_id AS uuid) ELSE parent.new_id END,
+           CAST(:owner_id AS uuid), m.total_size, m.file_count, m.folder_count
+    FROM mapping m
+    LEFT JOIN mapping parent ON parent.id = m.parent_folder_id
+    RETURNING id
+),
+new_files AS (
+    INSERT INTO files (id, filename, original_name, file_path, size, mime_type, hash_sha256, hash_verified,
+                       parent_folder_id, owner_id)
+    SELECT gen_random_uuid(), copied.filename, source.original_name, copied.file_path, source.size,
+           source.mime_type, source.hash_sha256, source.hash_verified,
+           CASE WHEN copied.is_direct THEN CAST(:target_id AS uuid) ELSE m.new_id END,
+           CAST(:owner_id AS uuid)
+    FROM unnest(
+        CAST(:source_ids AS uuid[]), CAST(:file_paths AS text[]),
+        CAST(:filenames AS text[]), CAST(:is_direct AS boolean[])
+    ) AS copied(source_id, file_path, filename, is_direct)
+    JOIN files source ON source.id = copied.source_id
+    LEFT JOIN mapping m ON m.id = source.parent_folder_id
+    RETURNING size
+)
+SELECT
+    (SELECT array_agg(id) FROM new_folders) AS folder_ids,
+    (SELECT COUNT(*) FROM new_files) AS file_count,
+    (SELECT COALESCE(SUM(size), 0) FROM new_files) AS total_size
+"""
+
+def bulk_copy(db: Session, *, bulk_in: BulkCopyRequest, owner: User, storage_service: BaseStorageService) -> dict:
     """
     Performs a bulk copy of files and folders.
+
+    Storage objects are copied concurrently first, then every folder and file
+    row is cloned with a single INSERT ... SELECT over a recursive CTE. Files
+    whose storage copy fails are left out, as before.
     """
+    target_id = bulk_in.target_parent_folder_id
     target_parent_path = "/"
-    if bulk_in.target_parent_folder_id:
-        target_folder = crud_folder.get_folder(db, folder_id=bulk_in.target_parent_folder_id, owner_id=owner.id)
+    if target_id:
+        target_folder = crud_folder.get_folder(db, folder_id=target_id, owner_id=owner.id)
         if not target_folder: return None
         target_parent_path = target_folder.path
-    
-    copied_files_count = 0
-    copied_folders_count = 0
-    total_size_copied = 0
-    
-    # --- File Copy ---
-    files_to_copy = db.query(File).filter(File.id.in_(bulk_in.file_ids), File.owner_id == owner.id).all()
-    for file in files_to_copy:
-        new_file, new_size = _copy_file_instance(db, file, bulk_in.target_parent_folder_id, owner)
-        if new_file:
-            copied_files_count += 1
-            total_size_copied += new_size
-
-    # --- Folder Copy (Recursive) ---
-    folders_to_copy = db.query(Folder).filter(Folder.id.in_(bulk_in.folder_ids), Folder.owner_id == owner.id).all()
-    for folder in folders_to_copy:
-        count, size = _copy_folder_recursive(db, folder, bulk_in.target_parent_folder_id, target_parent_path, owner)
-        copied_folders_count += count
-        total_size_copied += size
+
+    direct_files = _visible_files(db, file_ids=bulk_in.file_ids, owner_id=owner.id).all()
+    # Folders inside another selected folder are copied along with it
+    root_folders = _outermost_folders(_visible_folders(db, folder_ids=bulk_in.folder_ids, owner_id=owner.id).all())
+    tree_files = []
+    if root_folders:
+        tree_files = db.query(File).filter(
+            File.parent_folder_id.in_(crud_folder.subtree_folder_ids([f.id for f in root_folders], include_trashed=False)),
+            File.deleted_at.is_(None)
+        ).all()
+
+    # --- Storage Copy ---
+    to_copy = [(f, True) for f in direct_files] + [(f, False) for f in tree_files]
+    copies = copy_objects(storage_service, [f for f, _ in to_copy], user_id=str(owner.id))
+    copied = [(f, is_direct, copy) for (f, is_direct), copy in zip(to_copy, copies) if copy]
+
+    # --- Database Copy ---
+    result = db.execute(text(_COPY_TREES_SQL), {
+        "owner_id": str(owner.id),
+        "target_id": str(target_id) if target_id else None,
+        "target_path": target_parent_path.rstrip("/"),
+        "folder_ids": [str(f.id) for f in root_folders],
+        "source_ids": [str(f.id) for f, _, _ in copied],
+        "file_paths": [copy[0] for _, _, copy in copied],
+        "filenames": [copy[1] for _, _, copy in copied],
+        "is_direct": [is_direct for _, is_direct, _ in copied],
+    }).one()
+    new_folder_ids = result.folder_ids or []
+
+    # The clones inherit the source rollups, which only hold if nothing was skipped
+    if len(copied) != len(to_copy) and new_folder_ids:
+        crud_folder.recompute_rollups(db, folder_ids=new_folder_ids, commit=False)
+
+    crud_folder.adjust_rollups(
+        db,
+        folder_id=target_id,
+        size_delta=result.total_size,
+        file_delta=result.file_count,
+        folder_delta=len(new_folder_ids),
+    )
 
     # Update user quota
-    if total_size_copied > 0:
-        db.query(User).filter(User.id == owner.id).update(
-            {User.used_storage: User.used_storage + total_size_copied}
-        )
+    crud_quota.record_usage(db, user_id=owner.id, delta=result.total_size)
     
     db.commit()
-    return {"copied_files": copied_files_count, "copied_folders": copied_folders_count}
+    return {"copied_files": len([c for c in copied if c[1]]), "copied_folders": len(new_folder_ids)}
 
-def _copy_file_instance(db: Session, file_to_copy: File, target_parent_id: UUID, owner: User):
-    """Helper to copy a single file instance."""
-    source_path = Path(file_to_copy.file_path)
-    if not source_path.is_file(): return None, 0
+def target_inside_selection(db: Session, *, bulk_in: BulkMoveRequest | BulkCopyRequest, owner_id: UUID) -> bool:
+    """Checks whether the target folder is one of the selected folders or lies below one."""
+    if not bulk_in.target_parent_folder_id or not bulk_in.folder_ids:
+        return False
+    target = crud_folder.get_folder(db, folder_id=bulk_in.target_parent_folder_id, owner_id=owner_id)
+    if not target:
+        return False
+    return any(
+        f.id == target.id or target.path.startswith(f"{f.path}/")
+        for f in _visible_folders(db, folder_ids=bulk_in.folder_ids, owner_id=owner_id)
+    )
 
-    user_storage_path = Path("./storage/local/files") / str(owner.id)
-    user_storage_path.mkdir(parents=True, exist_ok=True)
-    
-    new_saved_filename = f"{uuid4()}{source_path.suffix}"
-    dest_path = user_storage_path / new_saved_filename
-
-    shutil.copy(source_path, dest_path)
-
-    new_file = File(
-        id=uuid4(),
-        original_name=file_to_copy.original_name,
-        filename=new_saved_filename,
-        file_path=str(dest_path.relative_to(Path.cwd())),
-        size=file_to_copy.size,
-        mime_type=file_to_copy.mime_type,
-        hash_sha256=f"{file_to_copy.hash_sha256}-{uuid4()}", # Ensure hash is unique
-        owner_id=owner.id,
-        parent_folder_id=target_parent_id
+def copy_objects(storage_service: BaseStorageService, files: list[File], *, user_id: str) -> list:
+    """
+    Copies the storage objects behind `files` with bounded concurrency.
+    Returns a `(file_path, filename)` tuple per file, or None where the copy failed.
+    """
+    def copy_one(file: File):
+        try:
+            return storage_service.copy(source_path=file.file_path, user_id=user_id, original_filename=file.original_name)
+        except Exception as e:
+            print(f"Error copying file in storage: {e}")
+            return None
+
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=settings.STORAGE_COPY_CONCURRENCY) as executor:
+        return list(executor.map(copy_one, files))
+
+def _carried_rollups(folder: Folder, selection: list[Folder]) -> tuple[int, int, int]:
+    """
+    The `(size, files, folders)` a selected folder takes along when it leaves
+    its parent. A selected folder nested in another selected folder leaves its
+    own parent first, so each folder carries only what is left in it once its
+    nested selections are gone; the folder itself counts as one folder.
+    """
+    nested = _nearest_nested(folder, selection)
+    return (
+        folder.total_size - sum(n.total_size for n in nested),
+        folder.file_count - sum(n.file_count for n in nested),
+        folder.folder_count + 1 - sum(n.folder_count + 1 for n in nested),
     )
-    db.add(new_file)
-    return new_file, new_file.size
-
-def _copy_folder_recursive(db: Session, folder_to_copy: Folder, new_parent_id: UUID, new_parent_path: str, owner: User):
-    """Helper to recursively copy a folder."""
-    total_copied_folders = 0
-    total_copied_size = 0
-
-    # Create the new folder record
-    new_folder_path = f"{new_parent_path}/{folder_to_copy.name}".replace("//", "/")
-    new_folder = Folder(
-        id=uuid4(),
-        name=folder_to_copy.name,
-        path=new_folder_path,
-        parent_folder_id=new_parent_id,
-        owner_id=owner.id
+
+def _nearest_nested(folder: Folder, selection: list[Folder]) -> list[Folder]:
+    """Returns the folders of `selection` inside `folder` that are not inside another one of them."""
+    inside = [f for f in selection if f.path.startswith(f"{folder.path}/")]
+    return _outermost_folders(inside)
+
+def _outermost_folders(folders: list[Folder]) -> list[Folder]:
+    """Drops folders that sit inside another folder of the same selection."""
+    paths = [f.path for f in folders]
+    return [f for f in folders if not any(f.path.startswith(f"{p}/") for p in paths)]
+
+def _visible_files(db: Session, *, file_ids: list[UUID], owner_id: UUID):
+    """Query for the selected files that belong to the user and are not in the trash."""
+    return db.query(File).filter(
+        File.id.in_(file_ids),
+        File.owner_id == owner_id,
+        File.deleted_at.is_(None),
+        ~crud_folder.under_trashed_folder(File.parent_folder_id)
+    )
+
+def _visible_folders(db: Session, *, folder_ids: list[UUID], owner_id: UUID):
+    """Query for the selected folders that belong to the user and are not in the trash."""
+    return db.query(Folder).filter(
+        Folder.id.in_(folder_ids),
+        Folder.owner_id == owner_id,
+        Folder.deleted_at.is_(None),
+        ~crud_folder.under_trashed_folder(Folder.parent_folder_id)
     )
-    db.add(new_folder)
-    total_copied_folders += 1
-
-    # Copy files in the current folder
-    for file in folder_to_copy.files:
-        copied_file, copied_size = _copy_file_instance(db, file, new_folder.id, owner)
-        if copied_file:
-            total_copied_size += copied_size
-
-    # Recursively copy subfolders
-    for subfolder in folder_to_copy.subfolders:
-        count, size = _copy_folder_recursive(db, subfolder, new_folder.id, new_folder.path, owner)
-        total_copied_folders += count
-        total_copied_size += size
-        
-    return total_copied_folders, total_copied_size
@@ -0,0 +1,83 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from uuid import UUID
+
+from app.models.delta_upload import DeltaUpload
+from app.models.file import File
+from app.models.file_chunk import FileChunk
+from app.models.upload_session import UploadSession
+from . import crud_folder
+
+def find_stored_chunks(db: Session, *, owner_id: UUID, hashes: set[str]) -> dict[str, tuple[str, int]]:
+    """
+    Looks up chunks in the user's chunk index.
+
+    Files in the trash, or under a folder in the trash, are skipped, since the
+    purger may remove their objects while a new version is being assembled
+    from them.
+
+    Returns:
+        For each hash that is stored, the path/key of a storage object that
+        holds it and the chunk's offset in that object.
+    """
+    if not hashes:
+        return {}
+    rows = db.execute(
+        select(FileChunk.hash_sha256, File.file_path, FileChunk.offset)
+        .join(File, File.id == FileChunk.file_id)
+        .where(
+            FileChunk.owner_id == owner_id,
+            FileChunk.hash_sha256.in_(hashes),
+            File.deleted_at.is_(None),
+            ~crud_folder.under_trashed_folder(File.parent_folder_id)
+        )
+        .distinct(FileChunk.hash_sha256)
+        .order_by(FileChunk.hash_sha256, FileChunk.file_id, FileChunk.seq)
+    ).all()
+    return {r.hash_sha256: (r.file_path, r.offset) for r in rows}
+
+def create_delta_upload(
+    db: Session,
+    *,
+    db_session: UploadSession,
+    file_id: UUID | None,
+    parent_folder_id: UUID | None,
+    size: int,
+    hash_sha256: str,
+    chunks: list[tuple[str, int]],
+    missing: list[int]
+) -> DeltaUpload:
+    """
+    Records the chunk recipe of a delta upload next to its session.
+    """
+    db_delta = DeltaUpload(
+        upload_session_id=db_session.id,
+        file_id=file_id,
+        parent_folder_id=parent_folder_id,
+        size=size,
+        hash_sha256=hash_sha256,
+        chunks=[list(chunk) for chunk in chunks],
+        missing=missing
+    )
+    db.add(db_delta)
+    db.commit()
+    db.refresh(db_delta)
+    return db_delta
+
+def get_delta_upload(db: Session, *, upload_session_id: UUID) -> DeltaUpload | None:
+    """
+    Fetches the recipe of a delta upload by its session.
+    """
+    return db.query(DeltaUpload).filter(DeltaUpload.upload_session_id == upload_session_id).first()
+
+def index_file_chunks(db: Session, *, file_id: UUID, owner_id: UUID, chunks: list[tuple[str, int]]) -> None:
+    """
+    Replaces a file's entries in the chunk index. Does not commit.
+    """
+    db.query(FileChunk).filter(FileChunk.file_id == file_id).delete(synchronize_session=False)
+    rows, offset = [], 0
+    for seq, (sha256, size) in enumerate(chunks):
+        rows.append({"file_id": file_id, "seq": seq, "owner_id": owner_id, "hash_sha256": sha256, "offset": offset, "size": size})
+        offset += size
+    if rows:
+        db.execute(insert(FileChunk.__table__), rows)
@@ -0,0 +1,34 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from uuid import UUID
+
+from app.models.extraction_job import ExtractionJob
+from app.models.file import File
+
+def create_job(db: Session, *, source_file: File) -> ExtractionJob:
+    """
+    Queues the extraction of an archive file owned by the user.
+    """
+    db_job = ExtractionJob(owner_id=source_file.owner_id, source_file_id=source_file.id, status="pending")
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def get_job(db: Session, *, job_id: UUID, owner_id: UUID) -> ExtractionJob | None:
+    """
+    Fetches an extraction job by its ID, ensuring it belongs to the owner.
+    """
+    return db.query(ExtractionJob).filter(ExtractionJob.id == job_id, ExtractionJob.owner_id == owner_id).first()
+
+def finish_job(db: Session, *, db_job: ExtractionJob, status: str, error: str | None = None) -> ExtractionJob:
+    """
+    Marks a job as completed or failed.
+    """
+    db_job.status = status
+    db_job.error = error
+    db_job.finished_at = func.now()
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
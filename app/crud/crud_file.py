@@ -1,11 +1,12 @@
 from sqlalchemy.orm import Session
-from uuid import UUID
-import os
-from app.services.storage_service import get_storage_service
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+from uuid import UUID, uuid4
+from collections import defaultdict
 from app.models.file import File
-from app.models.user import User
 from app.schemas.file import FileCreate, FileUpdate, FileMove
-from pathlib import Path
+from app.crud import crud_folder, crud_quota, crud_storage_deletion
 
 
 def set_public_status(db: Session, *, db_file: File, is_public: bool) -> File:
@@ -19,8 +20,13 @@ def set_public_status(db: Session, *, db_file: File, is_public: bool) -> File:
 def get_file_by_id(db: Session, *, file_id: UUID) -> File | None:
     """
     Fetches a file by its ID, without checking for ownership.
+    Files in the trash (directly or through a folder) are not returned.
     """
-    return db.query(File).filter(File.id == file_id).first()
+    return db.query(File).filter(
+        File.id == file_id,
+        File.deleted_at.is_(None),
+        ~crud_folder.under_trashed_folder(File.parent_folder_id)
+    ).first()
 
 def get_file(db: Session, *, file_id: UUID, owner_id: UUID) -> File | None:
     """
@@ -34,16 +40,24 @@ def get_file(db: Session, *, file_id: UUID, owner_id: UUID) -> File | None:
     Returns:
         The File object if found and owned by the user, otherwise None.
     """
-    return db.query(File).filter(File.id == file_id, File.owner_id == owner_id).first()
+    return db.query(File).filter(
+        File.id == file_id,
+        File.owner_id == owner_id,
+        File.deleted_at.is_(None),
+        ~crud_folder.under_trashed_folder(File.parent_folder_id)
+    ).first()
 
 
-def create_file(db: Session, *, file_in: FileCreate) -> File:
+def create_file(db: Session, *, file_in: FileCreate, reservation_id: UUID | None = None) -> File:
     """
     Creates a new file record in the database and updates user storage.
 
     Args:
         db: The database session.
         file_in: The file creation schema.
+        reservation_id: The quota reservation taken for this upload, if any.
+            It is settled in the same transaction as the file record, or
+            released if that transaction fails.
 
     Returns:
         The newly created File object.
@@ -54,26 +68,121 @@ def create_file(db: Session, *, file_in: FileCreate) -> File:
     # Add, commit, and refresh
     db.add(db_file)
     
-    # Atomically update the user's used storage
-    db.query(User).filter(User.id == file_in.owner_id).update(
-        {User.used_storage: User.used_storage + file_in.size}
-    )
+    # Settle the reservation into the user's storage ledger
+    crud_quota.record_usage(db, user_id=file_in.owner_id, delta=file_in.size)
+    crud_quota.release(db, reservation_id=reservation_id)
+    crud_folder.adjust_rollups(db, folder_id=file_in.parent_folder_id, size_delta=file_in.size, file_delta=1)
     
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        crud_quota.release_after_failure(db, reservation_id=reservation_id)
+        raise
     db.refresh(db_file)
     
     return db_file
 
-def delete_file(db: Session, *, file_id: UUID, owner_id: UUID) -> File | None:
-    db_file = get_file(db=db, file_id=file_id, owner_id=owner_id)
-    if not db_file:
-        return None
+def replace_file_content(
+    db: Session,
+    *,
+    db_file: File,
+    file_path: str,
+    filename: str,
+    size: int,
+    hash_sha256: str,
+    reservation_id: UUID | None = None
+) -> File:
+    """
+    Points a file record at a new storage object, e.g. a new version of its content.
 
-    # Get storage service and delete the physical file
-    storage_service = get_storage_service()
-    storage_service.delete(file_path=db_file.file_path)
+    The size difference is settled against the user's quota and the folder
+    rollups in the same commit, and the old object is queued for deletion
+    after STORAGE_DELETE_GRACE_SECONDS, so reads already using it can finish.
+
+    Returns:
+        The updated File object.
     """
-    Deletes a file from the database and storage, and updates user quota.
+    size_delta = size - db_file.size
+    crud_storage_deletion.schedule(db, file_paths=[db_file.file_path])
+    db_file.file_path = file_path
+    db_file.filename = filename
+    db_file.size = size
+    db_file.hash_sha256 = hash_sha256
+    db_file.hash_verified = True
+    db.add(db_file)
+
+    crud_quota.record_usage(db, user_id=db_file.owner_id, delta=size_delta)
+    crud_quota.release(db, reservation_id=reservation_id)
+    crud_folder.adjust_rollups(db, folder_id=db_file.parent_folder_id, size_delta=size_delta)
+
+    try:
+        db.commit()
+    except Exception:
+        crud_quota.release_after_failure(db, reservation_id=reservation_id)
+        raise
+    db.refresh(db_file)
+    return db_file
+
+def get_referenced_paths(db: Session, *, owner_id: UUID, file_paths: list[str]) -> set[str]:
+    """Returns the paths among `file_paths` that one of the user's file records, live or trashed, already points to."""
+    if not file_paths:
+        return set()
+    return set(db.scalars(select(File.file_path).where(File.owner_id == owner_id, File.file_path.in_(file_paths))))
+
+def create_files_batch(db: Session, *, files_in: list[FileCreate], reservation_id: UUID | None = None) -> list[UUID | None]:
+    """
+    Creates many file records at once for objects that are already stored.
+
+    The rows go in as multi-row INSERTs with client-side IDs, and the quota
+    and folder rollups are each updated once for the whole batch, all in a
+    single commit. The caller is expected to have validated parents and quota.
+    A file whose path another record of the owner already points to (e.g. one
+    registered concurrently) is skipped rather than failing the batch.
+
+    Args:
+        db: The database session.
+        files_in: The file creation schemas, all for the same owner.
+        reservation_id: The quota reservation taken for the whole batch, if any.
+            Released if the batch fails.
+
+    Returns:
+        The IDs of the new files, in the order of `files_in`, with None for
+        the skipped ones.
+    """
+    if not files_in:
+        return []
+    rows = [{"id": uuid4(), **file_in.model_dump()} for file_in in files_in]
+    try:
+        inserted = set(db.scalars(
+            insert(File.__table__)
+            .on_conflict_do_nothing(index_elements=["owner_id", "file_path"])
+            .returning(File.__table__.c.id),
+            rows
+        ))
+        created = [(row["id"], file_in) for row, file_in in zip(rows, files_in) if row["id"] in inserted]
+
+        per_parent = defaultdict(lambda: [0, 0])
+        for _, file_in in created:
+            per_parent[file_in.parent_folder_id][0] += file_in.size
+            per_parent[file_in.parent_folder_id][1] += 1
+        crud_folder.adjust_rollups_many(db, deltas=[
+            (parent_id, size, count, 0) for parent_id, (size, count) in per_parent.items()
+        ])
+        crud_quota.record_usage(db, user_id=files_in[0].owner_id, delta=sum(f.size for _, f in created))
+        crud_quota.release(db, reservation_id=reservation_id)
+
+        db.commit()
+    except Exception:
+        crud_quota.release_after_failure(db, reservation_id=reservation_id)
+        raise
+    return [row["id"] if row["id"] in inserted else None for row in rows]
+
+def delete_file(db: Session, *, file_id: UUID, owner_id: UUID) -> File | None:
+    """
+    Moves a file to the trash.
+
+    The storage object and the user's quota are released later, when the
+    trash purger hard-deletes the record.
 
     Args:
         db: The database session.
@@ -81,24 +190,16 @@ def delete_file(db: Session, *, file_id: UUID, owner_id: UUID) -> File | None:
         owner_id: The ID of the user who owns the file.
 
     Returns:
-        The deleted File object if found, otherwise None.
+        The trashed File object if found, otherwise None.
     """
     # Get the file to ensure it exists and belongs to the user
     db_file = get_file(db=db, file_id=file_id, owner_id=owner_id)
     if not db_file:
         return None
 
-    # Delete the physical file from storage
-    file_path = Path(db_file.file_path)
-    try:
-        if file_path.is_file():
-            os.remove(file_path)
-    except Exception as e:
-        # Log the error, but don't block the DB operation
-        print(f"Error deleting file from storage: {e}")
-
-    db.query(User).filter(User.id == owner_id).update({User.used_storage: User.used_storage - db_file.size})
-    db.delete(db_file)
+    db_file.deleted_at = func.now()
+    db.add(db_file)
+    crud_folder.adjust_rollups(db, folder_id=db_file.parent_folder_id, size_delta=-db_file.size, file_delta=-1)
     db.commit()
     return db_file
 
@@ -133,6 +234,9 @@ def move_file(db: Session, *, db_file: File, file_in: FileMove) -> File:
     Returns:
         The updated File object.
     """
+    if db_file.parent_folder_id != file_in.parent_folder_id:
+        crud_folder.adjust_rollups(db, folder_id=db_file.parent_folder_id, size_delta=-db_file.size, file_delta=-1)
+        crud_folder.adjust_rollups(db, folder_id=file_in.parent_folder_id, size_delta=db_file.size, file_delta=1)
     db_file.parent_folder_id = file_in.parent_folder_id
     db.add(db_file)
     db.commit()
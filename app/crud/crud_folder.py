@@ -1,13 +1,15 @@
 
-from sqlalchemy.orm import Session
+from sqlalchemy import BigInteger, Integer, column, insert, select, text, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.sql import func
-from uuid import UUID
+from uuid import UUID, uuid4
 from pathlib import Path
-from app.services.storage_service import get_storage_service
 from app.models.folder import Folder
 from app.models.user import User
 from app.schemas.folder import FolderCreate, FolderUpdate, FolderMove
 from app.models.file import File
+
 def get_folder(db: Session, *, folder_id: UUID, owner_id: UUID) -> Folder | None:
     """
     Fetches a folder by its ID, ensuring it belongs to the specified owner.
@@ -20,7 +22,85 @@ def get_folder(db: Session, *, folder_id: UUID, owner_id: UUID) -> Folder | None
     Returns:
         The Folder object if found and owned by the user, otherwise None.
     """
-    return db.query(Folder).filter(Folder.id == folder_id, Folder.owner_id == owner_id).first()
+    return db.query(Folder).filter(
+        Folder.id == folder_id,
+        Folder.owner_id == owner_id,
+        Folder.deleted_at.is_(None),
+        ~under_trashed_folder(Folder.parent_folder_id)
+    ).first()
+
+def get_visible_folder_ids(db: Session, *, folder_ids: set[UUID], owner_id: UUID) -> set[UUID]:
+    """
+    Returns which of `folder_ids` belong to the owner and are not in the trash,
+    with one query for the whole set.
+    """
+    if not folder_ids:
+        return set()
+    return set(db.scalars(select(Folder.id).where(
+        Folder.id.in_(folder_ids),
+        Folder.owner_id == owner_id,
+        Folder.deleted_at.is_(None),
+        ~under_trashed_folder(Folder.parent_folder_id)
+    )))
+
+
+def under_trashed_folder(parent_folder_id):
+    """
+    SQL predicate that is true when any folder on the ancestor chain starting
+    at `parent_folder_id` (a correlated column) is in the trash.
+
+    Trashing only marks the subtree root, so this walk is what hides the rest
+    of the subtree from direct lookups. It follows primary keys only, so the
+    cost is proportional to the tree depth.
+    """
+    anchor = aliased(Folder)
+    parent = aliased(Folder)
+    ancestors = (
+        select(anchor.id, anchor.parent_folder_id, anchor.deleted_at)
+        .where(anchor.id == parent_folder_id)
+        .correlate_except(anchor)
+        .cte("trash_ancestors", recursive=True, nesting=True)
+    )
+    ancestors = ancestors.union_all(
+        select(parent.id, parent.parent_folder_id, parent.deleted_at).where(parent.id == ancestors.c.parent_folder_id)
+    )
+    return select(ancestors.c.id).where(ancestors.c.deleted_at.isnot(None)).exists()
+
+
+def get_folder_contents(db: Session, *, folder_id: UUID | None, owner_id: UUID) -> tuple[list[Folder], list[File]]:
+    """
+    Lists the subfolders and files directly inside a folder (or the root when
+    `folder_id` is None), leaving out anything in the trash.
+
+    The caller is expected to have checked that the folder itself is visible.
+    """
+    subfolders = db.query(Folder).filter(
+        Folder.owner_id == owner_id,
+        Folder.parent_folder_id == folder_id,
+        Folder.deleted_at.is_(None)
+    ).all()
+    files = db.query(File).filter(
+        File.owner_id == owner_id,
+        File.parent_folder_id == folder_id,
+        File.deleted_at.is_(None)
+    ).all()
+    return subfolders, files
+
+
+def subtree_folder_ids(folder_ids: UUID | list[UUID], *, include_trashed: bool = True):
+    """
+    Returns a SELECT of the IDs of one or more folders and all of their
+    descendants, for use in `IN (...)` clauses.
+    """
+    if not isinstance(folder_ids, list):
+        folder_ids = [folder_ids]
+    child = aliased(Folder)
+    subtree = select(Folder.id).where(Folder.id.in_(folder_ids)).cte("subtree", recursive=True)
+    descendants = select(child.id).where(child.parent_folder_id == subtree.c.id)
+    if not include_trashed:
+        descendants = descendants.where(child.deleted_at.is_(None))
+    subtree = subtree.union_all(descendants)
+    return select(subtree.c.id)
 
 
 def create_folder(db: Session, *, folder_in: FolderCreate, owner: User) -> Folder:
@@ -53,11 +133,66 @@ def create_folder(db: Session, *, folder_in: FolderCreate, owner: User) -> Folde
     )
 
     db.add(db_folder)
+    adjust_rollups(db, folder_id=folder_in.parent_folder_id, folder_delta=1)
     db.commit()
     db.refresh(db_folder)
     
     return db_folder
 
+def ensure_folder_paths(
+    db: Session, *, owner_id: UUID, parent_folder: Folder | None, relative_paths: set[tuple[str, ...]]
+) -> dict[tuple[str, ...], UUID | None]:
+    """
+    Resolves relative folder paths (as tuples of names) below `parent_folder`,
+    creating the ones that don't exist yet.
+
+    Lookups and inserts are done one tree level at a time, so the number of
+    queries follows the depth of the paths rather than their count. Does not
+    commit.
+
+    Returns:
+        A mapping from every relative path, including its prefixes and the
+        empty path for `parent_folder` itself, to a folder ID.
+    """
+    resolved = {(): parent_folder.id if parent_folder else None}
+    paths = {(): parent_folder.path if parent_folder else ""}
+    wanted = {rel[:depth] for rel in relative_paths for depth in range(1, len(rel) + 1)}
+    rollup_deltas = []
+
+    for depth in range(1, max((len(rel) for rel in wanted), default=0) + 1):
+        level = [rel for rel in wanted if len(rel) == depth]
+        parent_ids = {resolved[rel[:-1]] for rel in level}
+        parent_filter = Folder.parent_folder_id.in_(parent_ids - {None})
+        if None in parent_ids:
+            parent_filter = parent_filter | Folder.parent_folder_id.is_(None)
+        existing = db.query(Folder.id, Folder.parent_folder_id, Folder.name, Folder.path).filter(
+            Folder.owner_id == owner_id,
+            parent_filter,
+            Folder.name.in_({rel[-1] for rel in level}),
+            Folder.deleted_at.is_(None)
+        ).all()
+        by_parent_and_name = {(f.parent_folder_id, f.name): f for f in existing}
+
+        new_rows = []
+        for rel in level:
+            parent_id = resolved[rel[:-1]]
+            match = by_parent_and_name.get((parent_id, rel[-1]))
+            if match:
+                resolved[rel], paths[rel] = match.id, match.path
+                continue
+            folder_id = uuid4()
+            resolved[rel], paths[rel] = folder_id, f"{paths[rel[:-1]]}/{rel[-1]}"
+            new_rows.append({
+                "id": folder_id, "name": rel[-1], "path": paths[rel],
+                "parent_folder_id": parent_id, "owner_id": owner_id,
+            })
+            rollup_deltas.append((parent_id, 0, 0, 1))
+        if new_rows:
+            db.execute(insert(Folder.__table__), new_rows)
+
+    adjust_rollups_many(db, deltas=rollup_deltas)
+    return resolved
+
 def rename_folder(db: Session, *, db_folder: Folder, folder_in: FolderUpdate) -> Folder:
     """
     Renames a folder and updates the paths of all its descendants.
@@ -109,58 +244,238 @@ def move_folder(db: Session, *, db_folder: Folder, new_parent_path: str, new_par
     Returns:
         The updated Folder object.
     """
-    old_path = db_folder.path
-    new_path = f"{new_parent_path}/{db_folder.name}".replace("//", "/")
+    shift_rollups(db, db_folder=db_folder, old_parent_id=db_folder.parent_folder_id, new_parent_id=new_parent_id)
 
-    # Update paths of all descendant folders and files within them
-    db.query(Folder).filter(Folder.path.like(f"{old_path}/%")).update(
-        {Folder.path: func.replace(Folder.path, old_path, new_path)},
-        synchronize_session=False
-    )
+    # Update the target folder and the paths of all its descendants
+    move_subtrees(db, folder_ids=[db_folder.id], new_parent_id=new_parent_id, new_parent_path=new_parent_path)
 
-    # Update the target folder itself
-    db_folder.path = new_path
-    db_folder.parent_folder_id = new_parent_id
-    
-    db.add(db_folder)
     db.commit()
     db.refresh(db_folder)
 
     return db_folder
 
+
+# Rewrites the folder and its whole subtree in one pass. Paths are rebuilt from
+# the names along the parent_folder_id chain rather than by string replacement,
+# and a selected folder nested in another selected folder starts its own walk.
+_MOVE_SUBTREES_SQL = """
+WITH RECURSIVE roots AS (
+    SELECT id FROM folders WHERE id = ANY(CAST(:folder_ids AS uuid[]))
+),
+moved AS (
+    SELECT f.id, CAST(:new_parent_path || '/' || f.name AS text) AS new_path, CAST(:new_parent_id AS uuid) AS new_parent_id
+    FROM folders f
+    JOIN roots r ON r.id = f.id
+    UNION ALL
+    SELECT f.id, m.new_path || '/' || f.name, f.parent_folder_id
+    FROM folders f
+    JOIN moved m ON f.parent_folder_id = m.id
+    WHERE f.id NOT IN (SELECT id FROM roots)
+)
+UPDATE folders
+SET path = moved.new_path, parent_folder_id = moved.new_parent_id, updated_at = now()
+FROM moved
+WHERE folders.id = moved.id
+"""
+
+def move_subtrees(db: Session, *, folder_ids: list[UUID], new_parent_id: UUID | None, new_parent_path: str) -> int:
+    """
+    Re-parents a set of folders and rewrites the paths of everything below
+    them in a single statement. Rollups are left to the caller. Does not commit.
+
+    Returns:
+        The number of folder rows rewritten.
+    """
+    if not folder_ids:
+        return 0
+    result = db.execute(text(_MOVE_SUBTREES_SQL), {
+        "folder_ids": [str(folder_id) for folder_id in folder_ids],
+        "new_parent_id": str(new_parent_id) if new_parent_id else None,
+        "new_parent_path": new_parent_path.rstrip("/"),
+    })
+    return result.rowcount
+
 def delete_folder(db: Session, *, folder_id: UUID, owner_id: UUID) -> bool:
     """
-    Deletes a folder and all its contents (files and subfolders).
+    Moves a folder and all its contents (files and subfolders) to the trash.
+
+    Only the folder itself is marked, so this is O(1) regardless of subtree
+    size; its descendants become invisible through `under_trashed_folder`.
+    Storage objects and quota are released later by the trash purger.
     """
-    folder_to_delete = db.query(Folder).filter(Folder.id == folder_id, Folder.owner_id == owner_id).first()
+    folder_to_delete = get_folder(db, folder_id=folder_id, owner_id=owner_id)
     if not folder_to_delete:
         return False
 
-    storage_service = get_storage_service()
-    total_size_deleted = 0
+    folder_to_delete.deleted_at = func.now()
+    db.add(folder_to_delete)
+    adjust_rollups(
+        db,
+        folder_id=folder_to_delete.parent_folder_id,
+        size_delta=-folder_to_delete.total_size,
+        file_delta=-folder_to_delete.file_count,
+        folder_delta=-(folder_to_delete.folder_count + 1),
+    )
+    
+    db.commit()
+    return True
 
-    # Find all descendant folders, including the target one itself
-    all_folders_to_delete = db.query(Folder).filter(Folder.path.like(f"{folder_to_delete.path}%"), Folder.owner_id == owner_id).all()
-    folder_ids_to_delete = [f.id for f in all_folders_to_delete]
 
-    # Find all files within these folders
-    files_to_delete = db.query(File).filter(File.parent_folder_id.in_(folder_ids_to_delete)).all()
+def adjust_rollups(
+    db: Session,
+    *,
+    folder_id: UUID | None,
+    size_delta: int = 0,
+    file_delta: int = 0,
+    folder_delta: int = 0,
+) -> None:
+    """
+    Applies size/count deltas to a folder and all of its ancestors.
+
+    The ancestor chain is resolved with a recursive CTE inside a single UPDATE,
+    so the cost is one statement regardless of tree depth. Does not commit.
 
-    # Delete physical files from storage and sum their sizes for quota update
-    for file in files_to_delete:
-        storage_service.delete(file.file_path)
-        total_size_deleted += file.size
+    Args:
+        db: The database session.
+        folder_id: The folder whose subtree changed. `None` (the root) is a no-op.
+        size_delta: Bytes added to (or removed from) the subtree.
+        file_delta: Files added to (or removed from) the subtree.
+        folder_delta: Folders added to (or removed from) the subtree.
+    """
+    if folder_id is None or not (size_delta or file_delta or folder_delta):
+        return
+
+    anchor = aliased(Folder)
+    parent = aliased(Folder)
+    ancestors = (
+        select(anchor.id, anchor.parent_folder_id)
+        .where(anchor.id == folder_id)
+        .cte("ancestors", recursive=True)
+    )
+    ancestors = ancestors.union_all(
+        select(parent.id, parent.parent_folder_id).where(parent.id == ancestors.c.parent_folder_id)
+    )
+
+    db.query(Folder).filter(Folder.id.in_(select(ancestors.c.id))).update(
+        {
+            Folder.total_size: Folder.total_size + size_delta,
+            Folder.file_count: Folder.file_count + file_delta,
+            Folder.folder_count: Folder.folder_count + folder_delta,
+        },
+        synchronize_session=False
+    )
+
+
+def adjust_rollups_many(db: Session, *, deltas: list[tuple[UUID | None, int, int, int]]) -> None:
+    """
+    Applies several `(folder_id, size_delta, file_delta, folder_delta)`
+    adjustments at once. All ancestor chains are walked and summed per
+    folder inside a single UPDATE. Does not commit.
+    """
+    deltas = [d for d in deltas if d[0] is not None and any(d[1:])]
+    if not deltas:
+        return
+    rows = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("size_delta", BigInteger),
+        column("file_delta", Integer),
+        column("folder_delta", Integer),
+        name="deltas",
+    ).data(deltas)
 
-    # Delete the top-level folder from the database.
-    # The `ondelete="CASCADE"` in the models will handle deleting all subfolder
-    # and file records from the database.
-    db.delete(folder_to_delete)
+    chain = select(rows.c.id, rows.c.size_delta, rows.c.file_delta, rows.c.folder_delta).cte("chain", recursive=True)
+    chain = chain.union_all(
+        select(Folder.parent_folder_id, chain.c.size_delta, chain.c.file_delta, chain.c.folder_delta)
+        .join(chain, Folder.id == chain.c.id)
+        .where(Folder.parent_folder_id.isnot(None))
+    )
+    totals = select(
+        chain.c.id,
+        func.sum(chain.c.size_delta).label("size_delta"),
+        func.sum(chain.c.file_delta).label("file_delta"),
+        func.sum(chain.c.folder_delta).label("folder_delta"),
+    ).group_by(chain.c.id).subquery()
 
-    # Update the user's storage quota
-    if total_size_deleted > 0:
-        db.query(User).filter(User.id == owner_id).update(
-            {User.used_storage: User.used_storage - total_size_deleted}
+    db.execute(
+        update(Folder)
+        .where(Folder.id == totals.c.id)
+        .values(
+            total_size=Folder.total_size + totals.c.size_delta,
+            file_count=Folder.file_count + totals.c.file_delta,
+            folder_count=Folder.folder_count + totals.c.folder_delta,
         )
-    
-    db.commit()
-    return True
+        .execution_options(synchronize_session=False)
+    )
+
+
+def shift_rollups(db: Session, *, db_folder: Folder, old_parent_id: UUID | None, new_parent_id: UUID | None) -> None:
+    """
+    Moves a folder's subtree totals from its old ancestor chain to its new one.
+
+    Must be called before `db_folder.parent_folder_id` is changed and flushed,
+    while the old chain is still what the database sees. Does not commit.
+    """
+    if old_parent_id == new_parent_id:
+        return
+    size, files, folders = db_folder.total_size, db_folder.file_count, db_folder.folder_count + 1
+    adjust_rollups(db, folder_id=old_parent_id, size_delta=-size, file_delta=-files, folder_delta=-folders)
+    adjust_rollups(db, folder_id=new_parent_id, size_delta=size, file_delta=files, folder_delta=folders)
+
+
+# Rebuilds every rollup from scratch using a folder closure table built on the fly.
+# Trashed items don't count towards their ancestors (a trashed folder still
+# reports its own contents). Kept as raw SQL because it is easier to read.
+_RECOMPUTE_ROLLUPS_SQL = """
+WITH RECURSIVE closure(ancestor_id, descendant_id) AS (
+    SELECT id, id FROM folders
+    WHERE (CAST(:owner_id AS uuid) IS NULL OR owner_id = :owner_id)
+      AND (CAST(:folder_ids AS uuid[]) IS NULL OR id = ANY(CAST(:folder_ids AS uuid[])))
+    UNION ALL
+    SELECT c.ancestor_id, f.id
+    FROM closure c
+    JOIN folders f ON f.parent_folder_id = c.descendant_id AND f.deleted_at IS NULL
+),
+folder_totals AS (
+    SELECT ancestor_id, COUNT(*) - 1 AS folder_count
+    FROM closure
+    GROUP BY ancestor_id
+),
+file_totals AS (
+    SELECT c.ancestor_id, SUM(fi.size) AS total_size, COUNT(fi.id) AS file_count
+    FROM closure c
+    JOIN files fi ON fi.parent_folder_id = c.descendant_id AND fi.deleted_at IS NULL
+    GROUP BY c.ancestor_id
+)
+UPDATE folders
+SET total_size = COALESCE(file_totals.total_size, 0),
+    file_count = COALESCE(file_totals.file_count, 0),
+    folder_count = folder_totals.folder_count
+FROM folder_totals
+LEFT JOIN file_totals ON file_totals.ancestor_id = folder_totals.ancestor_id
+WHERE folders.id = folder_totals.ancestor_id
+"""
+
+def recompute_rollups(db: Session, *, owner_id: UUID | None = None, folder_ids: list[UUID] | None = None, commit: bool = True) -> int:
+    """
+    Recomputes `total_size`, `file_count` and `folder_count` for every folder.
+
+    This is the repair job for the incrementally maintained rollups; it is safe
+    to run at any time and fixes any drift left behind by out-of-band changes.
+
+    Args:
+        db: The database session.
+        owner_id: Restrict the repair to one user's folders. `None` repairs all.
+        folder_ids: Restrict the repair to these folders (their ancestors are
+            not touched).
+        commit: Whether to commit once done.
+
+    Returns:
+        The number of folders updated.
+    """
+    result = db.execute(text(_RECOMPUTE_ROLLUPS_SQL), {
+        "owner_id": str(owner_id) if owner_id else None,
+        "folder_ids": [str(folder_id) for folder_id in folder_ids] if folder_ids is not None else None,
+    })
+    if commit:
+        db.commit()
+    return result.rowcount
@@ -1,9 +1,17 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from sqlalchemy.sql import func
 from uuid import UUID
 
 from app.models import File, User, FilePermission
 from app.schemas.permission import PermissionCreate
-from . import crud_user
+from . import crud_folder, crud_user
+
+READ_PERMISSION_TYPES = ('read', 'write')
+
+def _is_active():
+    """SQL predicate for grants that have not expired."""
+    return or_(FilePermission.expires_at.is_(None), FilePermission.expires_at > func.now())
 
 def grant_permission(db: Session, *, db_file: File, permission_in: PermissionCreate, granter: User) -> FilePermission | None:
     """
@@ -22,7 +30,7 @@ def grant_permission(db: Session, *, db_file: File, permission_in: PermissionCre
 
     if existing_perm:
         # Update existing permission
-        existing_perm.permission_type = permission_in.permission_type
+        existing_perm.permission_type = permission_in.permission_type.value
         existing_perm.expires_at = permission_in.expires_at
         db.add(existing_perm)
     else:
@@ -45,11 +53,39 @@ def has_read_permission(db: Session, *, db_file: File, user: User) -> bool:
     """
     if db_file.owner_id == user.id:
         return True
-    
-    permission = db.query(FilePermission).filter(
-        FilePermission.file_id == db_file.id,
+    return db_file.id in get_readable_file_ids(db, file_ids=[db_file.id], user=user)
+
+def get_readable_file_ids(db: Session, *, file_ids: list[UUID], user: User) -> set[UUID]:
+    """
+    Resolves which of `file_ids` a user may read, in one query: files they own
+    plus files shared with them through a grant that has not expired.
+    """
+    if not file_ids:
+        return set()
+    shared = select(FilePermission.file_id).where(
+        FilePermission.file_id.in_(file_ids),
         FilePermission.user_id == user.id,
-        FilePermission.permission_type.in_(['read', 'write'])
-    ).first()
+        FilePermission.permission_type.in_(READ_PERMISSION_TYPES),
+        _is_active()
+    )
+    return set(db.scalars(select(File.id).where(
+        File.id.in_(file_ids),
+        or_(File.owner_id == user.id, File.id.in_(shared))
+    )))
+
+def list_shared_with_me(db: Session, *, user: User, skip: int = 0, limit: int = 50) -> tuple[list[tuple[File, FilePermission]], bool]:
+    """
+    Lists the files other users have shared with `user`, newest grants first.
+    Expired grants and files in the trash are left out.
 
-    return permission is not None
+    Returns:
+        A tuple of ((file, permission) pairs, has_more).
+    """
+    rows = db.query(File, FilePermission).join(FilePermission, FilePermission.file_id == File.id).filter(
+        FilePermission.user_id == user.id,
+        FilePermission.permission_type.in_(READ_PERMISSION_TYPES),
+        _is_active(),
+        File.deleted_at.is_(None),
+        ~crud_folder.under_trashed_folder(File.parent_folder_id)
+    ).order_by(FilePermission.created_at.desc(), FilePermission.id).offset(skip).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
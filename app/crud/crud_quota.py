@@ -0,0 +1,221 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import ARRAY, bindparam, func, text
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta, timezone
+import random
+
+from app.core.config import settings
+from app.models.quota import StorageDelta, QuotaReservation
+from app.models.user import User
+
+def record_usage(db: Session, *, user_id: UUID, delta: int) -> None:
+    """
+    Records a change to a user's used storage without touching the user row.
+
+    The delta is added to one of a few randomly picked shard rows, so concurrent
+    writers for the same user rarely wait on each other. Does not commit.
+
+    Args:
+        db: The database session.
+        user_id: The user whose usage changed.
+        delta: Bytes added (positive) or freed (negative).
+    """
+    if not delta:
+        return
+    stmt = insert(StorageDelta).values(
+        user_id=user_id,
+        shard=random.randrange(settings.QUOTA_DELTA_SHARDS),
+        delta=delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StorageDelta.user_id, StorageDelta.shard],
+        set_={"delta": StorageDelta.delta + stmt.excluded.delta}
+    )
+    db.execute(stmt)
+
+def get_used_storage(db: Session, *, user: User) -> int:
+    """
+    Returns a user's used storage including deltas not yet folded in.
+    """
+    pending = db.query(func.coalesce(func.sum(StorageDelta.delta), 0)).filter(
+        StorageDelta.user_id == user.id
+    ).scalar()
+    return user.used_storage + pending
+
+# Takes `size` bytes from the allowance of one of the user's shards, skipping
+# shards another reservation is drawing from right now
+_DRAW_ALLOWANCE_SQL = """
+UPDATE storage_deltas
+SET allowance = allowance - :size
+WHERE (user_id, shard) = (
+    SELECT user_id, shard FROM storage_deltas
+    WHERE user_id = :user_id AND allowance >= :size
+    ORDER BY random()
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING shard
+"""
+
+def reserve(db: Session, *, user_id: UUID, size: int, ttl: timedelta | None = None) -> UUID | None:
+    """
+    Holds `size` bytes of a user's quota for an upload that is about to start.
+
+    The bytes are drawn from one shard's allowance, so concurrent reservations
+    by the same user only ever lock a shard row. When no shard has enough
+    left, the user row is locked, the allowances are pooled back and the free
+    quota is computed exactly, then spread over the shards again. Commits.
+
+    Args:
+        db: The database session.
+        user_id: The user uploading.
+        size: The number of bytes to hold.
+        ttl: How long the reservation lives if never settled.
+
+    Returns:
+        The reservation ID, or None if the upload would exceed the quota.
+    """
+    now = datetime.now(timezone.utc)
+    drawn = db.execute(text(_DRAW_ALLOWANCE_SQL), {"user_id": str(user_id), "size": size}).first()
+    if not drawn and not _refill_allowances(db, user_id=user_id, size=size, now=now):
+        db.rollback()
+        return None
+
+    reservation_id = uuid4()
+    db.add(QuotaReservation(
+        id=reservation_id,
+        user_id=user_id,
+        size=size,
+        expires_at=now + (ttl or timedelta(minutes=settings.QUOTA_RESERVATION_TTL_MINUTES))
+    ))
+    db.commit()
+    return reservation_id
+
+def _refill_allowances(db: Session, *, user_id: UUID, size: int, now: datetime) -> bool:
+    """
+    The slow path of `reserve`: with the user row locked, takes every shard's
+    allowance back and, if `size` bytes are free, spreads what is left after
+    them over the shards. Returns False if they aren't. Does not commit.
+
+    Allowances only ever cover quota that is free, and settling or dropping a
+    reservation never gives any back, so usage plus reservations can't
+    overshoot the quota between two refills.
+    """
+    # NO KEY UPDATE, so reservations drawing from a shard can still take their
+    # foreign key lock on the user row instead of deadlocking with this one
+    quota, used = db.query(User.storage_quota, User.used_storage).filter(User.id == user_id).with_for_update(key_share=True).one()
+    # Waits for reservations drawing from a shard right now, so they are counted below
+    db.query(StorageDelta).filter(StorageDelta.user_id == user_id).update(
+        {StorageDelta.allowance: 0}, synchronize_session=False
+    )
+    pending = db.query(func.coalesce(func.sum(StorageDelta.delta), 0)).filter(
+        StorageDelta.user_id == user_id
+    ).scalar()
+    reserved = db.query(func.coalesce(func.sum(QuotaReservation.size), 0)).filter(
+        QuotaReservation.user_id == user_id,
+        QuotaReservation.expires_at > now
+    ).scalar()
+
+    spare = quota - used - pending - reserved - size
+    if spare < 0:
+        return False
+
+    shards = settings.QUOTA_DELTA_SHARDS
+    stmt = insert(StorageDelta).values([
+        {"user_id": user_id, "shard": shard, "delta": 0, "allowance": spare // shards}
+        for shard in range(shards)
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[StorageDelta.user_id, StorageDelta.shard],
+        set_={"allowance": stmt.excluded.allowance}
+    ))
+    return True
+
+def release(db: Session, *, reservation_id: UUID | None) -> None:
+    """
+    Drops a reservation. Does not commit, so it can share the transaction
+    that records the settled usage.
+    """
+    if reservation_id is None:
+        return
+    db.query(QuotaReservation).filter(QuotaReservation.id == reservation_id).delete(synchronize_session=False)
+
+def release_after_failure(db: Session, *, reservation_id: UUID | None) -> None:
+    """
+    Rolls back a transaction that failed to settle a reservation and drops
+    the reservation on its own, so the quota isn't held until it expires.
+    Commits.
+    """
+    db.rollback()
+    if reservation_id is None:
+        return
+    release(db, reservation_id=reservation_id)
+    db.commit()
+
+def release_many(db: Session, *, reservation_ids: list[UUID]) -> None:
+    """
+    Drops several reservations with one statement. Does not commit.
+    """
+    reservation_ids = [r for r in reservation_ids if r is not None]
+    if not reservation_ids:
+        return
+    db.query(QuotaReservation).filter(QuotaReservation.id.in_(reservation_ids)).delete(synchronize_session=False)
+
+# Allowances go with the folded rows; the next reservation hands them out again
+_FOLD_DELTAS_SQL = """
+WITH folded AS (
+    DELETE FROM storage_deltas RETURNING user_id, delta
+)
+UPDATE users
+SET used_storage = users.used_storage + pending.delta
+FROM (SELECT user_id, SUM(delta) AS delta FROM folded GROUP BY user_id) pending
+WHERE users.id = pending.user_id
+RETURNING users.id
+"""
+
+# Deltas committed after the fold are subtracted so that the corrected
+# used_storage plus the remaining deltas still equals SUM(files.size).
+_FIX_DRIFT_SQL = """
+UPDATE users
+SET used_storage = COALESCE(actual.total, 0) - COALESCE(pending.delta, 0)
+FROM users u
+LEFT JOIN (
+    SELECT owner_id, SUM(size) AS total FROM files WHERE owner_id = ANY(:user_ids) GROUP BY owner_id
+) actual ON actual.owner_id = u.id
+LEFT JOIN (
+    SELECT user_id, SUM(delta) AS delta FROM storage_deltas WHERE user_id = ANY(:user_ids) GROUP BY user_id
+) pending ON pending.user_id = u.id
+WHERE users.id = u.id
+  AND u.id = ANY(:user_ids)
+  AND users.used_storage <> COALESCE(actual.total, 0) - COALESCE(pending.delta, 0)
+"""
+
+def reconcile(db: Session, *, batch_size: int | None = None) -> dict:
+    """
+    Folds pending deltas into `users.used_storage`, drops expired
+    reservations, then corrects any drift against `SUM(files.size)`.
+
+    Only users whose storage changed since the last run (the ones with
+    deltas to fold) are checked for drift, `batch_size` users per
+    transaction, so a run costs what happened since the previous one rather
+    than a scan of every file. Commits after each step.
+
+    Returns:
+        A summary of how many rows each step touched.
+    """
+    batch_size = batch_size or settings.QUOTA_RECONCILE_BATCH_SIZE
+    expired = db.query(QuotaReservation).filter(
+        QuotaReservation.expires_at <= datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
+    active = list(db.scalars(text(_FOLD_DELTAS_SQL)))
+    db.commit()
+
+    corrected = 0
+    for start in range(0, len(active), batch_size):
+        user_ids = [str(user_id) for user_id in active[start:start + batch_size]]
+        corrected += db.execute(
+            text(_FIX_DRIFT_SQL).bindparams(bindparam("user_ids", type_=ARRAY(PG_UUID))), {"user_ids": user_ids}
+        ).rowcount
+        db.commit()
+    return {"expired_reservations": expired, "folded_users": len(active), "corrected_users": corrected}
@@ -0,0 +1,143 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import case, func, literal, null, select, tuple_, union_all
+from uuid import UUID
+import base64
+import json
+
+from app.core.config import settings
+from app.models import File, Folder
+from app.crud import crud_folder
+
+class InvalidCursor(Exception):
+    """A search cursor that wasn't issued for this query."""
+
+def _encode_cursor(row) -> str:
+    key = [row.rank, row.name_length, row.name, str(row.id)]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[int, int, str, UUID]:
+    try:
+        rank, length, name, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), int(length), str(name), UUID(id_)
+    except (ValueError, TypeError):
+        raise InvalidCursor("The cursor is not valid.")
+
+def _escape_like(value: str) -> str:
+    """Escapes LIKE wildcards so user input is matched literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _rank(column, query: str):
+    """0 for an exact match, 1 for a prefix match, 2 for a substring match."""
+    lowered = query.lower()
+    return case(
+        (func.lower(column) == lowered, 0),
+        (func.lower(column).like(f"{_escape_like(lowered)}%", escape="\\"), 1),
+        else_=2,
+    )
+
+def search_items(
+    db: Session,
+    *,
+    owner_id: UUID,
+    query: str,
+    cursor: str | None = None,
+    limit: int = 50
+) -> tuple[list[dict], str | None, bool]:
+    """
+    Finds a user's files and folders whose name contains `query`.
+
+    The `ILIKE '%query%'` filters are served by the owner-scoped trigram GIN
+    indexes on live `files.original_name` and `folders.name` (see
+    migrations/0013_owner_search_indexes.py). Results are ranked exact >
+    prefix > substring, then shorter names first. At most
+    SEARCH_MAX_CANDIDATES matches of each type are ranked, so a query that
+    matches more than that is answered from the first ones found.
+
+    Args:
+        db: The database session.
+        owner_id: The user whose tree is searched.
+        query: The text to look for, matched case-insensitively.
+        cursor: The `next_cursor` of the previous page, if any.
+        limit: The maximum number of results to return.
+
+    Returns:
+        A tuple of (results, next_cursor, truncated). `next_cursor` is None
+        on the last page; `truncated` tells whether matches were left out.
+
+    Raises:
+        InvalidCursor: If `cursor` can't be decoded.
+    """
+    pattern = f"%{_escape_like(query)}%"
+    parent = aliased(Folder)
+
+    file_filters = [File.owner_id == owner_id, File.deleted_at.is_(None), File.original_name.ilike(pattern, escape="\\")]
+    folder_filters = [Folder.owner_id == owner_id, Folder.deleted_at.is_(None), Folder.name.ilike(pattern, escape="\\")]
+    # Walking every hit's ancestors is only needed if something could hide it
+    has_trashed_folders = db.query(
+        db.query(Folder.id).filter(Folder.owner_id == owner_id, Folder.deleted_at.isnot(None)).exists()
+    ).scalar()
+    if has_trashed_folders:
+        file_filters.append(~crud_folder.under_trashed_folder(File.parent_folder_id))
+        folder_filters.append(~crud_folder.under_trashed_folder(Folder.parent_folder_id))
+
+    file_hits = (
+        select(
+            literal("file").label("type"),
+            File.id.label("id"),
+            File.original_name.label("name"),
+            func.coalesce(parent.path, "").label("parent_path"),
+            File.parent_folder_id.label("parent_folder_id"),
+            File.size.label("size"),
+            File.mime_type.label("mime_type"),
+            File.updated_at.label("updated_at"),
+            _rank(File.original_name, query).label("rank"),
+        )
+        .outerjoin(parent, parent.id == File.parent_folder_id)
+        .where(*file_filters)
+    )
+    folder_hits = (
+        select(
+            literal("folder").label("type"),
+            Folder.id.label("id"),
+            Folder.name.label("name"),
+            Folder.path.label("parent_path"),
+            Folder.parent_folder_id.label("parent_folder_id"),
+            null().label("size"),
+            null().label("mime_type"),
+            Folder.updated_at.label("updated_at"),
+            _rank(Folder.name, query).label("rank"),
+        )
+        .where(*folder_filters)
+    )
+
+    # Unordered, so each branch stops reading its index after the cap
+    cap = settings.SEARCH_MAX_CANDIDATES
+    candidates = union_all(file_hits.limit(cap), folder_hits.limit(cap)).subquery()
+    hits = select(
+        candidates,
+        func.length(candidates.c.name).label("name_length"),
+        func.count().over(partition_by=candidates.c.type).label("found"),
+    ).subquery()
+    sort_key = (hits.c.rank, hits.c.name_length, hits.c.name, hits.c.id)
+    page = select(hits).order_by(*sort_key).limit(limit + 1)  # One extra row tells us whether there is another page
+    if cursor:
+        page = page.where(tuple_(*sort_key) > tuple_(*_decode_cursor(cursor)))
+    rows = db.execute(page).all()
+
+    results = []
+    for row in rows[:limit]:
+        # Folders already carry their full path; files are placed under their parent's
+        path = row.parent_path if row.type == "folder" else f"{row.parent_path}/{row.name}"
+        results.append({
+            "type": row.type,
+            "id": row.id,
+            "name": row.name,
+            "path": path,
+            "parent_folder_id": row.parent_folder_id,
+            "size": row.size,
+            "mime_type": row.mime_type,
+            "updated_at": row.updated_at,
+        })
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    truncated = any(row.found >= cap for row in rows)
+    return results, next_cursor, truncated
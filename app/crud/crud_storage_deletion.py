@@ -0,0 +1,45 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert
+from datetime import timedelta
+
+from app.core.config import settings
+from app.models.storage_deletion import PendingStorageDeletion
+from app.services.storage_service import BaseStorageService
+
+def schedule(db: Session, *, file_paths: list[str]) -> None:
+    """
+    Queues storage objects for deletion once STORAGE_DELETE_GRACE_SECONDS
+    have passed. Does not commit, so the objects are only queued if the
+    change that orphaned them is committed too.
+    """
+    if not file_paths:
+        return
+    delete_after = func.now() + timedelta(seconds=settings.STORAGE_DELETE_GRACE_SECONDS)
+    db.execute(insert(PendingStorageDeletion.__table__).values(
+        [{"file_path": file_path, "delete_after": delete_after} for file_path in file_paths]
+    ))
+
+def reap_due(db: Session, *, storage_service: BaseStorageService, batch_size: int | None = None) -> dict:
+    """
+    Deletes queued storage objects whose grace period is over, in batches:
+    the objects first, then their rows. Rows are claimed with SKIP LOCKED, so
+    several reapers can run at once. Commits after each batch.
+    """
+    batch_size = batch_size or settings.STORAGE_DELETE_BATCH_SIZE
+    deleted = 0
+    while True:
+        due = db.query(PendingStorageDeletion).filter(
+            PendingStorageDeletion.delete_after <= func.now()
+        ).order_by(PendingStorageDeletion.delete_after).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not due:
+            break
+
+        storage_service.delete_many([d.file_path for d in due])
+        db.query(PendingStorageDeletion).filter(
+            PendingStorageDeletion.id.in_([d.id for d in due])
+        ).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(due)
+        if len(due) < batch_size:
+            break
+    return {"deleted_objects": deleted}
@@ -0,0 +1,321 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import ARRAY, BigInteger, Text, TIMESTAMP, bindparam, cast, func, select
+from datetime import datetime
+from uuid import UUID
+
+from app.models import File, Folder, User
+from app.schemas.file import FileCreate
+from app.services.storage_service import BaseStorageService
+from app.crud import crud_bulk, crud_file, crud_folder, crud_quota
+
+def diff_manifest(
+    db: Session,
+    *,
+    owner_id: UUID,
+    root_folder: Folder | None,
+    entries: list[tuple[str, int, str, datetime]],
+    last_synced_at: datetime | None = None
+) -> dict:
+    """
+    Compares a client's local tree with the live files below `root_folder`.
+
+    `entries` are `(relative path, size, sha256, mtime)` with normalized,
+    unique paths. The manifest is joined against the folder tree, trash
+    included, in a single FULL OUTER JOIN on the relative path, then each
+    side's changes are told apart with `last_synced_at`:
+
+    - same path, different content: uploaded if only the local copy changed
+      since the last sync, downloaded if only the server copy did, otherwise
+      a conflict;
+    - a local file whose server copy was trashed since the last sync, and
+      which hasn't changed locally since: deleted locally. Only trash counts
+      as evidence here, so nothing local is deleted on a guess;
+    - a path on one side only whose content sits at a path on the other side
+      only: a rename, applied on the side that didn't make it;
+    - a server file missing locally: trashed on the server if it hasn't
+      changed since the last sync, otherwise downloaded;
+    - any other local file: uploaded, or reported as registerable when it is
+      new and the user already stores the same content;
+    - a path holding several live server files: reported as a duplicate and
+      left alone on both sides until all but one are renamed or trashed.
+
+    Returns:
+        A dict shaped like SyncDiffResponse.
+    """
+    rows = db.execute(_diff_query(owner_id, root_folder, entries)).all()
+
+    result = {
+        "upload": [], "registerable": [], "download": [], "delete_local": [], "delete_remote": [],
+        "rename_local": [], "rename_remote": [], "conflicts": [], "duplicates": [], "unchanged": 0,
+    }
+    # Live server files by path; a local entry is joined to each of them
+    live = {}
+    for row in rows:
+        if row.remote_id is not None and row.trashed_at is None:
+            live.setdefault(row.remote_path, set()).add(row.remote_id)
+    duplicated = {path for path, file_ids in live.items() if len(file_ids) > 1}
+    for path in sorted(duplicated):
+        result["duplicates"].append({"path": path, "file_ids": sorted(live[path], key=str)})
+
+    local_only, remote_only = [], []
+    for row in rows:
+        if row.remote_path in duplicated:
+            continue
+        if row.remote_id is None:
+            local_only.append(row)
+        elif row.trashed_at is not None:
+            if row.local_path is None:
+                continue
+            if last_synced_at is not None and row.trashed_at > last_synced_at and row.mtime <= last_synced_at:
+                result["delete_local"].append(row.local_path)
+            else:
+                local_only.append(row)
+        elif row.local_path is None:
+            remote_only.append(row)
+        elif row.local_sha256 == row.remote_sha256 and row.local_size == row.remote_size:
+            result["unchanged"] += 1
+        else:
+            local_changed = last_synced_at is None or row.mtime > last_synced_at
+            remote_changed = last_synced_at is None or row.updated_at > last_synced_at
+            if local_changed and remote_changed:
+                result["conflicts"].append({"path": row.local_path, "file_id": row.remote_id})
+            elif local_changed:
+                result["upload"].append({"path": row.local_path, "file_id": row.remote_id})
+            else:
+                result["download"].append(_remote_file(row))
+
+    # Pair up one-sided paths with the same content as renames
+    renamed_to = {}
+    if last_synced_at is not None:
+        unclaimed = {}
+        for row in remote_only:
+            unclaimed.setdefault((row.remote_sha256, row.remote_size), []).append(row)
+        for row in local_only:
+            candidates = unclaimed.get((row.local_sha256, row.local_size))
+            if candidates:
+                renamed_to[row.local_path] = candidates.pop()
+
+    for row in local_only:
+        remote = renamed_to.get(row.local_path)
+        if remote is not None:
+            # A move rarely touches the local mtime, so the server side decides who moved it
+            side = "rename_local" if remote.updated_at > last_synced_at else "rename_remote"
+            if side == "rename_local":
+                rename = {"file_id": remote.remote_id, "from_path": row.local_path, "to_path": remote.remote_path}
+            else:
+                rename = {"file_id": remote.remote_id, "from_path": remote.remote_path, "to_path": row.local_path}
+            result[side].append(rename)
+        else:
+            result["upload"].append({"path": row.local_path})
+
+    renamed_ids = {remote.remote_id for remote in renamed_to.values()}
+    for row in remote_only:
+        if row.remote_id in renamed_ids:
+            continue
+        if last_synced_at is not None and row.updated_at <= last_synced_at:
+            result["delete_remote"].append(_remote_file(row))
+        else:
+            result["download"].append(_remote_file(row))
+
+    # New content that is already stored somewhere can be registered instead
+    # of uploaded. Not for changed files: registering creates a second file.
+    by_path = {row.local_path: row for row in rows if row.local_path}
+    new_files = [u for u in result["upload"] if "file_id" not in u]
+    contents = {(by_path[u["path"]].local_sha256, by_path[u["path"]].local_size) for u in new_files}
+    sources = find_content_sources(db, owner_id=owner_id, contents=contents)
+    uploads = []
+    for upload in result["upload"]:
+        row = by_path[upload["path"]]
+        source_id = sources.get((row.local_sha256, row.local_size)) if "file_id" not in upload else None
+        if source_id:
+            result["registerable"].append({"path": upload["path"], "source_file_id": source_id})
+        else:
+            uploads.append(upload)
+    result["upload"] = uploads
+    return result
+
+def find_content_sources(db: Session, *, owner_id: UUID, contents: set[tuple[str, int]]) -> dict[tuple[str, int], UUID]:
+    """
+    Maps `(sha256, size)` pairs to one of the user's live files with that
+    content, for the pairs that have one. Uses the hash index, one query.
+    """
+    if not contents:
+        return {}
+    rows = db.execute(
+        select(File.hash_sha256, File.size, File.id)
+        .where(
+            File.owner_id == owner_id,
+            File.hash_sha256.in_({sha256 for sha256, _ in contents}),
+            # A claimed hash doesn't prove the user holds that content
+            File.hash_verified.is_(True),
+            File.deleted_at.is_(None),
+            ~crud_folder.under_trashed_folder(File.parent_folder_id)
+        )
+        .distinct(File.hash_sha256, File.size)
+        .order_by(File.hash_sha256, File.size)
+    ).all()
+    return {(r.hash_sha256, r.size): r.id for r in rows if (r.hash_sha256, r.size) in contents}
+
+def register_by_content(
+    db: Session,
+    *,
+    owner: User,
+    root_folder: Folder | None,
+    items: list[tuple[tuple[str, ...], int, str]],
+    storage_service: BaseStorageService
+) -> list[UUID | str]:
+    """
+    Creates files at relative paths below `root_folder` from content the user
+    already stores, copying the storage objects server-side.
+
+    `items` are `(relative path, size, sha256)`. Quota is reserved once for
+    the whole batch and everything is created in one commit. A path repeated
+    in `items`, or already holding a live file, fails instead of creating a
+    second file there.
+
+    Returns:
+        Per item, the new file's ID or an error message.
+    """
+    sources = find_content_sources(db, owner_id=owner.id, contents={(sha256, size) for _, size, sha256 in items})
+    source_files = {
+        f.id: f for f in db.query(File).filter(File.id.in_(set(sources.values())))
+    } if sources else {}
+
+    results = [None] * len(items)
+    matched = []
+    seen = set()
+    for index, (relative_path, size, sha256) in enumerate(items):
+        source_id = sources.get((sha256, size))
+        if relative_path in seen:
+            results[index] = "Duplicate file path."
+        elif source_id:
+            matched.append((index, relative_path, source_files[source_id]))
+        else:
+            results[index] = "No stored file has this content."
+        seen.add(relative_path)
+    if not matched:
+        return results
+
+    reservation_id = crud_quota.reserve(db, user_id=owner.id, size=sum(f.size for _, _, f in matched))
+    if not reservation_id:
+        return ["Insufficient storage quota." if r is None else r for r in results]
+
+    folder_ids = crud_folder.ensure_folder_paths(
+        db, owner_id=owner.id, parent_folder=root_folder,
+        relative_paths={relative_path[:-1] for _, relative_path, _ in matched}
+    )
+    taken = _live_file_names(
+        db, owner_id=owner.id,
+        names={(folder_ids[relative_path[:-1]], relative_path[-1]) for _, relative_path, _ in matched}
+    )
+    free = []
+    for index, relative_path, source in matched:
+        if (folder_ids[relative_path[:-1]], relative_path[-1]) in taken:
+            results[index] = "A file already exists at this path."
+        else:
+            free.append((index, relative_path, source))
+
+    copies = crud_bulk.copy_objects(storage_service, [f for _, _, f in free], user_id=str(owner.id))
+    copied = []
+    for (index, relative_path, source), copy in zip(free, copies):
+        if copy:
+            copied.append((index, relative_path, source, copy))
+        else:
+            results[index] = "Could not copy the stored content."
+
+    files_in = [
+        FileCreate(
+            original_name=relative_path[-1],
+            filename=saved_filename,
+            file_path=saved_path,
+            size=source.size,
+            mime_type=source.mime_type,
+            hash_sha256=source.hash_sha256,
+            owner_id=owner.id,
+            parent_folder_id=folder_ids[relative_path[:-1]],
+        )
+        for _, relative_path, source, (saved_path, saved_filename) in copied
+    ]
+    file_ids = crud_file.create_files_batch(db, files_in=files_in, reservation_id=reservation_id)
+    if not files_in:
+        # Drops the folders made for the paths too
+        crud_quota.release_after_failure(db, reservation_id=reservation_id)
+    for (index, _, _, _), file_id in zip(copied, file_ids):
+        results[index] = file_id
+    return results
+
+def _live_file_names(db: Session, *, owner_id: UUID, names: set[tuple[UUID | None, str]]) -> set[tuple[UUID | None, str]]:
+    """The `(parent folder ID, name)` pairs among `names` that hold a live file."""
+    parent_ids = {parent_id for parent_id, _ in names}
+    parent_filter = File.parent_folder_id.in_(parent_ids - {None})
+    if None in parent_ids:
+        parent_filter = parent_filter | File.parent_folder_id.is_(None)
+    rows = db.execute(
+        select(File.parent_folder_id, File.original_name).where(
+            File.owner_id == owner_id,
+            parent_filter,
+            File.original_name.in_({name for _, name in names}),
+            File.deleted_at.is_(None)
+        )
+    ).all()
+    return {(r.parent_folder_id, r.original_name) for r in rows} & names
+
+def _diff_query(owner_id: UUID, root_folder: Folder | None, entries: list[tuple[str, int, str, datetime]]):
+    # Folders below the root with their path relative to it. Trashed subtrees
+    # are kept, with the time they were trashed, so deletions can be told
+    # apart from files that are new on the client.
+    child = aliased(Folder)
+    tree = select(Folder.id, cast(Folder.name, Text).label("rel_path"), Folder.deleted_at.label("trashed_at")).where(
+        Folder.owner_id == owner_id,
+        Folder.parent_folder_id == root_folder.id if root_folder else Folder.parent_folder_id.is_(None)
+    ).cte("tree", recursive=True)
+    tree = tree.union_all(
+        select(child.id, tree.c.rel_path + "/" + child.name, func.coalesce(child.deleted_at, tree.c.trashed_at))
+        .where(child.parent_folder_id == tree.c.id)
+    )
+    in_root = select(
+        File.id, cast(File.original_name, Text).label("path"), File.size, File.hash_sha256, File.updated_at,
+        File.deleted_at.label("trashed_at")
+    ).where(
+        File.owner_id == owner_id,
+        File.parent_folder_id == root_folder.id if root_folder else File.parent_folder_id.is_(None)
+    )
+    in_tree = select(
+        File.id, tree.c.rel_path + "/" + File.original_name, File.size, File.hash_sha256, File.updated_at,
+        func.coalesce(File.deleted_at, tree.c.trashed_at)
+    ).join(tree, File.parent_folder_id == tree.c.id)
+    every = in_root.union_all(in_tree).subquery("every_file")
+    # Every live file (there may be several at one path), or for a path
+    # with none, the most recently trashed
+    ranked = select(
+        every,
+        func.row_number().over(
+            partition_by=every.c.path, order_by=every.c.trashed_at.desc().nulls_first()
+        ).label("path_rank")
+    ).subquery("ranked")
+    remote = select(
+        ranked.c.id, ranked.c.path, ranked.c.size, ranked.c.hash_sha256, ranked.c.updated_at, ranked.c.trashed_at
+    ).where(ranked.c.trashed_at.is_(None) | (ranked.c.path_rank == 1)).subquery("remote")
+
+    local = func.unnest(
+        bindparam("paths", [e[0] for e in entries], type_=ARRAY(Text)),
+        bindparam("sizes", [e[1] for e in entries], type_=ARRAY(BigInteger)),
+        bindparam("hashes", [e[2] for e in entries], type_=ARRAY(Text)),
+        bindparam("mtimes", [e[3] for e in entries], type_=ARRAY(TIMESTAMP(timezone=True))),
+    ).table_valued("path", "size", "sha256", "mtime").render_derived(name="local")
+
+    return select(
+        local.c.path.label("local_path"),
+        local.c.size.label("local_size"),
+        local.c.sha256.label("local_sha256"),
+        local.c.mtime,
+        remote.c.id.label("remote_id"),
+        remote.c.path.label("remote_path"),
+        remote.c.size.label("remote_size"),
+        remote.c.hash_sha256.label("remote_sha256"),
+        remote.c.updated_at,
+        remote.c.trashed_at,
+    ).select_from(local.join(remote, local.c.path == remote.c.path, full=True))
+
+def _remote_file(row) -> dict:
+    return {"path": row.remote_path, "file_id": row.remote_id, "size": row.remote_size, "sha256": row.remote_sha256}
@@ -0,0 +1,201 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, literal, select, text, union_all
+from uuid import UUID
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from app.models import File, Folder
+from app.services.storage_service import BaseStorageService
+from app.core.config import settings
+from . import crud_folder, crud_quota
+
+def list_trash(db: Session, *, owner_id: UUID, skip: int = 0, limit: int = 50) -> tuple[list[dict], bool]:
+    """
+    Lists a user's trashed files and folders, most recently deleted first.
+
+    Only items that were deleted directly show up; the contents of a trashed
+    folder travel with it.
+
+    Returns:
+        A tuple of (items, has_more).
+    """
+    trashed_files = select(
+        literal("file").label("type"),
+        File.id.label("id"),
+        File.original_name.label("name"),
+        File.size.label("size"),
+        File.parent_folder_id.label("parent_folder_id"),
+        File.deleted_at.label("deleted_at"),
+    ).where(File.owner_id == owner_id, File.deleted_at.isnot(None))
+    trashed_folders = select(
+        literal("folder").label("type"),
+        Folder.id.label("id"),
+        Folder.name.label("name"),
+        Folder.total_size.label("size"),
+        Folder.parent_folder_id.label("parent_folder_id"),
+        Folder.deleted_at.label("deleted_at"),
+    ).where(Folder.owner_id == owner_id, Folder.deleted_at.isnot(None))
+
+    trashed = union_all(trashed_files, trashed_folders).subquery()
+    rows = db.execute(
+        select(trashed).order_by(trashed.c.deleted_at.desc(), trashed.c.id).offset(skip).limit(limit + 1)
+    ).all()
+
+    retention = timedelta(days=settings.TRASH_RETENTION_DAYS)
+    items = [{**row._asdict(), "purge_after": row.deleted_at + retention} for row in rows[:limit]]
+    return items, len(rows) > limit
+
+def get_trashed_file(db: Session, *, file_id: UUID, owner_id: UUID) -> File | None:
+    """Fetches a file that was moved to the trash directly."""
+    return db.query(File).filter(File.id == file_id, File.owner_id == owner_id, File.deleted_at.isnot(None)).first()
+
+def get_trashed_folder(db: Session, *, folder_id: UUID, owner_id: UUID) -> Folder | None:
+    """Fetches a folder that was moved to the trash directly."""
+    return db.query(Folder).filter(Folder.id == folder_id, Folder.owner_id == owner_id, Folder.deleted_at.isnot(None)).first()
+
+def _parent_is_live(db: Session, *, parent_folder_id: UUID | None, owner_id: UUID) -> bool:
+    return parent_folder_id is None or crud_folder.get_folder(db, folder_id=parent_folder_id, owner_id=owner_id) is not None
+
+def restore_file(db: Session, *, db_file: File) -> File:
+    """
+    Takes a file out of the trash. If its folder is gone or itself in the
+    trash, the file is restored to the root instead.
+    """
+    if not _parent_is_live(db, parent_folder_id=db_file.parent_folder_id, owner_id=db_file.owner_id):
+        db_file.parent_folder_id = None
+    db_file.deleted_at = None
+    db.add(db_file)
+    crud_folder.adjust_rollups(db, folder_id=db_file.parent_folder_id, size_delta=db_file.size, file_delta=1)
+    db.commit()
+    db.refresh(db_file)
+    return db_file
+
+def restore_folder(db: Session, *, db_folder: Folder) -> Folder:
+    """
+    Takes a folder (and with it, its whole subtree) out of the trash. If its
+    parent is gone or itself in the trash, it is restored to the root instead.
+    Files and folders inside it that were trashed on their own, even by the
+    same bulk delete, stay in the trash and are not part of its rollups.
+    """
+    if not _parent_is_live(db, parent_folder_id=db_folder.parent_folder_id, owner_id=db_folder.owner_id):
+        old_path = db_folder.path
+        new_path = f"/{db_folder.name}"
+        db.query(Folder).filter(Folder.owner_id == db_folder.owner_id, Folder.path.like(f"{old_path}/%")).update(
+            {Folder.path: new_path + func.substr(Folder.path, len(old_path) + 1)},
+            synchronize_session=False
+        )
+        db_folder.path = new_path
+        db_folder.parent_folder_id = None
+    db_folder.deleted_at = None
+    db.add(db_folder)
+    crud_folder.adjust_rollups(
+        db,
+        folder_id=db_folder.parent_folder_id,
+        size_delta=db_folder.total_size,
+        file_delta=db_folder.file_count,
+        folder_delta=db_folder.folder_count + 1,
+    )
+    db.commit()
+    db.refresh(db_folder)
+    return db_folder
+
+def _purge_files(db: Session, *, files: list[File]) -> list[str]:
+    """
+    Deletes a batch of file records and frees their quota, without
+    committing. Returns their storage paths, to delete once committed: a
+    failed commit then leaves the objects in place for the records it kept.
+    """
+    freed = defaultdict(int)
+    for f in files:
+        freed[f.owner_id] += f.size
+    db.query(File).filter(File.id.in_([f.id for f in files])).delete(synchronize_session=False)
+    for owner_id, size in freed.items():
+        crud_quota.record_usage(db, user_id=owner_id, delta=-size)
+    return [f.file_path for f in files]
+
+# Namespace of the advisory locks purgers hold on a folder subtree
+PURGE_LOCK_CLASS = 7310594
+
+def _claim_expired_folder(db: Session, lock_connection, *, cutoff: datetime, skipped: set[UUID]) -> UUID | None:
+    """
+    Finds the oldest expired trashed folder no other purger is working on and
+    takes an advisory lock on it. The lock lives on `lock_connection`, so it
+    holds across the commits made while the subtree is purged in batches.
+    """
+    while True:
+        query = select(Folder.id).where(Folder.deleted_at <= cutoff)
+        if skipped:
+            query = query.where(Folder.id.notin_(skipped))
+        root_id = db.scalar(query.order_by(Folder.deleted_at).limit(1))
+        if root_id is None:
+            return None
+        locked = lock_connection.execute(
+            text("SELECT pg_try_advisory_lock(:class_id, hashtext(:root_id))"),
+            {"class_id": PURGE_LOCK_CLASS, "root_id": str(root_id)},
+        ).scalar()
+        if locked:
+            # Another purger may have finished it between the query and the lock
+            db.commit()
+            if db.scalar(select(Folder.id).where(Folder.id == root_id)):
+                return root_id
+            _release_folder(lock_connection, root_id)
+        skipped.add(root_id)
+
+def _release_folder(lock_connection, root_id: UUID):
+    lock_connection.execute(
+        text("SELECT pg_advisory_unlock(:class_id, hashtext(:root_id))"),
+        {"class_id": PURGE_LOCK_CLASS, "root_id": str(root_id)},
+    )
+
+def purge_expired(db: Session, *, storage_service: BaseStorageService, batch_size: int | None = None) -> dict:
+    """
+    Hard-deletes everything that has been in the trash longer than
+    TRASH_RETENTION_DAYS, committing after every batch. Storage objects are
+    deleted after the commit that removes their records.
+
+    Trashed files are claimed with `FOR UPDATE SKIP LOCKED` and trashed folder
+    subtrees with an advisory lock held until the subtree is gone, so several
+    purgers can run at the same time without stepping on each other.
+
+    Returns:
+        The number of files and folders purged.
+    """
+    batch_size = batch_size or settings.TRASH_PURGE_BATCH_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.TRASH_RETENTION_DAYS)
+    purged_files = 0
+    purged_folders = 0
+
+    # Files that were trashed on their own
+    while True:
+        batch = db.query(File).filter(File.deleted_at <= cutoff).order_by(File.deleted_at).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not batch:
+            break
+        paths = _purge_files(db, files=batch)
+        db.commit()
+        storage_service.delete_many(paths)
+        purged_files += len(paths)
+
+    # Trashed folders take their whole subtree with them
+    skipped = set()
+    with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        while True:
+            root_id = _claim_expired_folder(db, lock_connection, cutoff=cutoff, skipped=skipped)
+            if not root_id:
+                break
+            try:
+                subtree_ids = crud_folder.subtree_folder_ids(root_id)
+                while True:
+                    batch = db.query(File).filter(File.parent_folder_id.in_(subtree_ids)).limit(batch_size).with_for_update(skip_locked=True).all()
+                    if not batch:
+                        break
+                    paths = _purge_files(db, files=batch)
+                    db.commit()
+                    storage_service.delete_many(paths)
+                    purged_files += len(paths)
+                # A single statement, so the parent_folder_id foreign keys are only checked once it's done
+                purged_folders += db.query(Folder).filter(Folder.id.in_(subtree_ids)).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                _release_folder(lock_connection, root_id)
+
+    return {"purged_files": purged_files, "purged_folders": purged_folders}
@@ -1,26 +1,61 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, text
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta
 from pathlib import Path
+import os
 import secrets
+import shutil
 
+from app.core.config import settings
 from app.models.upload_session import UploadSession
 from app.models.user import User
+from app.crud import crud_quota
 
 # Define the path for temporary storage
 # --- FIX: Use the /tmp directory, which is writable in serverless environments ---
 TEMP_STORAGE_PATH = Path("/tmp")
+SESSION_TTL = timedelta(hours=24)
+OPEN_STATUSES = ('pending', 'uploading')
 
-def create_session(db: Session, *, filename: str, total_size: int, owner: User) -> UploadSession:
+class TempStorageFull(Exception):
     """
-    Creates a new upload session.
+    A new session does not fit in temp storage. `retryable` is True when the
+    budget is taken by other in-flight sessions, which will free it again.
+    """
+    def __init__(self, detail: str, *, retryable: bool):
+        super().__init__(detail)
+        self.detail = detail
+        self.retryable = retryable
+
+def create_session(db: Session, *, filename: str, total_size: int, owner: User, reservation_id: UUID | None = None) -> UploadSession:
+    """
+    Creates a new upload session, optionally holding a quota reservation
+    that is settled when the session completes.
+
+    The session's bytes are counted against UPLOAD_TEMP_BUDGET_BYTES together
+    with every other session in flight, and its temp file is preallocated so
+    the disk cannot fill up halfway through the upload.
+
+    Raises:
+        TempStorageFull: If the budget or the disk has no room for the file.
     """
     # Ensure the temporary storage directory exists
     TEMP_STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+
+    if shutil.disk_usage(TEMP_STORAGE_PATH).free - total_size < settings.UPLOAD_TEMP_MIN_FREE_BYTES:
+        raise TempStorageFull("Not enough temporary storage for this upload.", retryable=False)
+    if settings.UPLOAD_TEMP_BUDGET_BYTES:
+        # Serializes concurrent initiates so they can't both squeeze under the budget
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext('upload_temp_budget'))"))
+        if total_size > settings.UPLOAD_TEMP_BUDGET_BYTES:
+            raise TempStorageFull("The file is larger than the temporary storage budget.", retryable=False)
+        if get_temp_bytes_in_flight(db) + total_size > settings.UPLOAD_TEMP_BUDGET_BYTES:
+            raise TempStorageFull("Too many uploads in progress, try again later.", retryable=True)
     
     session_token = secrets.token_urlsafe(32)
     temp_file_path = TEMP_STORAGE_PATH / session_token
-    expires_at = datetime.utcnow() + timedelta(hours=24) # Session expires in 24 hours
+    expires_at = datetime.utcnow() + SESSION_TTL # Session expires in 24 hours
 
     db_session = UploadSession(
         user_id=owner.id,
@@ -28,37 +63,124 @@ def create_session(db: Session, *, filename: str, total_size: int, owner: User)
         filename=filename,
         total_size=total_size,
         temp_file_path=str(temp_file_path),
+        quota_reservation_id=reservation_id,
         expires_at=expires_at
     )
+    _preallocate(temp_file_path, total_size)
     db.add(db_session)
     db.commit()
     db.refresh(db_session)
     return db_session
 
+def _preallocate(path: Path, size: int):
+    """Reserves the blocks for a temp file up front; chunks are then written in place."""
+    try:
+        with open(path, "wb") as f:
+            if size and hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+    except OSError:
+        path.unlink(missing_ok=True)
+        raise TempStorageFull("Not enough temporary storage for this upload.", retryable=False)
+
+def get_temp_bytes_in_flight(db: Session) -> int:
+    """
+    Returns the bytes held in temp storage by sessions that are still open.
+    """
+    return db.query(func.coalesce(func.sum(UploadSession.total_size), 0)).filter(
+        UploadSession.status.in_(OPEN_STATUSES),
+        UploadSession.expires_at > func.now()
+    ).scalar()
+
+def count_open_sessions(db: Session) -> dict[str, int]:
+    """
+    Counts the sessions still in flight, by status.
+    """
+    rows = db.query(UploadSession.status, func.count()).filter(
+        UploadSession.status.in_(OPEN_STATUSES),
+        UploadSession.expires_at > func.now()
+    ).group_by(UploadSession.status).all()
+    return dict(rows)
+
 def get_session_by_token(db: Session, *, token: str, owner_id: UUID) -> UploadSession | None:
     """
     Gets an upload session by its token, ensuring ownership.
     """
     return db.query(UploadSession).filter(
         UploadSession.session_token == token, 
-        UploadSession.user_id == owner_id
+        UploadSession.user_id == owner_id,
+        UploadSession.expires_at > func.now()
     ).first()
 
-def update_session_size(db: Session, *, db_session: UploadSession, chunk_size: int) -> UploadSession:
+def lock_open_session(db: Session, *, token: str, owner_id: UUID) -> UploadSession | None:
     """
-    Updates the uploaded size for a session.
+    Gets an open upload session by its token and locks its row until the next
+    commit, so that only one request can complete it. Returns None if the
+    session doesn't exist, has expired or is no longer open.
     """
-    db_session.uploaded_size += chunk_size
-    db_session.status = "uploading"
-    db.commit()
-    db.refresh(db_session)
-    return db_session
+    return db.query(UploadSession).filter(
+        UploadSession.session_token == token,
+        UploadSession.user_id == owner_id,
+        UploadSession.status.in_(OPEN_STATUSES),
+        UploadSession.expires_at > func.now()
+    ).with_for_update().first()
 
-def complete_session(db: Session, *, db_session: UploadSession) -> UploadSession:
+def advance_session(db: Session, *, db_session: UploadSession, offset: int, chunk_size: int) -> bool:
     """
-    Marks an upload session as completed.
+    Records a chunk written at `offset`, but only if no other request has
+    advanced the session since it was read. Returns False if one has.
     """
-    db_session.status = "completed"
+    updated = db.query(UploadSession).filter(
+        UploadSession.id == db_session.id,
+        UploadSession.uploaded_size == offset
+    ).update(
+        {UploadSession.uploaded_size: offset + chunk_size, UploadSession.status: "uploading"},
+        synchronize_session=False
+    )
     db.commit()
     db.refresh(db_session)
-    return db_session
+    return bool(updated)
+
+def complete_session(db: Session, *, db_session: UploadSession) -> bool:
+    """
+    Marks an upload session as completed if it is still open. The row stays
+    locked until the caller commits, together with the file record, so a
+    session is only ever completed once. Does not commit.
+
+    Returns:
+        False if the session was no longer open.
+    """
+    updated = db.query(UploadSession).filter(
+        UploadSession.id == db_session.id,
+        UploadSession.status.in_(OPEN_STATUSES)
+    ).update({UploadSession.status: "completed"}, synchronize_session=False)
+    return bool(updated)
+
+def reap_expired(db: Session, *, batch_size: int | None = None) -> dict:
+    """
+    Expires open sessions that are past `expires_at`, in batches: their quota
+    reservations are dropped and the rows marked 'expired', then their temp
+    files are removed once that is committed. Rows are claimed with SKIP
+    LOCKED, so several reapers can run at once. Commits after each batch.
+    """
+    batch_size = batch_size or settings.UPLOAD_SESSION_REAP_BATCH_SIZE
+    expired = 0
+    while True:
+        sessions = db.query(UploadSession).filter(
+            UploadSession.status.in_(OPEN_STATUSES),
+            UploadSession.expires_at <= func.now()
+        ).order_by(UploadSession.expires_at).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not sessions:
+            break
+
+        temp_paths = [session.temp_file_path for session in sessions]
+        crud_quota.release_many(db, reservation_ids=[s.quota_reservation_id for s in sessions])
+        db.query(UploadSession).filter(UploadSession.id.in_([s.id for s in sessions])).update(
+            {UploadSession.status: "expired", UploadSession.quota_reservation_id: None}, synchronize_session=False
+        )
+        db.commit()
+        for temp_path in temp_paths:
+            Path(temp_path).unlink(missing_ok=True)
+        expired += len(sessions)
+        if len(sessions) < batch_size:
+            break
+    return {"expired_sessions": expired}
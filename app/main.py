@@ -1,14 +1,42 @@
-from fastapi import FastAPI
+import secrets
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.router import api_router
+from app.core import instrumentation, metrics, tasks
+from app.core.config import settings
+from app.middleware.admission import AdmissionMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.security import SecurityHeadersMiddleware
+from app.services import maintenance
+
+# --- Periodic maintenance jobs ---
+tasks.register_periodic_job("quota-reconcile", settings.QUOTA_RECONCILE_INTERVAL_SECONDS, maintenance.reconcile_quota)
+tasks.register_periodic_job("trash-purge", settings.TRASH_PURGE_INTERVAL_SECONDS, maintenance.purge_trash)
+tasks.register_periodic_job("upload-session-reap", settings.UPLOAD_SESSION_REAP_INTERVAL_SECONDS, maintenance.reap_upload_sessions)
+tasks.register_periodic_job("storage-deletion-reap", settings.STORAGE_DELETE_INTERVAL_SECONDS, maintenance.reap_storage_deletions)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.BACKGROUND_TASKS_ENABLED:
+        tasks.start_periodic_jobs()
+    yield
+    await tasks.stop_periodic_jobs()
 
 # Create the FastAPI app instance
 app = FastAPI(
     title="File Server Management API",
     description="A robust API for managing files, folders, and storage.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+# --- Admission control ---
+# Added first so CORS wraps it, and browsers can read its 429 and 503 responses.
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionMiddleware, shed_retry_after=settings.SHED_RETRY_AFTER_SECONDS)
+
 # --- CORS (Cross-Origin Resource Sharing) Middleware ---
 # This allows your frontend (if it's on a different domain)
 # to communicate with this API.
@@ -28,6 +56,27 @@ app.add_middleware(
     allow_headers=["*"], # Allows all headers
 )
 
+# --- Response pipeline ---
+# All pure ASGI: they only touch the response start message (and, for
+# compression, complete JSON bodies), so streamed downloads pass through as is.
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    )
+if settings.SECURITY_HEADERS_ENABLED:
+    app.add_middleware(SecurityHeadersMiddleware)
+
+# --- Metrics ---
+# Added after CORS so it wraps it, and preflight requests are counted as well.
+if settings.METRICS_ENABLED:
+    app.add_middleware(instrumentation.MetricsMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+    instrumentation.register_collectors()
+
+if settings.SQL_PROFILER_ENABLED:
+    app.add_middleware(instrumentation.SQLProfilerMiddleware)
+
 # Include the main API router
 # All routes defined in api_router will be prefixed with /api/v1
 app.include_router(api_router, prefix="/api/v1")
@@ -39,6 +88,21 @@ async def read_root():
     """
     return {"message": "Welcome to the File Server API!"}
 
+if settings.METRICS_ENABLED and (settings.METRICS_AUTH_TOKEN or settings.METRICS_PUBLIC):
+    @app.get("/metrics", include_in_schema=False)
+    async def read_metrics(request: Request):
+        """
+        Metrics for this process in the Prometheus text format. Requires
+        `Authorization: Bearer <METRICS_AUTH_TOKEN>` when a token is set.
+        """
+        if settings.METRICS_AUTH_TOKEN:
+            supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+            if not secrets.compare_digest(supplied.encode(), settings.METRICS_AUTH_TOKEN.encode()):
+                raise HTTPException(status_code=401, detail="Invalid metrics token.", headers={"WWW-Authenticate": "Bearer"})
+        # The database collectors would stall every request on this worker
+        blocking_samples = await run_in_threadpool(metrics.collect_blocking)
+        return Response(metrics.render(blocking_samples), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 
 
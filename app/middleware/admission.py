@@ -0,0 +1,78 @@
+import json
+
+from app.core import admission, metrics
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying app/core/admission.py to the expensive route
+    classes (upload, download, bulk, auth) before any endpoint code runs.
+
+    A client over its rate or concurrency limit gets 429, and while the
+    process is overloaded every request in these classes gets 503, both
+    with Retry-After. Requests are keyed by the user in a validly signed
+    bearer token, falling back to the client address (see
+    admission.client_address for proxies). The concurrency slot
+    is held until the endpoint returns, streamed responses included.
+    """
+    def __init__(self, app, limiters: dict[str, admission.Limiter] | None = None, shed_retry_after: int = 2):
+        self.app = app
+        self.limiters = admission.build_limiters() if limiters is None else limiters
+        self.shed_retry_after = shed_retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        route_class = admission.classify(scope["method"], path)
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        overload = admission.overload_reason()
+        if overload is not None:
+            metrics.ADMISSION_REJECTED.inc(route_class=route_class.name, reason=overload)
+            await _reject(send, 503, "Server is busy, please retry later.", self.shed_retry_after)
+            return
+
+        limiter = self.limiters[route_class.name]
+        key = _client_key(scope, route_class.key_by)
+        rejected = limiter.acquire(key)
+        if rejected is not None:
+            reason, retry_after = rejected
+            metrics.ADMISSION_REJECTED.inc(route_class=route_class.name, reason=reason)
+            detail = "Too many requests." if reason == "rate" else "Too many requests in progress."
+            await _reject(send, 429, detail, retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(key)
+
+def _client_key(scope, key_by: str) -> str:
+    if key_by == "user":
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    subject = admission.token_subject(token.strip())
+                    if subject is not None:
+                        return f"user:{subject}"
+                break
+    return f"ip:{admission.client_address(scope)}"
+
+async def _reject(send, status: int, detail: str, retry_after: int):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,135 @@
+import gzip
+import importlib
+
+from anyio import to_thread
+
+# Bodies above this are compressed in a worker thread rather than on the event loop
+OFFLOAD_SIZE = 256 * 1024
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing JSON responses with brotli or gzip,
+    whichever the client prefers (brotli only when the optional package is
+    installed; it is imported on the first request that asks for it).
+
+    Only complete JSON bodies of at least `minimum_size` bytes are touched:
+    the response start is held until the first body message, and a response
+    that streams (more than one body message) is passed through as is. Any
+    other response, including stored files whatever their type, is forwarded
+    without waiting.
+    """
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._brotli = None
+        self._brotli_missing = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if not _is_compressible(message):
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            held, start_message = start_message, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                _add_vary(held)
+                await send(held)
+                await send(message)
+                return
+
+            if len(body) > OFFLOAD_SIZE:
+                body = await to_thread.run_sync(self._compress, body, encoding)
+            else:
+                body = self._compress(body, encoding)
+            headers = [
+                (name, value) for name, value in held.get("headers", [])
+                if name.lower() not in (b"content-length", b"etag")
+            ]
+            etag = next((value for name, value in held.get("headers", []) if name.lower() == b"etag"), None)
+            if etag is not None:
+                # The bytes differ from the uncompressed representation
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+            held["headers"] = headers
+            _add_vary(held)
+            await send(held)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _choose_encoding(self, scope) -> str | None:
+        accept = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value
+                break
+        if not accept:
+            return None
+        accepted = set()
+        for item in accept.decode("latin-1").lower().split(","):
+            coding, _, params = item.strip().partition(";")
+            if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(coding.strip())
+        if "br" in accepted and self._load_brotli() is not None:
+            return "br"
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip"
+        return None
+
+    def _load_brotli(self):
+        if self._brotli is None and not self._brotli_missing:
+            try:
+                self._brotli = importlib.import_module("brotli")
+            except ImportError:  # Optional: gzip only
+                self._brotli_missing = True
+        return self._brotli
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return self._brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+def _is_compressible(message) -> bool:
+    if message.get("status", 200) in (204, 304):
+        return False
+    content_type = b""
+    for name, value in message.get("headers", []):
+        name = name.lower()
+        # Stored files (downloads, ranged reads) go out byte for byte, whatever their type
+        if name in (b"content-encoding", b"content-disposition", b"accept-ranges"):
+            return False
+        if name == b"content-type":
+            content_type = value.split(b";", 1)[0].strip().lower()
+    return content_type == b"application/json" or content_type.endswith(b"+json")
+
+def _add_vary(message):
+    headers = list(message.get("headers", []))
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[index] = (name, value + b", Accept-Encoding")
+            break
+    else:
+        headers.append((b"vary", b"Accept-Encoding"))
+    message["headers"] = headers
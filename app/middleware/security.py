@@ -1,17 +1,58 @@
+# Pages that load their assets from a CDN and would break under the API's CSP
+DOCS_PATHS = ("/docs", "/redoc")
 
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        # Content-Security-Policy can be complex to configure.
-        # This is a basic policy. You should tailor it to your needs.
-        response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self'; style-src 'self'; object-src 'none'"
-        # HTTP Strict Transport Security (HSTS)
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-        return response
+# Responses a browser renders as a document, and so the only ones a CSP applies to
+DOCUMENT_TYPES = (b"text/html", b"application/xhtml+xml", b"image/svg+xml")
+
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    # Content-Security-Policy can be complex to configure.
+    # This is a basic policy. You should tailor it to your needs.
+    "Content-Security-Policy": "default-src 'self'; script-src 'self'; style-src 'self'; object-src 'none'",
+    # HTTP Strict Transport Security (HSTS)
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+}
+
+class SecurityHeadersMiddleware:
+    """
+    Pure ASGI middleware adding the security headers to every response.
+    The Content-Security-Policy only goes on documents (HTML, SVG), such as a
+    stored page opened in the browser; JSON and other bodies don't need it.
+
+    The header block is encoded once, at startup, and appended to the
+    response start message; the body passes through untouched, so streamed
+    downloads aren't buffered. Headers the endpoint already set win.
+    """
+    def __init__(self, app, headers: dict[str, str] | None = None, csp_exempt_paths: tuple[str, ...] = DOCS_PATHS):
+        self.app = app
+        headers = SECURITY_HEADERS if headers is None else headers
+        self.raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        self.raw_headers_without_csp = [h for h in self.raw_headers if h[0] != b"content-security-policy"]
+        self.csp_exempt_paths = csp_exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        csp_exempt = scope["path"].startswith(self.csp_exempt_paths)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                raw_headers = self.raw_headers_without_csp
+                if not csp_exempt and _is_document(headers):
+                    raw_headers = self.raw_headers
+                existing = {name.lower() for name, _ in headers}
+                message["headers"] = headers + [(name, value) for name, value in raw_headers if name not in existing]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+def _is_document(headers) -> bool:
+    for name, value in headers:
+        if name.lower() == b"content-type":
+            return value.split(b";", 1)[0].strip().lower() in DOCUMENT_TYPES
+    return False
@@ -5,5 +5,10 @@ from .upload_session import UploadSession
 
 from .user import User
 from .permission import FilePermission
+from .quota import StorageDelta, QuotaReservation
+from .extraction_job import ExtractionJob
+from .file_chunk import FileChunk
+from .delta_upload import DeltaUpload
+from .storage_deletion import PendingStorageDeletion
 
-__all__= ["File", "Folder", "UploadSession", "User", "FilePermission"]
+__all__= ["File", "Folder", "UploadSession", "User", "FilePermission", "StorageDelta", "QuotaReservation", "ExtractionJob", "FileChunk", "DeltaUpload", "PendingStorageDeletion"]
@@ -0,0 +1,26 @@
+import uuid
+from sqlalchemy import Column, String, BigInteger, ForeignKey
+from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from app.core.database import Base
+
+class DeltaUpload(Base):
+    """
+    The chunk recipe of a delta upload. Its upload session stages only the
+    chunks listed in `missing`, packed back to back in the session's temp file.
+    """
+    __tablename__ = "delta_uploads"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    upload_session_id = Column(UUID(as_uuid=True), ForeignKey("upload_sessions.id", ondelete="CASCADE"), nullable=False, unique=True)
+    # The file whose content is replaced, or None to create a new file
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id", ondelete="CASCADE"), nullable=True)
+    parent_folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
+    size = Column(BigInteger, nullable=False)
+    hash_sha256 = Column(String(64), nullable=False)
+    # [[sha256, size], ...] for the whole file, in order
+    chunks = Column(JSONB, nullable=False)
+    # Positions in `chunks` the client has to upload, in order
+    missing = Column(JSONB, nullable=False)
+
+    # Relationships
+    upload_session = relationship("UploadSession")
@@ -0,0 +1,30 @@
+import uuid
+from sqlalchemy import Column, String, Text, Integer, BigInteger, func, ForeignKey
+from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import TIMESTAMP
+from app.core.database import Base
+
+class ExtractionJob(Base):
+    """
+    Expansion of an uploaded zip/tar archive into a folder tree, run in the
+    background. The counters are updated as batches of entries are committed.
+    """
+    __tablename__ = "extraction_jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    source_file_id = Column(UUID(as_uuid=True), ForeignKey("files.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String(50), nullable=False, default='pending')
+    # Known up front for zip archives only; tar archives are read as a stream
+    entries_total = Column(Integer, nullable=True)
+    entries_done = Column(Integer, nullable=False, default=0)
+    entries_skipped = Column(Integer, nullable=False, default=0)
+    bytes_written = Column(BigInteger, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    # Relationships
+    owner = relationship("User")
+    source_file = relationship("File")
@@ -1,6 +1,6 @@
 
 import uuid
-from sqlalchemy import Column, String, Text, BigInteger, Float, Boolean, func, ForeignKey
+from sqlalchemy import Column, String, Text, BigInteger, Float, Boolean, func, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import TIMESTAMP
@@ -15,7 +15,9 @@ class File(Base):
     cloud_path = Column(Text, nullable=True)
     size = Column(BigInteger, nullable=False)
     mime_type = Column(String(255), nullable=False)
-    hash_sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    hash_sha256 = Column(String(64), index=True, nullable=False)
+    # False when the hash was only claimed by the client (batch registration)
+    hash_verified = Column(Boolean, default=True, nullable=False, server_default='t')
     parent_folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id"), nullable=True)
     owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     upload_session_id = Column(UUID(as_uuid=True), ForeignKey("upload_sessions.id"), nullable=True)
@@ -27,6 +29,20 @@ class File(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     deleted_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Everything a user owns, live or trashed (quota, sync, search); owner_id alone uses its prefix
+        Index("ix_files_owner_id_parent_folder_id", "owner_id", "parent_folder_id"),
+        # Subtree walks (archives, moves, purges) find a folder's files without knowing the owner
+        Index("ix_files_parent_folder_id", "parent_folder_id"),
+        # Listings only ever look at live rows
+        Index("ix_files_owner_id_parent_folder_id_live", "owner_id", "parent_folder_id", postgresql_where=text("deleted_at IS NULL")),
+        # Trash listing and the purger only ever look at trashed rows
+        Index("ix_files_owner_id_deleted_at_trashed", "owner_id", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+        Index("ix_files_deleted_at_trashed", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+        # One record per object, so purging a record never deletes another's object
+        Index("ux_files_owner_id_file_path", "owner_id", "file_path", unique=True),
+    )
     
     # Relationships
     owner = relationship("User", back_populates="files")
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Integer, BigInteger, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.database import Base
+
+class FileChunk(Base):
+    """
+    One content-defined chunk of a file uploaded in delta mode: where its
+    bytes sit inside the file's storage object. Together the rows form the
+    per-user chunk index that later delta uploads are matched against.
+    """
+    __tablename__ = "file_chunks"
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    hash_sha256 = Column(String(64), nullable=False)
+    offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_file_chunks_owner_id_hash_sha256", "owner_id", "hash_sha256"),
+    )
+
+    # Relationships
+    file = relationship("File")
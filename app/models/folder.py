@@ -1,6 +1,6 @@
 
 import uuid
-from sqlalchemy import Column, String, Text, func, ForeignKey
+from sqlalchemy import Column, String, Text, BigInteger, Integer, func, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import TIMESTAMP
@@ -13,9 +13,27 @@ class Folder(Base):
     path = Column(Text, nullable=False, index=True)
     parent_folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id"), nullable=True)
     owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    # Subtree rollups, kept up to date by the CRUD layer (see crud_folder.adjust_rollups)
+    total_size = Column(BigInteger, nullable=False, default=0, server_default='0')
+    file_count = Column(Integer, nullable=False, default=0, server_default='0')
+    folder_count = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     deleted_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Everything a user owns, live or trashed (rollup recompute, sync)
+        Index("ix_folders_owner_id_parent_folder_id", "owner_id", "parent_folder_id"),
+        # Recursive subtree walks follow parent_folder_id without knowing the owner
+        Index("ix_folders_parent_folder_id", "parent_folder_id"),
+        # Prefix scans (`path LIKE '/a/b/%'`) whatever the database collation
+        Index("ix_folders_path_pattern", "path", postgresql_ops={"path": "text_pattern_ops"}),
+        # Listings only ever look at live rows
+        Index("ix_folders_owner_id_parent_folder_id_live", "owner_id", "parent_folder_id", postgresql_where=text("deleted_at IS NULL")),
+        # Trash listing and the purger only ever look at trashed rows
+        Index("ix_folders_owner_id_deleted_at_trashed", "owner_id", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+        Index("ix_folders_deleted_at_trashed", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
     
     # Relationships
     owner = relationship("User", back_populates="folders")
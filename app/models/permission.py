@@ -1,6 +1,6 @@
 
 import uuid
-from sqlalchemy import Column, String, func, ForeignKey
+from sqlalchemy import Column, String, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import TIMESTAMP
@@ -15,6 +15,13 @@ class FilePermission(Base):
     granted_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # One grant per file and user; serves access checks for a list of files
+        Index("ux_file_permissions_file_id_user_id", "file_id", "user_id", unique=True),
+        # Serves the "shared with me" listing, which skips expired grants
+        Index("ix_file_permissions_user_id_expires_at", "user_id", "expires_at"),
+    )
     
     # Relationships
     file = relationship("File")
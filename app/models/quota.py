@@ -0,0 +1,40 @@
+
+import uuid
+from sqlalchemy import Column, Integer, BigInteger, func, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import TIMESTAMP
+from app.core.database import Base
+
+class StorageDelta(Base):
+    """
+    Pending changes to a user's `used_storage`, spread over a few shard rows so
+    concurrent uploads by the same user don't queue on a single row lock.
+    Folded back into `users.used_storage` by the quota reconciler.
+
+    Each shard also holds an `allowance`: free quota set aside for it, which
+    reservations draw from without locking the user row.
+    """
+    __tablename__ = "storage_deltas"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    delta = Column(BigInteger, nullable=False, default=0)
+    allowance = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+class QuotaReservation(Base):
+    """
+    Bytes held against a user's quota while an upload is in flight.
+    """
+    __tablename__ = "quota_reservations"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_quota_reservations_user_id_expires_at", "user_id", "expires_at"),
+    )
+
+    # Relationships
+    owner = relationship("User")
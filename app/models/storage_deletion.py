@@ -0,0 +1,20 @@
+import uuid
+from sqlalchemy import Column, String, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import TIMESTAMP
+from app.core.database import Base
+
+class PendingStorageDeletion(Base):
+    """
+    A storage object no record points to any more, kept until `delete_after`
+    so that downloads and delta assemblies already reading it can finish.
+    Removed by the storage deletion reaper.
+    """
+    __tablename__ = "pending_storage_deletions"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    file_path = Column(String(1024), nullable=False)
+    delete_after = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_pending_storage_deletions_delete_after", "delete_after"),
+    )
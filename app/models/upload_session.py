@@ -1,6 +1,6 @@
 
 import uuid
-from sqlalchemy import Column, String, BigInteger, func, ForeignKey
+from sqlalchemy import Column, String, BigInteger, func, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import TIMESTAMP
@@ -16,9 +16,17 @@ class UploadSession(Base):
     uploaded_size = Column(BigInteger, default=0)
     temp_file_path = Column(String, nullable=False)
     status = Column(String(50), default='pending')
+    quota_reservation_id = Column(UUID(as_uuid=True), ForeignKey("quota_reservations.id", ondelete="SET NULL"), nullable=True)
     expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        # The reaper and the temp-storage budget only look at sessions still in flight
+        Index("ix_upload_sessions_open_expires_at", "expires_at", postgresql_where=text("status IN ('pending', 'uploading')")),
+        # Per-status counts and lookups over every session, closed ones included
+        Index("ix_upload_sessions_status_expires_at", "status", "expires_at"),
+    )
     
     # Relationships
     owner = relationship("User")
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List
+from uuid import UUID
+
+class ArchiveRequest(BaseModel):
+    """
+    Schema for downloading a selection of files and folders as one ZIP.
+    """
+    file_ids: List[UUID] = []
+    folder_ids: List[UUID] = []
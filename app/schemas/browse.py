@@ -14,6 +14,9 @@ class BrowseResponse(BaseModel):
     path: str
     owner_id: UUID
     parent_folder_id: Optional[UUID] = None
+    total_size: int = 0
+    file_count: int = 0
+    folder_count: int = 0
     created_at: datetime
     updated_at: datetime
     files: List[File] = []
@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime
+
+class DeltaParams(BaseModel):
+    """
+    How clients must cut files into chunks, see app/services/delta_service.py.
+    """
+    algorithm: str
+    min_size: int
+    avg_size: int
+    max_size: int
+    mask_bits: int
+    gear: List[int]
+
+class DeltaChunk(BaseModel):
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")
+    size: int = Field(..., gt=0)
+
+class DeltaUploadInitiateRequest(BaseModel):
+    """
+    Schema for starting a delta upload: the whole file as a list of chunks.
+
+    With `file_id` the upload replaces that file's content; otherwise a new
+    file named `filename` is created in `parent_folder_id`.
+    """
+    filename: str
+    size: int = Field(..., ge=0)
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")
+    chunks: List[DeltaChunk]
+    parent_folder_id: Optional[UUID] = None
+    file_id: Optional[UUID] = None
+
+class DeltaUploadInitiateResponse(BaseModel):
+    session_token: str
+    expires_at: datetime
+    # Positions in `chunks` to upload to PUT /files/delta/{token}/chunks/{n},
+    # where n counts through this list
+    missing: List[int]
+    missing_size: int
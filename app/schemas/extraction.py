@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from uuid import UUID
+from datetime import datetime
+
+from app.schemas.file import File
+
+class ExtractionJob(BaseModel):
+    """
+    Progress of a background archive extraction.
+    """
+    id: UUID
+    source_file_id: Optional[UUID] = None
+    status: Literal["pending", "running", "completed", "failed"]
+    entries_total: Optional[int] = None
+    entries_done: int
+    entries_skipped: int
+    bytes_written: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class FileUploadResponse(File):
+    """
+    An uploaded file, plus the extraction job if expansion was requested.
+    """
+    extraction_job_id: Optional[UUID] = None
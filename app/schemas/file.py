@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -14,8 +14,37 @@ class FileCreate(FileBase):
     filename: str
     file_path: str
     hash_sha256: str
+    hash_verified: bool = True
     owner_id: UUID
     parent_folder_id: Optional[UUID] = None
+    upload_session_id: Optional[UUID] = None
+
+# --- Schemas for Batch Registration ---
+class FileRegister(FileBase):
+    """
+    An object that is already in storage and needs a file record. The hash is
+    recorded as unverified, since the content is not read.
+    """
+    original_name: str = Field(..., min_length=1, max_length=255)
+    mime_type: str = Field(..., max_length=255)
+    # Informational: the size recorded is the stored object's own
+    size: int = Field(..., ge=0)
+    file_path: str = Field(..., min_length=1, max_length=1024)
+    hash_sha256: str = Field(..., pattern=r"^[0-9a-f]{64}$")
+    parent_folder_id: Optional[UUID] = None
+
+class FileBatchCreateRequest(BaseModel):
+    files: List[FileRegister] = Field(..., min_length=1, max_length=10000)
+
+class FileBatchItemResult(BaseModel):
+    index: int
+    id: Optional[UUID] = None
+    error: Optional[str] = None
+
+class FileBatchCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[FileBatchItemResult]
 
 # --- Schema for Updating (e.g., rename) ---
 class FileUpdate(BaseModel):
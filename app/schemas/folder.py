@@ -26,6 +26,9 @@ class Folder(FolderBase):
     id: UUID
     owner_id: UUID
     path: str
+    total_size: int = 0
+    file_count: int = 0
+    folder_count: int = 0
     created_at: datetime
     updated_at: datetime
 
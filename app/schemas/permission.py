@@ -21,3 +21,27 @@ class Permission(BaseModel):
 
     class Config:
         from_attributes = True
+
+class SharedFile(BaseModel):
+    """
+    A file shared with the current user, with the grant that gives access.
+    """
+    id: UUID
+    original_name: str
+    mime_type: str
+    size: int
+    owner_id: UUID
+    updated_at: datetime
+    permission_type: str
+    granted_by: UUID
+    expires_at: Optional[datetime] = None
+    shared_at: datetime
+
+class SharedFileListResponse(BaseModel):
+    """
+    A page of files shared with the current user.
+    """
+    skip: int
+    limit: int
+    has_more: bool
+    results: List[SharedFile] = []
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from uuid import UUID
+from datetime import datetime
+
+class SearchHit(BaseModel):
+    """
+    A single file or folder matching a search query.
+    """
+    type: Literal["file", "folder"]
+    id: UUID
+    name: str
+    path: str
+    parent_folder_id: Optional[UUID] = None
+    size: Optional[int] = None
+    mime_type: Optional[str] = None
+    updated_at: datetime
+
+class SearchResponse(BaseModel):
+    """
+    A page of search results, best matches first. Pass `next_cursor` back
+    as `cursor` to get the next page; it is None on the last one.
+    `truncated` is set when the query matched more than can be ranked.
+    """
+    query: str
+    limit: int
+    has_more: bool
+    next_cursor: Optional[str] = None
+    truncated: bool = False
+    results: List[SearchHit] = []
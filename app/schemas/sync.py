@@ -0,0 +1,84 @@
+from pydantic import AwareDatetime, BaseModel, Field
+from typing import List, Optional
+from uuid import UUID
+
+# --- Manifest Diff ---
+class SyncManifestEntry(BaseModel):
+    """A file in the client's local tree, with its path relative to the synced folder."""
+    path: str
+    size: int = Field(..., ge=0)
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")
+    mtime: AwareDatetime
+
+class SyncDiffRequest(BaseModel):
+    """
+    Schema for comparing a local tree against a folder (the root when `folder_id` is omitted).
+
+    `last_synced_at` is when the client last finished a sync of this tree.
+    Without it nothing is treated as deleted on either side. Timestamps must
+    carry a UTC offset, as they are compared with the server's.
+    """
+    folder_id: Optional[UUID] = None
+    last_synced_at: Optional[AwareDatetime] = None
+    entries: List[SyncManifestEntry] = Field([], max_length=100000)
+
+class SyncUpload(BaseModel):
+    path: str
+    # The server file the upload replaces, if any
+    file_id: Optional[UUID] = None
+
+class SyncRegister(BaseModel):
+    path: str
+    # A stored file with the same content, see POST /sync/register
+    source_file_id: UUID
+
+class SyncRemoteFile(BaseModel):
+    path: str
+    file_id: UUID
+    size: int
+    sha256: str
+
+class SyncRename(BaseModel):
+    file_id: UUID
+    from_path: str
+    to_path: str
+
+class SyncConflict(BaseModel):
+    path: str
+    file_id: UUID
+
+class SyncDuplicate(BaseModel):
+    path: str
+    file_ids: List[UUID]
+
+class SyncDiffResponse(BaseModel):
+    upload: List[SyncUpload] = []
+    registerable: List[SyncRegister] = []
+    download: List[SyncRemoteFile] = []
+    # Paths to delete from the local tree
+    delete_local: List[str] = []
+    # Server files to move to the trash (the client removed them)
+    delete_remote: List[SyncRemoteFile] = []
+    # Renames the client should apply locally
+    rename_local: List[SyncRename] = []
+    # Renames the client should apply on the server (file moved locally)
+    rename_remote: List[SyncRename] = []
+    # Changed on both sides since the last sync
+    conflicts: List[SyncConflict] = []
+    # Paths holding several server files; left alone until all but one are renamed or trashed
+    duplicates: List[SyncDuplicate] = []
+    unchanged: int = 0
+
+# --- Register By Content ---
+class SyncRegisterItem(BaseModel):
+    path: str
+    size: int = Field(..., ge=0)
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")
+
+class SyncRegisterRequest(BaseModel):
+    """
+    Schema for creating files from content the user already stores, without
+    uploading it again. Missing folders along the paths are created.
+    """
+    folder_id: Optional[UUID] = None
+    files: List[SyncRegisterItem] = Field(..., min_length=1, max_length=10000)
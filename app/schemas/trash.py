@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from uuid import UUID
+from datetime import datetime
+
+class TrashItem(BaseModel):
+    """
+    A file or folder in the trash. For folders, `size` is the subtree size.
+    """
+    type: Literal["file", "folder"]
+    id: UUID
+    name: str
+    size: int
+    parent_folder_id: Optional[UUID] = None
+    deleted_at: datetime
+    purge_after: datetime
+
+class TrashListResponse(BaseModel):
+    """
+    A page of trashed items, most recently deleted first.
+    """
+    skip: int
+    limit: int
+    has_more: bool
+    results: List[TrashItem] = []
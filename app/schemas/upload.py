@@ -11,6 +11,8 @@ class UploadSessionInitiateRequest(BaseModel):
 class UploadSessionInitiateResponse(BaseModel):
     session_token: str
     expires_at: datetime
+    # Expected size of each chunk (except the last) sent to PUT .../chunks/{index}
+    chunk_size: int
 
 # --- Upload Chunk ---
 class UploadChunkResponse(BaseModel):
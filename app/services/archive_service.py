@@ -0,0 +1,119 @@
+import queue
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from app.core.config import settings
+from app.crud.crud_archive import ArchiveEntry
+from app.services.storage_service import BaseStorageService
+
+# Formats that are already compressed; deflating them again only burns CPU
+_COMPRESSED_MIME_PREFIXES = (
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/avif", "image/heic",
+    "video/", "audio/mpeg", "audio/mp4", "audio/aac", "audio/ogg", "audio/flac", "audio/webm",
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-7z-compressed",
+    "application/x-rar-compressed", "application/vnd.rar", "application/x-bzip2", "application/x-xz",
+    "application/zstd", "application/pdf", "application/epub+zip",
+    "application/vnd.openxmlformats-officedocument", "application/vnd.oasis.opendocument",
+)
+
+_DONE = object()
+
+class _ChunkSink:
+    """Write-only file object that collects what ZipFile writes until it is drained."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def compress_type_for(mime_type: str | None) -> int:
+    """Stores already-compressed formats as-is and deflates everything else."""
+    if mime_type and mime_type.startswith(_COMPRESSED_MIME_PREFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def stream_zip(storage_service: BaseStorageService, entries: list[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Yields a ZIP archive of `entries` as it is built, without temporary files.
+
+    The archive is written in streaming form (sizes in data descriptors,
+    ZIP64 where needed). The next ARCHIVE_PREFETCH_FILES objects are read from
+    storage in the background, each buffering at most ARCHIVE_PREFETCH_CHUNKS
+    chunks, so memory stays bounded whatever the archive size.
+    """
+    stop = threading.Event()
+    sink = _ChunkSink()
+    files = iter([e for e in entries if e.file_path is not None])
+    pending = deque()
+
+    def pump(entry: ArchiveEntry, chunks: queue.Queue):
+        def offer(item) -> bool:
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for chunk in storage_service.iter_chunks(entry.file_path, chunk_size=settings.ARCHIVE_CHUNK_SIZE):
+                if not offer(chunk):
+                    return
+            offer(_DONE)
+        except Exception as e:
+            offer(e)
+
+    with ThreadPoolExecutor(max_workers=settings.ARCHIVE_PREFETCH_FILES) as executor:
+        def prefetch():
+            while len(pending) < settings.ARCHIVE_PREFETCH_FILES:
+                entry = next(files, None)
+                if entry is None:
+                    return
+                chunks = queue.Queue(maxsize=settings.ARCHIVE_PREFETCH_CHUNKS)
+                executor.submit(pump, entry, chunks)
+                pending.append((entry, chunks))
+
+        try:
+            with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+                for entry in entries:
+                    if entry.file_path is None:
+                        archive.writestr(_zip_info(entry), b"")
+                        continue
+                    prefetch()
+                    _, chunks = pending.popleft()
+                    info = _zip_info(entry)
+                    with archive.open(info, mode="w", force_zip64=entry.size >= zipfile.ZIP64_LIMIT) as member:
+                        while (chunk := chunks.get()) is not _DONE:
+                            if isinstance(chunk, Exception):
+                                raise chunk
+                            member.write(chunk)
+                            if sink.chunks:
+                                yield sink.drain()
+                    yield sink.drain()
+            yield sink.drain()
+        finally:
+            # Unblocks the prefetch threads if the client went away mid-stream
+            stop.set()
+
+def _zip_info(entry: ArchiveEntry) -> zipfile.ZipInfo:
+    modified = entry.modified.timetuple()[:6] if entry.modified.year >= 1980 else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(entry.name, date_time=modified)
+    if entry.file_path is None:
+        info.external_attr = 0o40755 << 16 | 0x10
+    else:
+        info.external_attr = 0o644 << 16
+        info.compress_type = compress_type_for(entry.mime_type)
+        info.file_size = entry.size
+    return info
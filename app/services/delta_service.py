@@ -0,0 +1,159 @@
+# Content-defined chunking for delta uploads, and reassembly of a file from
+# staged and already stored chunks.
+#
+# Clients cut files with a gear rolling hash: for every byte b,
+#     h = ((h << 1) + GEAR[b]) mod 2**64
+# and a chunk ends after the current byte once it is at least
+# DELTA_CHUNK_MIN_SIZE long and the top log2(DELTA_CHUNK_AVG_SIZE) bits of h
+# are zero, or when it reaches DELTA_CHUNK_MAX_SIZE. h restarts at 0 for every
+# chunk. An edit only moves the boundaries next to it, so the chunks of the
+# unchanged parts of a file hash the same as before.
+
+import hashlib
+from pathlib import Path
+
+from app.core.config import settings
+from app.services.storage_service import BaseStorageService
+
+GEAR = [int.from_bytes(hashlib.sha256(b"gear" + bytes([i])).digest()[:8], "big") for i in range(256)]
+
+_MASK64 = (1 << 64) - 1
+
+def chunking_params() -> dict:
+    """The chunking parameters clients must use, as served by GET /files/delta/params."""
+    return {
+        "algorithm": "gear",
+        "min_size": settings.DELTA_CHUNK_MIN_SIZE,
+        "avg_size": settings.DELTA_CHUNK_AVG_SIZE,
+        "max_size": settings.DELTA_CHUNK_MAX_SIZE,
+        "mask_bits": settings.DELTA_CHUNK_AVG_SIZE.bit_length() - 1,
+        "gear": GEAR,
+    }
+
+def split_chunks(stream, read_size: int = 1024 * 1024):
+    """
+    Reference implementation of the chunker: yields the chunks of a readable
+    binary stream. Pure Python and byte at a time, so meant for tools and
+    checking client implementations rather than bulk work on the server.
+    """
+    min_size, max_size = settings.DELTA_CHUNK_MIN_SIZE, settings.DELTA_CHUNK_MAX_SIZE
+    mask_bits = settings.DELTA_CHUNK_AVG_SIZE.bit_length() - 1
+    mask = ((1 << mask_bits) - 1) << (64 - mask_bits)
+    chunk = bytearray()
+    h = 0
+    while data := stream.read(read_size):
+        start = 0
+        for i, byte in enumerate(data):
+            h = ((h << 1) + GEAR[byte]) & _MASK64
+            length = len(chunk) + i - start + 1
+            if (length >= min_size and not h & mask) or length >= max_size:
+                chunk += data[start:i + 1]
+                yield bytes(chunk)
+                chunk.clear()
+                start = i + 1
+                h = 0
+        chunk += data[start:]
+    if chunk:
+        yield bytes(chunk)
+
+class DeltaError(Exception):
+    """The assembled file doesn't match the declared content."""
+
+def plan_segments(
+    chunks: list[tuple[str, int]],
+    missing: list[int],
+    stored: dict[str, tuple[str, int]]
+) -> list[tuple[str | None, int, int]]:
+    """
+    Turns a chunk recipe into `(file_path, offset, size)` reads, where a
+    file_path of None means the session's temp file, which holds the chunks
+    at the `missing` positions back to back. Chunks repeated within the file
+    are read from wherever they were staged. Reads that continue each other
+    are merged, so an unchanged stretch of a file costs one ranged read
+    however many chunks it spans.
+    """
+    staged = {}
+    staged_offset = 0
+    for position in missing:
+        sha256, size = chunks[position]
+        staged[sha256] = staged_offset
+        staged_offset += size
+
+    segments = []
+    for sha256, size in chunks:
+        if sha256 in staged:
+            source, offset = None, staged[sha256]
+        else:
+            source, offset = stored[sha256]
+        last = segments[-1] if segments else None
+        if last and last[0] == source and last[1] + last[2] == offset:
+            segments[-1] = (source, last[1], last[2] + size)
+        else:
+            segments.append((source, offset, size))
+    return segments
+
+class _SegmentReader:
+    """A file-like view over a list of segments, hashing what it reads."""
+    def __init__(self, storage_service: BaseStorageService, temp_path: Path, segments: list):
+        self.pieces = self._iter_pieces(storage_service, temp_path, segments)
+        self.piece = b""
+        self.position = 0
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    @staticmethod
+    def _iter_pieces(storage_service, temp_path, segments):
+        with open(temp_path, "rb") as staged:
+            for source, offset, size in segments:
+                if source is None:
+                    staged.seek(offset)
+                    remaining = size
+                    while remaining > 0 and (data := staged.read(min(remaining, 1024 * 1024))):
+                        remaining -= len(data)
+                        yield data
+                else:
+                    yield from storage_service.iter_range(source, offset, size)
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        wanted = size
+        while size < 0 or wanted > 0:
+            if self.position >= len(self.piece):
+                self.piece, self.position = next(self.pieces, b""), 0
+                if not self.piece:
+                    break
+            end = len(self.piece) if size < 0 else min(len(self.piece), self.position + wanted)
+            parts.append(self.piece[self.position:end])
+            wanted -= end - self.position
+            self.position = end
+        data = b"".join(parts)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+def assemble(
+    storage_service: BaseStorageService,
+    *,
+    temp_path: Path,
+    segments: list[tuple[str | None, int, int]],
+    user_id: str,
+    filename: str,
+    size: int,
+    hash_sha256: str
+) -> tuple[str, str]:
+    """
+    Streams the segments into a new storage object and checks the result
+    against the declared size and hash.
+
+    Returns:
+        The saved path/key and unique filename.
+
+    Raises:
+        DeltaError: If the content doesn't match; the object is deleted.
+    """
+    reader = _SegmentReader(storage_service, temp_path, segments)
+    saved_path, saved_filename = storage_service.save_stream(reader, user_id=user_id, original_filename=filename)
+    if reader.size != size or reader.digest.hexdigest() != hash_sha256:
+        storage_service.delete(saved_path)
+        raise DeltaError("The assembled file does not match the declared size and hash.")
+    return saved_path, saved_filename
@@ -0,0 +1,245 @@
+# Background expansion of uploaded zip/tar archives into folder trees.
+# Runs outside of any request, so it opens its own session.
+
+import hashlib
+import mimetypes
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from contextlib import closing
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud import crud_extraction, crud_file, crud_folder, crud_quota
+from app.models import ExtractionJob, File
+from app.schemas.file import FileCreate
+from app.services.storage_service import BaseStorageService, get_storage_service
+from app.services.upload_service import split_relative_path
+
+_TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+class ExtractionError(Exception):
+    """The archive is invalid or breaks one of the extraction limits."""
+
+def archive_format(filename: str) -> str | None:
+    """Returns 'zip' or 'tar' for supported archive names, otherwise None."""
+    name = filename.lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith(_TAR_SUFFIXES):
+        return "tar"
+    return None
+
+def _folder_name(filename: str) -> str:
+    """The name of the folder an archive expands into: its name without the archive suffix."""
+    name = filename
+    for suffix in (".zip",) + _TAR_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)] or name
+    return name
+
+def run_extraction(job_id: UUID) -> None:
+    """
+    Expands the archive of an extraction job next to it, into a folder named
+    after the archive. Entries that were committed before a failure are kept.
+    """
+    db = SessionLocal()
+    extractor = None
+    try:
+        job = db.get(ExtractionJob, job_id)
+        if not job or job.status != "pending":
+            return
+        job.status = "running"
+        db.commit()
+        try:
+            source = crud_file.get_file(db, file_id=job.source_file_id, owner_id=job.owner_id)
+            if not source:
+                raise ExtractionError("The archive file no longer exists.")
+            extractor = _Extractor(db, job, get_storage_service(), source)
+            extractor.run()
+            crud_extraction.finish_job(db, db_job=job, status="completed")
+        except Exception as e:
+            db.rollback()
+            if extractor:
+                extractor.discard()
+            print(f"Extraction job {job_id} failed: {e}")
+            message = str(e) if isinstance(e, ExtractionError) else "The archive could not be extracted."
+            crud_extraction.finish_job(db, db_job=job, status="failed", error=message)
+    finally:
+        db.close()
+
+class _LimitedReader:
+    """
+    Wraps an entry's stream, hashing what is read and enforcing the size
+    limits on the bytes actually produced rather than on the declared sizes.
+    """
+    def __init__(self, raw, extractor: "_Extractor", declared_size: int):
+        self.raw = raw
+        self.extractor = extractor
+        self.declared_size = declared_size
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.size += len(data)
+        if self.size > self.declared_size:
+            raise ExtractionError("An archive entry is larger than it declares.")
+        self.digest.update(data)
+        self.extractor.count_bytes(len(data))
+        return data
+
+class _Extractor:
+    def __init__(self, db, job: ExtractionJob, storage_service: BaseStorageService, source: File):
+        self.db = db
+        self.job = job
+        self.storage_service = storage_service
+        self.source = source
+        self.root = (_folder_name(source.original_name),)
+        self.parent_folder = crud_folder.get_folder(
+            db, folder_id=source.parent_folder_id, owner_id=source.owner_id
+        ) if source.parent_folder_id else None
+        self.entries = 0
+        self.expanded_size = 0
+        self.directories = set()
+        # (relative path, saved path, saved filename, size, hash) not yet committed
+        self.pending = []
+        self.reservation_id = None
+
+    def run(self):
+        with closing(self.storage_service.open_stream(self.source.file_path)) as stream:
+            if archive_format(self.source.original_name) == "zip":
+                self._extract_zip(stream)
+            else:
+                self._extract_tar(stream)
+        self.flush()
+
+    def _extract_zip(self, stream):
+        # The zip central directory sits at the end, so it needs a seekable file
+        with tempfile.TemporaryFile() as spooled:
+            if not getattr(stream, "seekable", lambda: False)():
+                shutil.copyfileobj(stream, spooled)
+                spooled.seek(0)
+                stream = spooled
+            try:
+                archive = zipfile.ZipFile(stream)
+            except zipfile.BadZipFile:
+                raise ExtractionError("The file is not a valid zip archive.")
+            with archive:
+                members = [info for info in archive.infolist() if not info.is_dir()]
+                # Reject what the central directory gives away before writing anything
+                if len(archive.infolist()) > settings.EXTRACT_MAX_ENTRIES:
+                    raise ExtractionError("The archive has too many entries.")
+                if sum(info.file_size for info in members) > settings.EXTRACT_MAX_EXPANDED_SIZE:
+                    raise ExtractionError("The archive expands beyond the size limit.")
+                if any(info.file_size > max(info.compress_size, 1) * settings.EXTRACT_MAX_COMPRESSION_RATIO for info in members):
+                    raise ExtractionError("The archive exceeds the compression ratio limit.")
+                self.job.entries_total = len(members)
+                self.db.commit()
+
+                for info in archive.infolist():
+                    self.count_entry()
+                    relative_path = split_relative_path(info.filename)
+                    if info.is_dir():
+                        if relative_path:
+                            self.directories.add(relative_path)
+                        continue
+                    if not relative_path or info.flag_bits & 0x1:
+                        # Encrypted entries can't be read without a password
+                        self.job.entries_skipped += 1
+                        continue
+                    with archive.open(info) as entry:
+                        self.add(relative_path, entry, info.file_size)
+
+    def _extract_tar(self, stream):
+        try:
+            # Stream mode reads members strictly in order, without seeking
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                for member in archive:
+                    self.count_entry()
+                    relative_path = split_relative_path(member.name)
+                    if member.isdir():
+                        if relative_path:
+                            self.directories.add(relative_path)
+                        continue
+                    if not relative_path or not member.isfile():
+                        # Links, devices and the like have no place in the file tree
+                        self.job.entries_skipped += 1
+                        continue
+                    entry = archive.extractfile(member)
+                    self.add(relative_path, entry, member.size)
+        except tarfile.TarError:
+            raise ExtractionError("The file is not a valid tar archive.")
+
+    def add(self, relative_path: tuple[str, ...], entry, declared_size: int):
+        """Writes one entry straight to storage and queues its file record."""
+        reader = _LimitedReader(entry, self, declared_size)
+        saved_path, saved_filename = self.storage_service.save_stream(
+            reader, user_id=str(self.source.owner_id), original_filename=relative_path[-1]
+        )
+        self.pending.append((relative_path, saved_path, saved_filename, reader.size, reader.digest.hexdigest()))
+        if len(self.pending) >= settings.EXTRACT_BATCH_SIZE:
+            self.flush()
+
+    def count_entry(self):
+        self.entries += 1
+        if self.entries > settings.EXTRACT_MAX_ENTRIES:
+            raise ExtractionError("The archive has too many entries.")
+
+    def count_bytes(self, size: int):
+        self.expanded_size += size
+        if self.expanded_size > settings.EXTRACT_MAX_EXPANDED_SIZE:
+            raise ExtractionError("The archive expands beyond the size limit.")
+        if self.expanded_size > max(self.source.size, 1) * settings.EXTRACT_MAX_COMPRESSION_RATIO:
+            raise ExtractionError("The archive exceeds the compression ratio limit.")
+
+    def flush(self):
+        """Creates the folders and file records for the queued entries in one transaction."""
+        batch_size = sum(size for _, _, _, size, _ in self.pending)
+        if self.pending:
+            self.reservation_id = crud_quota.reserve(self.db, user_id=self.source.owner_id, size=batch_size)
+            if not self.reservation_id:
+                raise ExtractionError("Insufficient storage quota.")
+
+        folder_ids = crud_folder.ensure_folder_paths(
+            self.db,
+            owner_id=self.source.owner_id,
+            parent_folder=self.parent_folder,
+            relative_paths={self.root + d for d in self.directories} | {
+                self.root + relative_path[:-1] for relative_path, _, _, _, _ in self.pending
+            },
+        )
+        files_in = [
+            FileCreate(
+                original_name=relative_path[-1],
+                filename=saved_filename,
+                file_path=saved_path,
+                size=size,
+                mime_type=mimetypes.guess_type(relative_path[-1])[0] or "application/octet-stream",
+                hash_sha256=file_hash,
+                owner_id=self.source.owner_id,
+                parent_folder_id=folder_ids[self.root + relative_path[:-1]],
+            )
+            for relative_path, saved_path, saved_filename, size, file_hash in self.pending
+        ]
+        self.job.entries_done += len(files_in)
+        self.job.bytes_written += batch_size
+        self.db.add(self.job)
+        # Commits the folders, the files and the job progress together
+        crud_file.create_files_batch(self.db, files_in=files_in, reservation_id=self.reservation_id)
+        if not files_in:
+            self.db.commit()
+        self.reservation_id = None
+        self.pending = []
+        self.directories = set()
+
+    def discard(self):
+        """Deletes the storage objects and quota hold of entries that were never committed."""
+        self.storage_service.delete_many([saved_path for _, saved_path, _, _, _ in self.pending])
+        self.pending = []
+        if self.reservation_id:
+            crud_quota.release(self.db, reservation_id=self.reservation_id)
+            self.db.commit()
+            self.reservation_id = None
@@ -0,0 +1,38 @@
+# Entry points for periodic maintenance jobs.
+# Each job opens its own session, since it runs outside of any request.
+
+from app.core.database import SessionLocal
+from app.crud import crud_quota, crud_storage_deletion, crud_trash, crud_upload_session
+from app.services.storage_service import get_storage_service
+
+def reconcile_quota() -> dict:
+    """Folds quota deltas into users.used_storage and fixes drift."""
+    db = SessionLocal()
+    try:
+        return crud_quota.reconcile(db)
+    finally:
+        db.close()
+
+def purge_trash() -> dict:
+    """Hard-deletes expired trash, including storage objects, in batches."""
+    db = SessionLocal()
+    try:
+        return crud_trash.purge_expired(db, storage_service=get_storage_service())
+    finally:
+        db.close()
+
+def reap_upload_sessions() -> dict:
+    """Expires abandoned upload sessions, freeing their temp files and quota holds."""
+    db = SessionLocal()
+    try:
+        return crud_upload_session.reap_expired(db)
+    finally:
+        db.close()
+
+def reap_storage_deletions() -> dict:
+    """Deletes replaced storage objects whose grace period is over."""
+    db = SessionLocal()
+    try:
+        return crud_storage_deletion.reap_due(db, storage_service=get_storage_service())
+    finally:
+        db.close()
@@ -0,0 +1,46 @@
+# Resolution of public file links, cached per worker so that popular links
+# don't reach the database on every hit.
+
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.http_cache import file_etag
+from app.core.database import SessionLocal
+from app.crud import crud_file
+from app.services.storage_service import get_storage_service
+
+@dataclass(frozen=True)
+class PublicFile:
+    url: str
+    etag: str
+    updated_at: datetime
+
+_cache: TTLCache[PublicFile] = TTLCache(
+    ttl_seconds=settings.PUBLIC_LINK_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=settings.PUBLIC_LINK_NEGATIVE_CACHE_TTL_SECONDS,
+    max_size=settings.PUBLIC_LINK_CACHE_SIZE,
+)
+
+def resolve_public_file(file_id: UUID) -> PublicFile | None:
+    """Returns where a public file can be fetched, or None if it isn't public."""
+    return _cache.get_or_load(file_id, lambda: _load_public_file(file_id))
+
+def invalidate_public_file(file_id: UUID):
+    """Drops a cached link, or a cached miss, after a file is published, unpublished or deleted."""
+    _cache.invalidate(file_id)
+
+def _load_public_file(file_id: UUID) -> PublicFile | None:
+    db = SessionLocal()
+    try:
+        db_file = crud_file.get_file_by_id(db, file_id=file_id)
+        if not db_file or not db_file.is_public:
+            return None
+        public_url = get_storage_service().get_public_url(file_path=db_file.file_path)
+        if not public_url:
+            return None
+        return PublicFile(url=public_url, etag=file_etag(db_file), updated_at=db_file.updated_at)
+    finally:
+        db.close()
@@ -1,16 +1,93 @@
 
-import boto3
-from botocore.client import Config
-from botocore.exceptions import ClientError
+from functools import lru_cache, wraps
 from pathlib import Path
 import os
+import time
 import uuid
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import UploadFile
 
+from app.core import metrics
 from app.core.config import settings
 
+# Methods timed on every backend, and the operation label they report under
+_TIMED_OPERATIONS = {
+    "save": "save", "save_from_path": "save", "save_stream": "save",
+    "copy": "copy", "delete": "delete", "delete_many": "delete", "get_size": "stat",
+    "get_download_url": "presign", "make_public": "acl", "make_private": "acl",
+}
+_STREAMED_OPERATIONS = {"iter_chunks": "read", "iter_range": "read"}
+
+class _CountingReader:
+    """Passes reads through to a stream, counting the bytes."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.size += len(data)
+        return data
+
+def _instrument(name: str, func):
+    operation = _TIMED_OPERATIONS[name]
+
+    @wraps(func)
+    def timed_call(self, *args, **kwargs):
+        counter, size = None, None
+        if name == "save_stream":
+            # Count the bytes as the backend reads them
+            if args:
+                counter = _CountingReader(args[0])
+                args = (counter,) + args[1:]
+            else:
+                counter = kwargs["stream"] = _CountingReader(kwargs["stream"])
+        elif name == "save":
+            size = getattr(args[0] if args else kwargs.get("file"), "size", None)
+        elif name == "save_from_path":
+            size = os.path.getsize(args[0] if args else kwargs["source_path"])
+        with metrics.timed(metrics.STORAGE_OPERATION_DURATION, "storage", backend=self.backend, operation=operation):
+            result = func(self, *args, **kwargs)
+        if counter is not None:
+            size = counter.size
+        if size:
+            metrics.STORAGE_BYTES.inc(size, backend=self.backend, operation=operation)
+        return result
+    return timed_call
+
+def _instrument_stream(name: str, func):
+    operation = _STREAMED_OPERATIONS[name]
+
+    @wraps(func)
+    def timed_stream(self, *args, **kwargs):
+        # Time to drain the stream, so slow consumers count as well
+        start = time.perf_counter()
+        size = 0
+        try:
+            for chunk in func(self, *args, **kwargs):
+                size += len(chunk)
+                yield chunk
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.STORAGE_OPERATION_DURATION.observe(elapsed, backend=self.backend, operation=operation)
+            metrics.add_request_timing("storage", elapsed)
+            metrics.STORAGE_BYTES.inc(size, backend=self.backend, operation=operation)
+    return timed_stream
+
 class BaseStorageService:
+    # Label for metrics
+    backend = "base"
+
+    def __init_subclass__(cls, **kwargs):
+        """Wraps the backend's storage calls so their latency and bytes are recorded."""
+        super().__init_subclass__(**kwargs)
+        for name, func in list(cls.__dict__.items()):
+            if name in _TIMED_OPERATIONS:
+                setattr(cls, name, _instrument(name, func))
+            elif name in _STREAMED_OPERATIONS:
+                setattr(cls, name, _instrument_stream(name, func))
+
     def save(self, file: UploadFile, user_id: str) -> (str, str):
         """Saves an UploadFile object and returns the saved path/key and a unique filename."""
         raise NotImplementedError
@@ -19,6 +96,38 @@ class BaseStorageService:
         """Saves a file from a local path and returns the saved path/key and a unique filename."""
         raise NotImplementedError
 
+    def save_stream(self, stream, user_id: str, original_filename: str) -> (str, str):
+        """Saves the contents of a readable file object and returns the saved path/key and a unique filename."""
+        raise NotImplementedError
+
+    def open_stream(self, file_path: str):
+        """Opens a stored file for sequential reading."""
+        raise NotImplementedError
+
+    def copy(self, source_path: str, user_id: str, original_filename: str) -> (str, str):
+        """Copies an existing file and returns the new path/key and a unique filename."""
+        raise NotImplementedError
+
+    def iter_chunks(self, file_path: str, chunk_size: int = 1024 * 1024):
+        """Yields the contents of a stored file in chunks."""
+        raise NotImplementedError
+
+    def iter_range(self, file_path: str, offset: int, size: int, chunk_size: int = 1024 * 1024):
+        """Yields `size` bytes of a stored file starting at `offset`, in chunks."""
+        raise NotImplementedError
+
+    def belongs_to(self, file_path: str, user_id: str) -> bool:
+        """Checks that a path/key lies in the given user's storage area."""
+        raise NotImplementedError
+
+    def get_size(self, file_path: str) -> int | None:
+        """Returns the size of a stored file, or None if there is no such file."""
+        raise NotImplementedError
+
+    def get_sizes(self, file_paths: list[str]) -> list[int | None]:
+        """Returns the size of each file, as `get_size`. Backends with slow lookups should override this."""
+        return [self.get_size(file_path) for file_path in file_paths]
+
     def get_download_url(self, file_path: str, filename: str) -> str:
         """Returns a downloadable URL for a file."""
         raise NotImplementedError
@@ -26,15 +135,27 @@ class BaseStorageService:
     def delete(self, file_path: str):
         """Deletes a file."""
         raise NotImplementedError
+
+    def delete_many(self, file_paths: list[str]):
+        """Deletes several files. Backends with a batch API should override this."""
+        for file_path in file_paths:
+            self.delete(file_path)
+
     def make_public(self, file_path: str):
         """Makes a stored object publicly readable."""
         raise NotImplementedError
 
+    def make_private(self, file_path: str):
+        """Revokes public read access to a stored object."""
+        raise NotImplementedError
+
     def get_public_url(self, file_path: str) -> str:
         """Constructs the permanent public URL for an object."""
         raise NotImplementedError
 
 class LocalStorageService(BaseStorageService):
+    backend = "local"
+
     def __init__(self):
         # --- FIX: Use an absolute path based on the project's root directory ---
         self.storage_path = Path.cwd() / "storage" / "local" / "files"
@@ -64,9 +185,74 @@ class LocalStorageService(BaseStorageService):
         # Return the absolute path as a string
         return str(dest_path), saved_filename
 
+    def save_stream(self, stream, user_id: str, original_filename: str) -> (str, str):
+        user_storage_path = self.storage_path / user_id
+        user_storage_path.mkdir(parents=True, exist_ok=True)
+
+        saved_filename = f"{uuid.uuid4()}{Path(original_filename).suffix}"
+        dest_path = user_storage_path / saved_filename
+
+        try:
+            with open(dest_path, "wb") as f:
+                shutil.copyfileobj(stream, f)
+        except Exception:
+            # Don't leave a partial file behind if the source stream fails
+            dest_path.unlink(missing_ok=True)
+            raise
+        return str(dest_path), saved_filename
+
+    def open_stream(self, file_path: str):
+        return open(file_path, "rb")
+
+    def copy(self, source_path: str, user_id: str, original_filename: str) -> (str, str):
+        user_storage_path = self.storage_path / user_id
+        user_storage_path.mkdir(parents=True, exist_ok=True)
+
+        saved_filename = f"{uuid.uuid4()}{Path(original_filename).suffix}"
+        dest_path = user_storage_path / saved_filename
+
+        shutil.copy(source_path, dest_path)
+        return str(dest_path), saved_filename
+
+    def iter_chunks(self, file_path: str, chunk_size: int = 1024 * 1024):
+        with open(file_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def iter_range(self, file_path: str, offset: int, size: int, chunk_size: int = 1024 * 1024):
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            while size > 0 and (chunk := f.read(min(chunk_size, size))):
+                size -= len(chunk)
+                yield chunk
+        if size > 0:
+            raise EOFError(f"{file_path} ends before the requested range.")
+
+    def belongs_to(self, file_path: str, user_id: str) -> bool:
+        # Only the normalized form, so one file can't be named two ways
+        return os.path.normpath(file_path) == file_path and file_path.startswith(f"{self.storage_path / user_id}{os.sep}")
+
+    def get_size(self, file_path: str) -> int | None:
+        try:
+            return os.stat(file_path).st_size if Path(file_path).is_file() else None
+        except OSError:
+            return None
+
     def get_download_url(self, file_path: str, filename: str) -> str:
         return file_path
 
+    def absolute_path(self, file_path: str) -> Path:
+        """
+        The absolute path of a stored file. Older records hold paths relative
+        to the project directory the storage root lives in.
+        """
+        path = Path(file_path)
+        return path if path.is_absolute() else self.storage_path.parents[2] / path
+
+    def relative_path(self, file_path: str) -> str:
+        """The path of a stored file relative to the storage root, with forward slashes."""
+        return self.absolute_path(file_path).relative_to(self.storage_path).as_posix()
+
     def delete(self, file_path: str):
         try:
             if Path(file_path).is_file():
@@ -79,12 +265,25 @@ class LocalStorageService(BaseStorageService):
         print("Warning: 'make_public' is not applicable for local storage.")
         pass
 
+    def make_private(self, file_path: str):
+        # Nothing to revoke, see make_public
+        pass
+
     def get_public_url(self, file_path: str) -> str:
         # No permanent public URL for local files through this service.
         return None
 
 class S3StorageService(BaseStorageService):
+    backend = "s3"
+
     def __init__(self):
+        # boto3/botocore take a large share of the app's import time, so they
+        # are only loaded once S3 storage is actually used (cold starts).
+        import boto3
+        from botocore.client import Config
+        from botocore.exceptions import ClientError
+
+        self.client_error = ClientError
         self.s3_client = boto3.client(
             's3',
             endpoint_url=settings.S3_ENDPOINT_URL,
@@ -106,6 +305,60 @@ class S3StorageService(BaseStorageService):
         source_path.unlink(missing_ok=True) # Clean up temp file
         return file_key, Path(file_key).name
 
+    def save_stream(self, stream, user_id: str, original_filename: str) -> (str, str):
+        file_key = f"{user_id}/{uuid.uuid4()}{Path(original_filename).suffix}"
+        self.s3_client.upload_fileobj(stream, self.bucket_name, file_key)
+        return file_key, Path(file_key).name
+
+    def open_stream(self, file_path: str):
+        return self.s3_client.get_object(Bucket=self.bucket_name, Key=file_path)["Body"]
+
+    def copy(self, source_path: str, user_id: str, original_filename: str) -> (str, str):
+        """Copies server-side with CopyObject, so no bytes pass through the API."""
+        file_key = f"{user_id}/{uuid.uuid4()}{Path(original_filename).suffix}"
+        self.s3_client.copy_object(
+            Bucket=self.bucket_name, Key=file_key,
+            CopySource={'Bucket': self.bucket_name, 'Key': source_path}
+        )
+        return file_key, Path(file_key).name
+
+    def iter_chunks(self, file_path: str, chunk_size: int = 1024 * 1024):
+        body = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_path)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size=chunk_size)
+        finally:
+            body.close()
+
+    def iter_range(self, file_path: str, offset: int, size: int, chunk_size: int = 1024 * 1024):
+        """Reads the range with a single ranged GET."""
+        if size <= 0:
+            return
+        body = self.s3_client.get_object(
+            Bucket=self.bucket_name, Key=file_path, Range=f"bytes={offset}-{offset + size - 1}"
+        )["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size=chunk_size)
+        finally:
+            body.close()
+
+    def belongs_to(self, file_path: str, user_id: str) -> bool:
+        return file_path.startswith(f"{user_id}/") and ".." not in file_path.split("/")
+
+    def get_size(self, file_path: str) -> int | None:
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=file_path)["ContentLength"]
+        except self.client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def get_sizes(self, file_paths: list[str]) -> list[int | None]:
+        """Sends the HEAD requests in parallel."""
+        if not file_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=settings.STORAGE_COPY_CONCURRENCY) as executor:
+            return list(executor.map(self.get_size, file_paths))
+
     def get_download_url(self, file_path: str, filename: str) -> str:
         try:
             url = self.s3_client.generate_presigned_url(
@@ -114,28 +367,50 @@ class S3StorageService(BaseStorageService):
                 ExpiresIn=3600
             )
             return url
-        except ClientError as e:
+        except self.client_error as e:
             print(f"Error generating presigned URL: {e}")
             return None
 
     def delete(self, file_path: str):
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=file_path)
-        except ClientError as e:
+        except self.client_error as e:
             print(f"Error deleting S3 object: {e}")
+
+    def delete_many(self, file_paths: list[str]):
+        """Deletes objects with DeleteObjects, 1000 keys (the S3 limit) per request."""
+        for start in range(0, len(file_paths), 1000):
+            keys = [{'Key': key} for key in file_paths[start:start + 1000]]
+            try:
+                self.s3_client.delete_objects(Bucket=self.bucket_name, Delete={'Objects': keys, 'Quiet': True})
+            except self.client_error as e:
+                print(f"Error deleting S3 objects: {e}")
     def make_public(self, file_path: str):
         """Sets the Access Control List (ACL) of an S3 object to 'public-read'."""
         try:
             self.s3_client.put_object_acl(Bucket=self.bucket_name, Key=file_path, ACL='public-read')
-        except ClientError as e:
+        except self.client_error as e:
             print(f"Error setting public ACL: {e}")
             raise # Re-raise the exception to be handled by the endpoint
 
+    def make_private(self, file_path: str):
+        """Sets the Access Control List (ACL) of an S3 object back to 'private'."""
+        try:
+            self.s3_client.put_object_acl(Bucket=self.bucket_name, Key=file_path, ACL='private')
+        except self.client_error as e:
+            print(f"Error setting private ACL: {e}")
+            raise
+
     def get_public_url(self, file_path: str) -> str:
         """Constructs the permanent public URL for an S3 object."""
         return f"{self.s3_client.meta.endpoint_url}/{self.bucket_name}/{file_path}"
 
+@lru_cache
+def _s3_storage_service() -> S3StorageService:
+    # boto3 clients are thread-safe and costly to create; share one per process
+    return S3StorageService()
+
 def get_storage_service() -> BaseStorageService:
     if settings.STORAGE_TYPE == 's3':
-        return S3StorageService()
+        return _s3_storage_service()
     return LocalStorageService()
\ No newline at end of file
@@ -0,0 +1,47 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.services.storage_service import BaseStorageService
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def split_relative_path(path: str | None) -> tuple[str, ...] | None:
+    """Splits a client-supplied relative path into names, rejecting anything that could escape the parent."""
+    if not path:
+        return None
+    parts = tuple(path.replace("\\", "/").strip("/").split("/"))
+    if any(part in ("", ".", "..") or len(part) > 255 for part in parts):
+        return None
+    return parts
+
+def store_upload(storage_service: BaseStorageService, upload: UploadFile, user_id: str) -> tuple[str, str, str]:
+    """
+    Hashes an uploaded file in fixed-size chunks and writes it to storage.
+    Returns the saved path/key, the unique filename and the SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: upload.file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    upload.file.seek(0)
+    saved_path, saved_filename = storage_service.save(file=upload, user_id=user_id)
+    return saved_path, saved_filename, digest.hexdigest()
+
+def store_uploads(storage_service: BaseStorageService, uploads: list[UploadFile], user_id: str) -> list:
+    """
+    Writes several uploads to storage with at most UPLOAD_WRITE_CONCURRENCY
+    writes in flight. Returns one `store_upload` result per upload, or None
+    where the write failed.
+    """
+    def store_one(upload: UploadFile):
+        try:
+            return store_upload(storage_service, upload, user_id)
+        except Exception as e:
+            print(f"Error writing upload '{upload.filename}' to storage: {e}")
+            return None
+
+    if not uploads:
+        return []
+    with ThreadPoolExecutor(max_workers=settings.UPLOAD_WRITE_CONCURRENCY) as executor:
+        return list(executor.map(store_one, uploads))
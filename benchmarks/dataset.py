@@ -0,0 +1,187 @@
+import sys
+import os
+import argparse
+import hashlib
+import io
+import json
+import random
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.security import get_password_hash
+from app.crud import crud_file, crud_folder, crud_quota
+from app.models.user import User
+from app.schemas.file import FileCreate
+from app.services.storage_service import get_storage_service
+
+# Seeds the configured database and storage backend with a synthetic dataset
+# for benchmarks/run.py, and writes a manifest describing it.
+#
+# Per user, below a "bench" root folder:
+#   tree/      --depth levels of --fanout subfolders, --files-per-folder files each
+#   huge/      --huge-folder-files files in one folder (browse)
+#   deletable/ --deletable-files files consumed by the bulk delete scenario
+#   parking/, uploads/, scratch/  targets for moves, uploads and copies
+#
+# Point it at a throwaway database. For S3, a local stand-in such as MinIO
+# works: STORAGE_TYPE=s3 S3_ENDPOINT_URL=http://127.0.0.1:9000 S3_BUCKET_NAME=bench
+# (the bucket is created if missing).
+#   python benchmarks/dataset.py --users 4 --depth 4 --fanout 4 --out benchmarks/dataset.json
+
+PASSWORD = "bench-password"
+
+def parse_size_distribution(spec: str):
+    """
+    Returns a function drawing file sizes from `spec`:
+    fixed:N, uniform:MIN:MAX or lognormal:MU:SIGMA (of the natural log of the size).
+    """
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: int(values[0])
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.randint(int(values[0]), int(values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: int(rng.lognormvariate(values[0], values[1]))
+    raise ValueError(f"Invalid size distribution: {spec}")
+
+def tree_paths(depth: int, fanout: int) -> list[tuple[str, ...]]:
+    """Every folder path of a full tree, as tuples of names below it."""
+    paths, level = [], [()]
+    for _ in range(depth):
+        level = [path + (f"d{i}",) for path in level for i in range(fanout)]
+        paths.extend(level)
+    return paths
+
+class ContentPool:
+    """Random bytes sliced at random offsets, so content is cheap to make and rarely repeats."""
+    def __init__(self, rng: random.Random, size: int = 8 * 1024 * 1024):
+        self.rng = rng
+        self.data = rng.randbytes(size)
+
+    def take(self, size: int) -> bytes:
+        if size <= len(self.data):
+            offset = self.rng.randrange(0, len(self.data) - size + 1)
+            return self.data[offset:offset + size]
+        return (self.data * (size // len(self.data) + 1))[:size]
+
+def ensure_bucket(storage_service):
+    if settings.STORAGE_TYPE != "s3":
+        return
+    client = storage_service.s3_client
+    try:
+        client.head_bucket(Bucket=storage_service.bucket_name)
+    except Exception:
+        client.create_bucket(Bucket=storage_service.bucket_name)
+
+def seed_user(db, storage_service, *, email: str, password_hash: str, args, rng: random.Random, pool: ContentPool) -> dict:
+    user = User(email=email, password_hash=password_hash, storage_quota=args.quota)
+    db.add(user)
+    db.commit()
+    user_id = user.id
+
+    tree = [("bench", "tree") + path for path in tree_paths(args.depth, args.fanout)]
+    named = {name: ("bench", name) for name in ("tree", "huge", "deletable", "parking", "uploads", "scratch")}
+    folder_ids = crud_folder.ensure_folder_paths(
+        db, owner_id=user_id, parent_folder=None, relative_paths=set(tree) | set(named.values())
+    )
+    db.commit()
+
+    placements = [folder_ids[path] for path in tree for _ in range(args.files_per_folder)]
+    placements += [folder_ids[named["huge"]]] * args.huge_folder_files
+    placements += [folder_ids[named["deletable"]]] * args.deletable_files
+    draw_size = parse_size_distribution(args.size_dist)
+    sizes = [max(1, min(draw_size(rng), args.max_file_size)) for _ in placements]
+
+    def store(index: int) -> FileCreate:
+        data = pool.take(sizes[index])
+        name = f"file-{index}.bin"
+        saved_path, saved_filename = storage_service.save_stream(
+            io.BytesIO(data), user_id=str(user_id), original_filename=name
+        )
+        return FileCreate(
+            original_name=name, filename=saved_filename, file_path=saved_path, size=len(data),
+            mime_type="application/octet-stream", hash_sha256=hashlib.sha256(data).hexdigest(),
+            owner_id=user_id, parent_folder_id=placements[index],
+        )
+
+    file_ids = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for start in range(0, len(placements), args.batch_size):
+            files_in = list(executor.map(store, range(start, min(start + args.batch_size, len(placements)))))
+            reservation_id = crud_quota.reserve(db, user_id=user_id, size=sum(f.size for f in files_in))
+            file_ids += crud_file.create_files_batch(db, files_in=files_in, reservation_id=reservation_id)
+
+    tree_files = len(tree) * args.files_per_folder
+    huge_end = tree_files + args.huge_folder_files
+    sample = rng.sample(range(tree_files), min(tree_files, args.sample_files)) if tree_files else []
+    return {
+        "email": email,
+        "user_id": str(user_id),
+        "folders": {name: str(folder_ids[path]) for name, path in named.items()},
+        # Top-level subtrees of tree/, each holding (fanout^depth - 1)/(fanout - 1) folders
+        "subtrees": [str(folder_ids[("bench", "tree", f"d{i}")]) for i in range(args.fanout)] if args.depth else [],
+        "sample_file_ids": [str(file_ids[i]) for i in sample],
+        "huge_file_ids": [str(file_id) for file_id in file_ids[tree_files:huge_end][:args.sample_files]],
+        "deletable_file_ids": [str(file_id) for file_id in file_ids[huge_end:]],
+        "files": len(file_ids),
+        "bytes": sum(sizes),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic dataset for benchmarks/run.py.")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=4, help="Levels below tree/.")
+    parser.add_argument("--fanout", type=int, default=4, help="Subfolders per folder in tree/.")
+    parser.add_argument("--files-per-folder", type=int, default=3)
+    parser.add_argument("--huge-folder-files", type=int, default=2000)
+    parser.add_argument("--deletable-files", type=int, default=2000)
+    parser.add_argument("--size-dist", default="lognormal:9.7:1.2", help="fixed:N, uniform:MIN:MAX or lognormal:MU:SIGMA.")
+    parser.add_argument("--max-file-size", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--quota", type=int, default=1024 ** 4, help="Storage quota per user, in bytes.")
+    parser.add_argument("--sample-files", type=int, default=500, help="File IDs per user kept for downloads and copies.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tag", default=None, help="Distinguishes this dataset's users; random by default.")
+    parser.add_argument("--workers", type=int, default=16, help="Parallel storage writes.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--out", default="benchmarks/dataset.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pool = ContentPool(rng)
+    tag = args.tag or secrets.token_hex(4)
+    storage_service = get_storage_service()
+    ensure_bucket(storage_service)
+    # One hash for every user: bcrypt is slow by design
+    password_hash = get_password_hash(PASSWORD)
+
+    users = []
+    db = SessionLocal()
+    try:
+        for index in range(args.users):
+            email = f"bench-{tag}-{index}@example.com"
+            users.append(seed_user(
+                db, storage_service, email=email, password_hash=password_hash, args=args, rng=rng, pool=pool
+            ))
+            print(f"Seeded {email}: {users[-1]['files']} files, {users[-1]['bytes']} bytes")
+    finally:
+        db.close()
+
+    manifest = {
+        "tag": tag,
+        "password": PASSWORD,
+        "storage_type": settings.STORAGE_TYPE,
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "workers", "batch_size")},
+        "users": users,
+    }
+    with open(args.out, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+# Drives a running API with the dataset seeded by benchmarks/dataset.py and
+# reports throughput and latency percentiles per scenario as JSON:
+#   uvicorn app.main:app --workers 4 &
+#   python benchmarks/run.py --dataset benchmarks/dataset.json --out results.json
+#   python benchmarks/run.py ... --baseline results.json   (adds the change per metric)
+#
+# Each worker thread keeps its own keep-alive connection and acts as one of
+# the dataset's users in turn. Only the HTTP client runs here; stdlib only.
+# Start the server with ADMISSION_CONTROL_ENABLED=false to measure raw
+# capacity; otherwise requests turned away with 429 or 503 count as errors.
+
+API = "/api/v1"
+
+class Client:
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=300)
+        self.token = None
+
+    def request(self, method: str, path: str, body=None, headers: dict | None = None) -> tuple[int, bytes]:
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            raise
+
+    def form(self, path: str, fields: dict) -> tuple[int, bytes]:
+        return self.request("POST", path, urlencode(fields).encode(), {"Content-Type": "application/x-www-form-urlencoded"})
+
+    def multipart(self, path: str, fields: dict, filename: str, data: bytes) -> tuple[int, bytes]:
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        ]
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + data + b"\r\n"
+        )
+        parts.append(f"--{boundary}--\r\n".encode())
+        return self.request("POST", path, b"".join(parts), {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+def login(client: Client, email: str, password: str) -> tuple[int, bytes]:
+    status, body = client.form(f"{API}/auth/token", {"username": email, "password": password})
+    if status == 200:
+        client.token = json.loads(body)["access_token"]
+    return status, body
+
+class Scenario:
+    """One operation, run repeatedly by every worker. `run` returns True on success."""
+    name = ""
+
+    def __init__(self, manifest: dict, args):
+        self.manifest = manifest
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+
+    def run(self, client: Client, user: dict, worker: int) -> bool:
+        raise NotImplementedError
+
+class Login(Scenario):
+    name = "login"
+
+    def run(self, client, user, worker):
+        token = client.token
+        status, _ = login(client, user["email"], self.manifest["password"])
+        client.token = token
+        return status == 200
+
+class UploadSingle(Scenario):
+    name = "upload_single"
+
+    def __init__(self, manifest, args):
+        super().__init__(manifest, args)
+        self.data = self.rng.randbytes(args.upload_size)
+
+    def run(self, client, user, worker):
+        status, _ = client.multipart(
+            f"{API}/files/upload", {"parent_folder_id": user["folders"]["uploads"]}, f"up-{uuid.uuid4().hex}.bin", self.data
+        )
+        return status == 201
+
+class UploadChunked(Scenario):
+    name = "upload_chunked"
+
+    def __init__(self, manifest, args):
+        super().__init__(manifest, args)
+        self.data = self.rng.randbytes(args.chunked_upload_size)
+
+    def run(self, client, user, worker):
+        status, body = client.request(
+            "POST", f"{API}/files/upload/initiate",
+            {"filename": f"chunked-{uuid.uuid4().hex}.bin", "total_size": len(self.data)}
+        )
+        if status != 200:
+            return False
+        session = json.loads(body)
+        chunk_size = session["chunk_size"]
+        for index, offset in enumerate(range(0, len(self.data), chunk_size)):
+            chunk = self.data[offset:offset + chunk_size]
+            status, _ = client.request(
+                "PUT", f"{API}/files/upload/{session['session_token']}/chunks/{index}", chunk,
+                {"Content-Type": "application/octet-stream"}
+            )
+            if status != 200:
+                return False
+        status, _ = client.form(
+            f"{API}/files/upload/complete",
+            {"session_token": session["session_token"], "parent_folder_id": user["folders"]["uploads"]}
+        )
+        return status == 200
+
+class Download(Scenario):
+    name = "download"
+
+    def run(self, client, user, worker):
+        # With S3 this measures the presigned redirect, not the transfer
+        file_id = self.rng.choice(user["sample_file_ids"])
+        status, _ = client.request("GET", f"{API}/files/{file_id}/download")
+        return status in (200, 302, 307)
+
+class BrowseHuge(Scenario):
+    name = "browse_huge_folder"
+
+    def run(self, client, user, worker):
+        status, _ = client.request("GET", f"{API}/browse/?folder_id={user['folders']['huge']}")
+        return status == 200
+
+class MoveDeep(Scenario):
+    """Moves a whole top-level subtree between tree/ and parking/ and back."""
+    name = "folder_move"
+
+    def run(self, client, user, worker):
+        subtree = user["subtrees"][worker % len(user["subtrees"])]
+        status, body = client.request("GET", f"{API}/folders/{subtree}")
+        if status != 200:
+            return False
+        parking = user["folders"]["parking"]
+        target = user["folders"]["tree"] if json.loads(body)["parent_folder_id"] == parking else parking
+        status, _ = client.request("PUT", f"{API}/folders/{subtree}/move", {"parent_folder_id": target})
+        return status == 200
+
+class RenameDeep(Scenario):
+    name = "folder_rename"
+
+    def run(self, client, user, worker):
+        subtree = user["subtrees"][worker % len(user["subtrees"])]
+        status, _ = client.request("PUT", f"{API}/folders/{subtree}/rename", {"name": f"d-{uuid.uuid4().hex[:8]}"})
+        return status == 200
+
+class BulkCopy(Scenario):
+    name = "bulk_copy"
+
+    def run(self, client, user, worker):
+        file_ids = self.rng.sample(user["huge_file_ids"], min(self.args.bulk_size, len(user["huge_file_ids"])))
+        status, _ = client.request(
+            "POST", f"{API}/bulk/copy", {"file_ids": file_ids, "target_parent_folder_id": user["folders"]["scratch"]}
+        )
+        return status == 200
+
+class BulkDelete(Scenario):
+    """Trashes files from deletable/; stops once they run out."""
+    name = "bulk_delete"
+
+    def __init__(self, manifest, args):
+        super().__init__(manifest, args)
+        self.remaining = {u["email"]: list(u["deletable_file_ids"]) for u in manifest["users"]}
+
+    def run(self, client, user, worker):
+        with self.lock:
+            remaining = self.remaining[user["email"]]
+            file_ids, remaining[:] = remaining[:self.args.bulk_size], remaining[self.args.bulk_size:]
+        if not file_ids:
+            raise StopIteration
+        status, _ = client.request("POST", f"{API}/bulk/delete", {"file_ids": file_ids})
+        return status == 200
+
+SCENARIOS = {s.name: s for s in (
+    Login, UploadSingle, UploadChunked, Download, BrowseHuge, MoveDeep, RenameDeep, BulkCopy, BulkDelete
+)}
+
+def percentile(sorted_values: list[float], fraction: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def run_scenario(scenario: Scenario, manifest: dict, args) -> dict:
+    users = manifest["users"]
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    issued = iter(range(args.requests)) if args.requests else None
+
+    def worker(index: int):
+        nonlocal errors
+        user = users[index % len(users)]
+        client = Client(args.base_url)
+        login(client, user["email"], manifest["password"])
+        while time.monotonic() < deadline:
+            if issued is not None and next(issued, None) is None:
+                break
+            start = time.perf_counter()
+            try:
+                ok = scenario.run(client, user, index // len(users))
+            except StopIteration:
+                break
+            except (http.client.HTTPException, OSError):
+                ok = False
+                client = Client(args.base_url)
+                login(client, user["email"], manifest["password"])
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    as_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput_per_second": round(len(latencies) / wall, 2) if wall else 0,
+        "latency_ms": {
+            "mean": as_ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": as_ms(percentile(latencies, 0.50)),
+            "p95": as_ms(percentile(latencies, 0.95)),
+            "p99": as_ms(percentile(latencies, 0.99)),
+            "max": as_ms(latencies[-1] if latencies else None),
+        },
+    }
+
+def compare(results: dict, baseline: dict) -> dict:
+    """Relative change per metric against a previous run: positive is more throughput or more latency."""
+    changes = {}
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        pairs = [("throughput_per_second", current["throughput_per_second"], previous["throughput_per_second"])]
+        pairs += [(f"{key}_ms", current["latency_ms"][key], previous["latency_ms"][key]) for key in ("p50", "p95", "p99")]
+        changes[name] = {
+            metric: round((now - before) / before, 4) if now is not None and before else None
+            for metric, now, before in pairs
+        }
+    return changes
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API's main endpoints.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--dataset", default="benchmarks/dataset.json")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario.")
+    parser.add_argument("--requests", type=int, default=0, help="Stop a scenario after this many operations.")
+    parser.add_argument("--upload-size", type=int, default=256 * 1024)
+    parser.add_argument("--chunked-upload-size", type=int, default=20 * 1024 * 1024)
+    parser.add_argument("--bulk-size", type=int, default=20, help="Files per bulk copy/delete.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="A previous results file to compare against.")
+    parser.add_argument("--out", help="Write the results here as well as to stdout.")
+    args = parser.parse_args()
+
+    with open(args.dataset) as f:
+        manifest = json.load(f)
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    results = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "base_url": args.base_url,
+            "storage_type": manifest.get("storage_type"),
+            "dataset": manifest.get("params"),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "upload_size": args.upload_size,
+            "chunked_upload_size": args.chunked_upload_size,
+            "bulk_size": args.bulk_size,
+        },
+        "scenarios": {},
+    }
+    for name in names:
+        results["scenarios"][name] = run_scenario(SCENARIOS[name](manifest, args), manifest, args)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["change"] = compare(results, json.load(f))
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
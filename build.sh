@@ -3,7 +3,7 @@ set -o errexit
 # Install dependencies
 pip install -r requirements.txt
 
-# Run database migrations
+# Run database migrations (non-destructive; only pending ones are applied)
 echo "Running database migrations..."
 python scripts/migrate.py
 
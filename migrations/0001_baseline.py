@@ -0,0 +1,11 @@
+"""
+Creates any table that doesn't exist yet from the models, leaving existing
+tables alone. On a fresh database this builds the whole schema, indexes
+included; databases created before migrations existed are brought up to
+date by the migrations that follow.
+"""
+from app.core.database import Base
+import app.models  # noqa: F401 - registers every model on Base.metadata
+
+def upgrade(connection):
+    Base.metadata.create_all(bind=connection, checkfirst=True)
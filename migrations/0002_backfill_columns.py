@@ -0,0 +1,15 @@
+"""
+Adds the columns introduced after the first deploys: `files.is_public` and
+the folder rollups. Rollups added here start at zero; run
+scripts/repair_folder_rollups.py afterwards to fill them in.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text("ALTER TABLE files ADD COLUMN IF NOT EXISTS is_public BOOLEAN NOT NULL DEFAULT FALSE"))
+    connection.execute(text("""
+    ALTER TABLE folders
+        ADD COLUMN IF NOT EXISTS total_size BIGINT NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS file_count INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS folder_count INTEGER NOT NULL DEFAULT 0
+    """))
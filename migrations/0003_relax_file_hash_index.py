@@ -0,0 +1,17 @@
+"""
+Replaces the unique index on files.hash_sha256 with a plain one, so that
+copies and re-uploads of the same content can share a hash.
+"""
+from sqlalchemy import text
+
+from app.core.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    is_unique = connection.execute(text(
+        "SELECT indisunique FROM pg_index WHERE indexrelid = to_regclass('ix_files_hash_sha256')"
+    )).scalar()
+    if is_unique:
+        connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_files_hash_sha256"))
+    create_index_concurrently(connection, "ix_files_hash_sha256", "ON files (hash_sha256)")
@@ -0,0 +1,24 @@
+"""
+Creates the file_permissions indexes used by access checks and the
+"shared with me" listing.
+"""
+from sqlalchemy import text
+
+from app.core.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    # Races in the old grant code could leave duplicate grants; keep the newest
+    connection.execute(text("""
+    DELETE FROM file_permissions p
+    USING file_permissions newer
+    WHERE p.file_id = newer.file_id AND p.user_id = newer.user_id
+      AND (p.created_at, p.id) < (newer.created_at, newer.id)
+    """))
+    create_index_concurrently(
+        connection, "ux_file_permissions_file_id_user_id", "ON file_permissions (file_id, user_id)", unique=True
+    )
+    create_index_concurrently(
+        connection, "ix_file_permissions_user_id_expires_at", "ON file_permissions (user_id, expires_at)"
+    )
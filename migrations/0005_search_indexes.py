@@ -0,0 +1,19 @@
+"""
+Creates the pg_trgm extension and the trigram GIN indexes used by
+GET /files/search. Search still works without them, just with sequential
+scans, so a server that doesn't ship pg_trgm only gets a warning.
+"""
+from sqlalchemy import text
+
+from app.core.migrations import create_index_concurrently, logger
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    available = connection.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar()
+    if not available:
+        logger.warning("pg_trgm is not available on this server; skipping search indexes.")
+        return
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    create_index_concurrently(connection, "ix_files_original_name_trgm", "ON files USING gin (original_name gin_trgm_ops)")
+    create_index_concurrently(connection, "ix_folders_name_trgm", "ON folders USING gin (name gin_trgm_ops)")
@@ -0,0 +1,21 @@
+"""
+Indexes for the hot CRUD queries, as checked by scripts/check_query_plans.py:
+owner and parent lookups on files and folders, recursive subtree walks,
+folder path prefix scans and upload session status scans.
+"""
+from app.core.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("ix_files_owner_id_parent_folder_id", "ON files (owner_id, parent_folder_id)"),
+    ("ix_files_parent_folder_id", "ON files (parent_folder_id)"),
+    ("ix_folders_owner_id_parent_folder_id", "ON folders (owner_id, parent_folder_id)"),
+    ("ix_folders_parent_folder_id", "ON folders (parent_folder_id)"),
+    ("ix_folders_path_pattern", "ON folders (path text_pattern_ops)"),
+    ("ix_upload_sessions_status_expires_at", "ON upload_sessions (status, expires_at)"),
+]
+
+def upgrade(connection):
+    for name, definition in INDEXES:
+        create_index_concurrently(connection, name, definition)
@@ -0,0 +1,13 @@
+"""
+Adds `upload_sessions.quota_reservation_id`, which links an upload in flight
+to the quota it reserved. Sessions opened before it existed have no
+reservation and are left as they are.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text("""
+    ALTER TABLE upload_sessions
+        ADD COLUMN IF NOT EXISTS quota_reservation_id UUID
+            REFERENCES quota_reservations (id) ON DELETE SET NULL
+    """))
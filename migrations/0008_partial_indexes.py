@@ -0,0 +1,27 @@
+"""
+The partial indexes on tables that predate migrations: live and trashed rows
+of files and folders, and upload sessions still in flight. New databases get
+them from the baseline.
+"""
+from app.core.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("ix_files_owner_id_parent_folder_id_live",
+     "ON files (owner_id, parent_folder_id) WHERE deleted_at IS NULL"),
+    ("ix_files_owner_id_deleted_at_trashed",
+     "ON files (owner_id, deleted_at) WHERE deleted_at IS NOT NULL"),
+    ("ix_files_deleted_at_trashed", "ON files (deleted_at) WHERE deleted_at IS NOT NULL"),
+    ("ix_folders_owner_id_parent_folder_id_live",
+     "ON folders (owner_id, parent_folder_id) WHERE deleted_at IS NULL"),
+    ("ix_folders_owner_id_deleted_at_trashed",
+     "ON folders (owner_id, deleted_at) WHERE deleted_at IS NOT NULL"),
+    ("ix_folders_deleted_at_trashed", "ON folders (deleted_at) WHERE deleted_at IS NOT NULL"),
+    ("ix_upload_sessions_open_expires_at",
+     "ON upload_sessions (expires_at) WHERE status IN ('pending', 'uploading')"),
+]
+
+def upgrade(connection):
+    for name, definition in INDEXES:
+        create_index_concurrently(connection, name, definition)
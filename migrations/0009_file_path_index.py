@@ -0,0 +1,10 @@
+"""
+Indexes `files.file_path`, so batch registration can tell cheaply whether an
+object already has a file record.
+"""
+from app.core.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    create_index_concurrently(connection, "ix_files_file_path", "ON files (file_path)")
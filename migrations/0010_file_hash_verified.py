@@ -0,0 +1,9 @@
+"""
+Adds `files.hash_verified`. Every existing record's hash was computed by the
+server, except for batch-registered files, which can't be told apart any
+more and are trusted as before.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text("ALTER TABLE files ADD COLUMN IF NOT EXISTS hash_verified BOOLEAN NOT NULL DEFAULT TRUE"))
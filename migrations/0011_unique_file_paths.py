@@ -0,0 +1,13 @@
+"""
+Makes `(owner_id, file_path)` unique, so two records can never share a
+storage object, and drops the plain path index it replaces.
+"""
+from sqlalchemy import text
+
+from app.core.migrations import create_index_concurrently
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    create_index_concurrently(connection, "ux_files_owner_id_file_path", "ON files (owner_id, file_path)", unique=True)
+    connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_files_file_path"))
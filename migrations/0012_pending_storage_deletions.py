@@ -0,0 +1,8 @@
+"""
+Adds `pending_storage_deletions`, the queue of replaced storage objects
+waiting out their grace period.
+"""
+from app.models.storage_deletion import PendingStorageDeletion
+
+def upgrade(connection):
+    PendingStorageDeletion.__table__.create(bind=connection, checkfirst=True)
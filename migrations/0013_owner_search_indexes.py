@@ -0,0 +1,30 @@
+"""
+Replaces the trigram search indexes with ones that lead with `owner_id`
+(btree_gin) and only cover live rows, so a search only reads the matches of
+the user running it. Without btree_gin the old indexes are kept.
+"""
+from sqlalchemy import text
+
+from app.core.migrations import create_index_concurrently, logger
+
+TRANSACTIONAL = False
+
+def upgrade(connection):
+    available = connection.execute(
+        text("SELECT count(*) FROM pg_available_extensions WHERE name IN ('pg_trgm', 'btree_gin')")
+    ).scalar()
+    if available < 2:
+        logger.warning("pg_trgm or btree_gin is not available on this server; skipping owner search indexes.")
+        return
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gin"))
+    create_index_concurrently(
+        connection, "ix_files_owner_id_original_name_trgm",
+        "ON files USING gin (owner_id, original_name gin_trgm_ops) WHERE deleted_at IS NULL"
+    )
+    create_index_concurrently(
+        connection, "ix_folders_owner_id_name_trgm",
+        "ON folders USING gin (owner_id, name gin_trgm_ops) WHERE deleted_at IS NULL"
+    )
+    connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_files_original_name_trgm"))
+    connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_folders_name_trgm"))
@@ -0,0 +1,9 @@
+"""
+Adds `storage_deltas.allowance`, the free quota each shard can hand out to
+reservations. Starts at zero, so the first reservation of every user fills
+it in.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text("ALTER TABLE storage_deltas ADD COLUMN IF NOT EXISTS allowance BIGINT NOT NULL DEFAULT 0"))
@@ -0,0 +1,110 @@
+import sys
+import os
+import asyncio
+import json
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.security import SECURITY_HEADERS, SecurityHeadersMiddleware
+
+# Compares the response pipeline before and after the move to pure ASGI
+# middlewares, in-process (no sockets), so only the framework and middleware
+# cost is measured:
+#   python scripts/bench_middleware.py [requests] [concurrency]
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """The previous BaseHTTPMiddleware implementation, for comparison."""
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS.items():
+            response.headers[name] = value
+        return response
+
+LISTING = [
+    {"id": f"00000000-0000-0000-0000-{i:012d}", "original_name": f"report-{i}.pdf", "size": 1000 + i,
+     "mime_type": "application/pdf", "created_at": "2024-01-01T00:00:00Z"}
+    for i in range(200)
+]
+
+def build_app(pipeline: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/listing")
+    def listing():
+        return LISTING
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"x" * 65536 for _ in range(16)), media_type="application/octet-stream")
+
+    if pipeline == "before":
+        app.add_middleware(LegacySecurityHeadersMiddleware)
+    else:
+        if pipeline == "after":
+            app.add_middleware(CompressionMiddleware)
+        app.add_middleware(SecurityHeadersMiddleware)
+    return app
+
+async def call(app, path: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", b"gzip, br")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    received = 0
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_done.set()
+
+    await app(scope, receive, send)
+    return received
+
+async def run(app, path: str, total: int, concurrency: int) -> dict:
+    await call(app, path)  # warm up
+    queue = iter(range(total))
+    sizes = []
+
+    async def worker():
+        for _ in queue:
+            sizes.append(await call(app, path))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"requests_per_second": round(total / elapsed, 1), "bytes_per_response": sizes[-1]}
+
+async def main(total: int, concurrency: int):
+    results = {}
+    # "after_uncompressed" isolates the header middleware from the cost of compressing
+    for pipeline in ("before", "after_uncompressed", "after"):
+        app = build_app(pipeline)
+        async with app.router.lifespan_context(app):
+            results[pipeline] = {path: await run(app, path, total, concurrency) for path in ("/listing", "/stream")}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    asyncio.run(main(total, concurrency))
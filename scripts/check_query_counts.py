@@ -0,0 +1,150 @@
+import sys
+import os
+import argparse
+import secrets
+
+from sqlalchemy import text
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from app.core import sql_profiler
+from app.core.database import SessionLocal, get_db, get_engine
+from app.core.security import create_access_token
+from app.main import app
+
+# Checks that the listing and search endpoints run a fixed number of queries
+# however many items they return, i.e. that no per-row lookup (N+1) crept in.
+# A user with a few hundred files and folders is seeded inside one
+# transaction, each endpoint is called through the whole app (middlewares and
+# authentication included) under sql_profiler.assert_max_queries, and
+# everything is rolled back afterwards:
+#   python scripts/check_query_counts.py
+#
+# The budgets cover the authentication lookup as well as the endpoint's own
+# queries. When one is exceeded, the queries it ran are printed by shape.
+
+SEED_SQL = [
+    """
+    INSERT INTO users (id, email, password_hash, role, storage_quota, used_storage)
+    VALUES (gen_random_uuid(), 'query-count-' || :tag || '@example.com', '!', 'user', 1099511627776, 0)
+    """,
+    # :folders folders at the root, the first one holding :folders subfolders
+    """
+    INSERT INTO folders (id, name, path, owner_id, parent_folder_id)
+    SELECT gen_random_uuid(), 'folder-' || n, '/folder-' || n, u.id, NULL
+    FROM users u, generate_series(1, :folders) n
+    WHERE u.email = 'query-count-' || :tag || '@example.com'
+    """,
+    """
+    INSERT INTO folders (id, name, path, owner_id, parent_folder_id)
+    SELECT gen_random_uuid(), 'sub-' || n, p.path || '/sub-' || n, p.owner_id, p.id
+    FROM folders p JOIN users u ON u.id = p.owner_id, generate_series(1, :folders) n
+    WHERE u.email = 'query-count-' || :tag || '@example.com' AND p.name = 'folder-1'
+    """,
+    # :files report files at the root and in every top-level folder; one in five is in the trash
+    """
+    INSERT INTO files (id, filename, original_name, file_path, size, mime_type, hash_sha256,
+                       owner_id, parent_folder_id, deleted_at)
+    SELECT gen_random_uuid(), 'f' || n, 'report-' || n || '.pdf', 'query-count/' || gen_random_uuid(), n * 1024,
+           'application/pdf', md5(random()::text) || md5(random()::text),
+           u.id, p.id, CASE WHEN n % 5 = 0 THEN now() END
+    FROM users u
+    LEFT JOIN folders p ON p.owner_id = u.id AND p.parent_folder_id IS NULL,
+    generate_series(1, :files) n
+    WHERE u.email = 'query-count-' || :tag || '@example.com'
+    """,
+    """
+    INSERT INTO files (id, filename, original_name, file_path, size, mime_type, hash_sha256,
+                       owner_id, parent_folder_id, deleted_at)
+    SELECT gen_random_uuid(), 'f' || n, 'report-' || n || '.pdf', 'query-count/' || gen_random_uuid(), n * 1024,
+           'application/pdf', md5(random()::text) || md5(random()::text),
+           u.id, NULL, CASE WHEN n % 5 = 0 THEN now() END
+    FROM users u, generate_series(1, :files) n
+    WHERE u.email = 'query-count-' || :tag || '@example.com'
+    """,
+    # And a few trashed folders
+    """
+    UPDATE folders SET deleted_at = now()
+    WHERE owner_id = (SELECT id FROM users WHERE email = 'query-count-' || :tag || '@example.com')
+      AND parent_folder_id IS NULL AND name LIKE 'folder-%0'
+    """,
+]
+
+# (name, path, query budget); {folder_id} is a folder with subfolders and files
+CHECKS = [
+    ("browse root", "/api/v1/browse/", 3),
+    ("browse folder", "/api/v1/browse/?folder_id={folder_id}", 4),
+    ("search", "/api/v1/files/search?q=report&limit=200", 3),
+    ("search, next page", "/api/v1/files/search?q=report&limit=200&cursor={cursor}", 3),
+    ("trash", "/api/v1/trash/?limit=200", 2),
+]
+
+def check_query_counts(args) -> bool:
+    tag = secrets.token_hex(4)
+    email = f"query-count-{tag}@example.com"
+    connection = get_engine().connect()
+    transaction = connection.begin()
+
+    def get_test_db():
+        # The endpoints checked only read, so requests join the outer transaction
+        # as is: a savepoint per request would count against every budget
+        db = SessionLocal(bind=connection, join_transaction_mode="rollback_only")
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+    try:
+        for statement in SEED_SQL:
+            connection.execute(text(statement), {"tag": tag, "folders": args.folders, "files": args.files})
+        folder_id = connection.execute(
+            text("SELECT f.id FROM folders f JOIN users u ON u.id = f.owner_id WHERE u.email = :email AND f.name = 'folder-1'"),
+            {"email": email},
+        ).scalar()
+
+        # Not entered as a context manager, so the periodic jobs don't start
+        client = TestClient(app)
+        client.headers["Authorization"] = f"Bearer {create_access_token(email)}"
+        values = {"folder_id": folder_id}
+        ok = True
+        for name, path, budget in CHECKS:
+            if "{cursor}" in path:
+                values["cursor"] = client.get("/api/v1/files/search?q=report&limit=200").json()["next_cursor"]
+            try:
+                with sql_profiler.assert_max_queries(budget) as query_profile:
+                    response = client.get(path.format(**values))
+            except AssertionError as e:
+                ok = False
+                print(f"FAIL  {name}: {e}")
+                continue
+            if response.status_code != 200:
+                ok = False
+                print(f"FAIL  {name}: HTTP {response.status_code} {response.text[:200]}")
+                continue
+            print(f"ok    {name} ({query_profile.count} queries, budget {budget})")
+            if args.verbose:
+                print(query_profile.report())
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        transaction.rollback()
+        connection.close()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the listing and search endpoints stay within their query budgets.")
+    parser.add_argument("--folders", type=int, default=50, help="Top-level folders, and subfolders of the first one.")
+    parser.add_argument("--files", type=int, default=100, help="Files at the root and in every top-level folder.")
+    parser.add_argument("--verbose", action="store_true", help="Print the queries of every request by shape.")
+    args = parser.parse_args()
+
+    if not check_query_counts(args):
+        print("Some endpoints ran more queries than budgeted.")
+        sys.exit(1)
+    print("All endpoints stayed within their query budgets.")
+
+if __name__ == "__main__":
+    main()
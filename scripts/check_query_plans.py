@@ -0,0 +1,241 @@
+import sys
+import os
+import argparse
+import json
+import secrets
+
+from sqlalchemy import event, text
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import SessionLocal, get_engine
+from app.crud import crud_archive, crud_file, crud_folder, crud_permission, crud_trash, crud_upload_session
+from app.models.user import User
+from app.schemas.folder import FolderUpdate
+
+# Checks that the hot CRUD queries are served by indexes. A synthetic dataset
+# is seeded and analyzed inside one transaction, each CRUD function is called
+# for real, and every statement it sends is EXPLAINed; a full scan of one of
+# the big tables (sequential, or of a whole index) fails the check. Everything is rolled back afterwards,
+# commits made by the CRUD layer included.
+#   python scripts/check_query_plans.py --verbose
+#
+# The plans checked are the ones the planner picks for the seeded data, so
+# the dataset has to be large enough for index lookups to pay off; on a small
+# one the planner rightly prefers scanning a few hundred pages (all the more
+# as it guesses recursive CTEs return hundreds of rows). For a quick check on
+# a small dataset, --force-index-plans disables sequential scans, hash joins
+# and merge joins while planning, which asks whether an index *can* serve each
+# lookup instead; a lookup no index fits still shows a full scan:
+#   python scripts/check_query_plans.py --force-index-plans --users 20
+
+# Tables that grow with usage; small lookup tables are fine to scan
+CHECKED_TABLES = {"files", "folders", "file_permissions", "upload_sessions"}
+
+SEED_SQL = [
+    """
+    INSERT INTO users (id, email, password_hash, role, storage_quota, used_storage)
+    SELECT gen_random_uuid(), 'plan-check-' || :tag || '-' || u || '@example.com', '!', 'user', 1099511627776, 0
+    FROM generate_series(1, :users) u
+    """,
+    # :top folders per user, each holding :fanout subfolders
+    """
+    INSERT INTO folders (id, name, path, owner_id, parent_folder_id)
+    SELECT gen_random_uuid(), 't' || t, '/t' || t, u.id, NULL
+    FROM users u, generate_series(1, :top) t
+    WHERE u.email LIKE 'plan-check-' || :tag || '-%'
+    """,
+    """
+    INSERT INTO folders (id, name, path, owner_id, parent_folder_id)
+    SELECT gen_random_uuid(), 'c' || c, p.path || '/c' || c, p.owner_id, p.id
+    FROM folders p JOIN users u ON u.id = p.owner_id, generate_series(1, :fanout) c
+    WHERE u.email LIKE 'plan-check-' || :tag || '-%' AND p.parent_folder_id IS NULL
+    """,
+    # :files files in every folder and at the root; one in twenty is in the trash
+    """
+    INSERT INTO files (id, filename, original_name, file_path, size, mime_type, hash_sha256,
+                       owner_id, parent_folder_id, deleted_at)
+    SELECT gen_random_uuid(), 'f' || n, 'file-' || n || '.bin', 'plan-check/' || gen_random_uuid(), n * 1024,
+           'application/octet-stream', md5(random()::text) || md5(random()::text),
+           x.owner_id, x.folder_id, CASE WHEN n % 20 = 0 THEN now() - interval '1 day' END
+    FROM (
+        SELECT f.owner_id, f.id AS folder_id FROM folders f JOIN users u ON u.id = f.owner_id
+        WHERE u.email LIKE 'plan-check-' || :tag || '-%'
+        UNION ALL
+        SELECT u.id, NULL FROM users u WHERE u.email LIKE 'plan-check-' || :tag || '-%'
+    ) x, generate_series(1, :files) n
+    """,
+    # Each user shares the files at the top of their tree with the next one
+    """
+    INSERT INTO file_permissions (id, file_id, user_id, permission_type, granted_by)
+    SELECT gen_random_uuid(), f.id, next_user.id, 'read', f.owner_id
+    FROM (SELECT id, email, row_number() OVER (ORDER BY email) AS n FROM users
+          WHERE email LIKE 'plan-check-' || :tag || '-%') owner_user
+    JOIN (SELECT id, row_number() OVER (ORDER BY email) AS n, count(*) OVER () AS total FROM users
+          WHERE email LIKE 'plan-check-' || :tag || '-%') next_user ON next_user.n = owner_user.n % next_user.total + 1
+    JOIN files f ON f.owner_id = owner_user.id
+    LEFT JOIN folders parent ON parent.id = f.parent_folder_id
+    WHERE parent.parent_folder_id IS NULL
+    """,
+    # Upload sessions pile up: most are finished or expired, a few are in flight
+    """
+    INSERT INTO upload_sessions (id, user_id, session_token, filename, total_size, uploaded_size,
+                                 temp_file_path, status, expires_at)
+    SELECT gen_random_uuid(), u.id, md5(random()::text) || s, 'upload-' || s, 1048576, 0,
+           '/nonexistent/plan-check/' || s,
+           CASE WHEN s % 50 = 0 THEN 'uploading' WHEN s % 50 = 1 THEN 'pending' WHEN s % 3 = 0 THEN 'expired' ELSE 'completed' END,
+           now() + (s % 100 - 50) * interval '1 hour'
+    FROM users u, generate_series(1, :sessions) s
+    WHERE u.email LIKE 'plan-check-' || :tag || '-%'
+    """,
+]
+
+def sample(db, tag: str) -> dict:
+    """IDs for the scenarios to work on, taken from the seeded dataset."""
+    owner, other = db.query(User).filter(User.email.like(f"plan-check-{tag}-%")).order_by(User.email).limit(2).all()
+    folders = db.execute(text("""
+        SELECT id, parent_folder_id FROM folders WHERE owner_id = :owner_id AND deleted_at IS NULL
+        ORDER BY path LIMIT 2
+    """), {"owner_id": owner.id}).all()
+    top = next(f.id for f in folders if f.parent_folder_id is None)
+    child = next(f.id for f in folders if f.parent_folder_id is not None)
+    file_id = db.execute(text(
+        "SELECT id FROM files WHERE owner_id = :owner_id AND parent_folder_id = :folder_id AND deleted_at IS NULL LIMIT 1"
+    ), {"owner_id": owner.id, "folder_id": child}).scalar()
+    shared_ids = db.execute(text(
+        "SELECT file_id FROM file_permissions WHERE user_id = :user_id LIMIT 5"
+    ), {"user_id": other.id}).scalars().all()
+    token = db.execute(text(
+        "SELECT session_token FROM upload_sessions WHERE user_id = :user_id AND expires_at > now() LIMIT 1"
+    ), {"user_id": owner.id}).scalar()
+    return {"owner": owner, "other": other, "top": top, "child": child, "file_id": file_id,
+            "shared_ids": shared_ids, "token": token}
+
+# (name, callable) pairs; each calls the CRUD layer the way its endpoint does
+SCENARIOS = [
+    ("get file", lambda db, s: crud_file.get_file(db, file_id=s["file_id"], owner_id=s["owner"].id)),
+    ("get folder", lambda db, s: crud_folder.get_folder(db, folder_id=s["child"], owner_id=s["owner"].id)),
+    ("list folder", lambda db, s: crud_folder.get_folder_contents(db, folder_id=s["child"], owner_id=s["owner"].id)),
+    ("list root", lambda db, s: crud_folder.get_folder_contents(db, folder_id=None, owner_id=s["owner"].id)),
+    ("read permission check", lambda db, s: crud_permission.get_readable_file_ids(
+        db, file_ids=s["shared_ids"], user=s["other"])),
+    ("shared with me", lambda db, s: crud_permission.list_shared_with_me(db, user=s["other"])),
+    ("trash listing", lambda db, s: crud_trash.list_trash(db, owner_id=s["owner"].id)),
+    ("archive folder", lambda db, s: crud_archive.get_archive_entries(
+        db, owner_id=s["owner"].id, folder_ids=[s["top"]], file_ids=[])),
+    ("upload session by token", lambda db, s: crud_upload_session.get_session_by_token(
+        db, token=s["token"], owner_id=s["owner"].id)),
+    ("temp bytes in flight", lambda db, s: crud_upload_session.get_temp_bytes_in_flight(db)),
+    ("open upload sessions", lambda db, s: crud_upload_session.count_open_sessions(db)),
+    ("reap upload sessions", lambda db, s: crud_upload_session.reap_expired(db, batch_size=100)),
+    ("rename folder", lambda db, s: crud_folder.rename_folder(
+        db, db_folder=crud_folder.get_folder(db, folder_id=s["top"], owner_id=s["owner"].id),
+        folder_in=FolderUpdate(name="renamed"))),
+    ("move folder", lambda db, s: crud_folder.move_folder(
+        db, db_folder=crud_folder.get_folder(db, folder_id=s["child"], owner_id=s["owner"].id),
+        new_parent_path="", new_parent_id=None)),
+    ("delete folder", lambda db, s: crud_folder.delete_folder(db, folder_id=s["top"], owner_id=s["owner"].id)),
+]
+
+INDEX_SCANS = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+def plan_scans(plan: dict, table: str | None = None) -> list[tuple[str, str, str | None, bool]]:
+    """
+    `(node type, table, index, full)` for every scan in an EXPLAIN (FORMAT JSON)
+    plan. `full` is set for sequential scans and for index scans without an
+    index condition, which walk a whole index just as blindly.
+    """
+    scans = []
+    table = plan.get("Relation Name", table)
+    node = plan["Node Type"]
+    if node == "Seq Scan" or node in INDEX_SCANS:
+        scans.append((node, table, plan.get("Index Name"), node == "Seq Scan" or "Index Cond" not in plan))
+    for child in plan.get("Plans", []):
+        # Only a bitmap index scan takes its table from the node above it
+        scans.extend(plan_scans(child, table if node == "Bitmap Heap Scan" else None))
+    return scans
+
+def explain(connection, statement: str, parameters) -> dict:
+    return connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()[0]["Plan"]
+
+def run_scenario(connection, db, name: str, call, samples: dict, verbose: bool) -> bool:
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if not executemany and verb in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        call(db, samples)
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    ok = True
+    for statement, parameters in statements:
+        scans = plan_scans(explain(connection, statement, parameters))
+        full_scans = [table for _, table, _, full in scans if full and table in CHECKED_TABLES]
+        if full_scans:
+            ok = False
+            print(f"FAIL  {name}: full scan of {', '.join(sorted(set(full_scans)))}")
+            print("      " + " ".join(statement.split())[:400])
+        if verbose:
+            for node, table, index, full in scans:
+                print(f"      {node} on {table}" + (f" using {index}" if index else "") + (" (full)" if full else ""))
+    if ok:
+        print(f"ok    {name} ({len(statements)} statements)")
+    return ok
+
+def check_query_plans(args) -> bool:
+    tag = secrets.token_hex(4)
+    connection = get_engine().connect()
+    transaction = connection.begin()
+    try:
+        params = {"tag": tag, "users": args.users, "top": args.top, "fanout": args.fanout,
+                  "files": args.files_per_folder, "sessions": args.sessions_per_user}
+        for statement in SEED_SQL:
+            connection.execute(text(statement), params)
+        # ANALYZE sees this transaction's own rows; the statistics roll back with it
+        for table in sorted(CHECKED_TABLES) + ["users"]:
+            connection.execute(text(f"ANALYZE {table}"))
+        if args.force_index_plans:
+            for setting in ("enable_seqscan", "enable_hashjoin", "enable_mergejoin"):
+                connection.execute(text(f"SET LOCAL {setting} = off"))
+
+        counts = {table: connection.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+                  for table in sorted(CHECKED_TABLES)}
+        print("Seeded dataset: " + json.dumps(counts))
+
+        # Commits in the CRUD layer only release savepoints of the outer transaction
+        db = SessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            samples = sample(db, tag)
+            results = [run_scenario(connection, db, name, call, samples, args.verbose) for name, call in SCENARIOS]
+        finally:
+            db.close()
+    finally:
+        transaction.rollback()
+        connection.close()
+    return all(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the hot CRUD queries use indexes.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--top", type=int, default=20, help="Top-level folders per user.")
+    parser.add_argument("--fanout", type=int, default=20, help="Subfolders per top-level folder.")
+    parser.add_argument("--files-per-folder", type=int, default=5)
+    parser.add_argument("--sessions-per-user", type=int, default=300)
+    parser.add_argument("--force-index-plans", action="store_true",
+                        help="Disable sequential scans, hash joins and merge joins, and check that an index can serve each lookup.")
+    parser.add_argument("--verbose", action="store_true", help="Print every scan of every plan.")
+    args = parser.parse_args()
+
+    if not check_query_plans(args):
+        print("Some hot queries are not served by an index.")
+        sys.exit(1)
+    print("All hot queries are served by indexes.")
+
+if __name__ == "__main__":
+    main()
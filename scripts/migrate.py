@@ -1,26 +1,43 @@
-
 import sys
 import os
+import argparse
+import logging
 
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.core.database import engine, Base
+from app.core.database import get_engine
+from app.core import migrations
+
+# Applies the pending migrations in migrations/ (see app/core/migrations.py).
+# Never drops anything, so it is safe to run on every deploy:
+#   python scripts/migrate.py            apply everything pending
+#   python scripts/migrate.py --status   list applied and pending migrations
 
-from app.models import user, folder, file, upload_session, permission # Make sure to import all models to register them with SQLAlchemy
 
+def show_status():
+    with get_engine().connect() as connection:
+        applied = migrations.applied_versions(connection)
+        connection.commit()
+    for migration in migrations.discover():
+        state = "applied" if migration.version in applied else "pending"
+        print(f"{state:<8} {migration}")
 
-def create_tables():
+def migrate(target: int | None = None):
     print("Starting database migration...")
-    try:
-        print("Dropping all existing tables (for development purposes)...")
-        Base.metadata.drop_all(bind=engine)
-        print("Creating all tables...")
-        Base.metadata.create_all(bind=engine)
-        
-        print("Tables created successfully!")
-    except Exception as e:
-        print(f"An error occurred during table creation: {e}")
+    applied = migrations.upgrade(target)
+    if applied:
+        print(f"Applied {len(applied)} migration(s).")
+    else:
+        print("Database is up to date.")
 
 if __name__ == "__main__":
-    create_tables()
+    parser = argparse.ArgumentParser(description="Apply pending database migrations.")
+    parser.add_argument("--status", action="store_true", help="List migrations without applying any.")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.status:
+        show_status()
+    else:
+        migrate(args.target)
@@ -0,0 +1,126 @@
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Profiles a cold start the way the serverless entry point (api/index.py)
+# sees it: a fresh interpreter imports the app and serves one request.
+# Reports time-to-first-response and an import-time breakdown, and exits
+# non-zero when the median time-to-first-response is over budget:
+#   python scripts/profile_startup.py --runs 5 --budget-ms 1500
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: import the entry point, then serve GET / in-process
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+from api.index import app
+imported = time.perf_counter()
+
+async def first_request():
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"",
+             "headers": [(b"host", b"cold-start")], "client": ("127.0.0.1", 0), "server": ("cold-start", 80)}
+    status = None
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+    await app(scope, receive, send)
+    return status
+
+status = asyncio.run(first_request())
+print(json.dumps({"status": status, "import_ms": (imported - start) * 1000,
+                  "first_request_ms": (time.perf_counter() - imported) * 1000}))
+"""
+
+def run_once() -> tuple[dict, str]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD], cwd=ROOT, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start failed:\n{result.stderr[-4000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["time_to_first_response_ms"] = wall_ms
+    return timings, result.stderr
+
+def parse_importtime(output: str) -> list[tuple[str, int, int]]:
+    """`(module, self us, cumulative us)` for every line of -X importtime output."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def breakdown(modules: list[tuple[str, int, int]], top: int) -> dict:
+    by_package = {}
+    for name, self_us, _ in modules:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    app_modules = sorted((m for m in modules if m[0].split(".")[0] in ("app", "api")), key=lambda m: -m[1])
+    return {
+        "total_import_ms": round(sum(self_us for _, self_us, _ in modules) / 1000, 1),
+        "by_package_ms": {
+            package: round(us / 1000, 1) for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+        },
+        "slowest_app_modules_ms": {name: round(self_us / 1000, 1) for name, self_us, _ in app_modules[:top]},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the app's cold start.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLD_START_BUDGET_MS", "1500")),
+                        help="Fail when the median time-to-first-response is above this.")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only.")
+    args = parser.parse_args()
+
+    runs, last_importtime = [], ""
+    for _ in range(args.runs):
+        timings, last_importtime = run_once()
+        runs.append(timings)
+
+    median = {key: round(statistics.median(r[key] for r in runs), 1)
+              for key in ("time_to_first_response_ms", "import_ms", "first_request_ms")}
+    report = {
+        "runs": args.runs,
+        "median": median,
+        "budget_ms": args.budget_ms,
+        "within_budget": median["time_to_first_response_ms"] <= args.budget_ms,
+        # From the last run; a single run's breakdown is representative enough
+        "imports": breakdown(parse_importtime(last_importtime), args.top),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Cold start over {args.runs} runs (median):")
+        for key, value in median.items():
+            print(f"  {key:<28} {value:>8.1f} ms")
+        print(f"\nImport time by top-level package (total {report['imports']['total_import_ms']} ms):")
+        for package, ms in report["imports"]["by_package_ms"].items():
+            print(f"  {package:<28} {ms:>8.1f} ms")
+        print("\nSlowest app modules (self time):")
+        for name, ms in report["imports"]["slowest_app_modules_ms"].items():
+            print(f"  {name:<40} {ms:>8.1f} ms")
+        verdict = "within" if report["within_budget"] else "OVER"
+        print(f"\nTime to first response {median['time_to_first_response_ms']} ms is {verdict} the {args.budget_ms:.0f} ms budget.")
+
+    if not report["within_budget"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
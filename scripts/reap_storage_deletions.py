@@ -0,0 +1,18 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.maintenance import reap_storage_deletions
+
+if __name__ == "__main__":
+    # The API runs this periodically on its own; use this script from cron
+    # when BACKGROUND_TASKS_ENABLED is false (e.g. on serverless):
+    # python scripts/reap_storage_deletions.py
+    print("Starting storage deletion reap...")
+    try:
+        summary = reap_storage_deletions()
+        print(f"Storage deletion reap finished: {summary}")
+    except Exception as e:
+        print(f"An error occurred during storage deletion reap: {e}")
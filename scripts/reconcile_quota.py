@@ -0,0 +1,18 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.maintenance import reconcile_quota
+
+if __name__ == "__main__":
+    # The API runs this periodically on its own; use this script from cron
+    # when BACKGROUND_TASKS_ENABLED is false (e.g. on serverless):
+    # python scripts/reconcile_quota.py
+    print("Starting quota reconciliation...")
+    try:
+        summary = reconcile_quota()
+        print(f"Quota reconciliation finished: {summary}")
+    except Exception as e:
+        print(f"An error occurred during quota reconciliation: {e}")
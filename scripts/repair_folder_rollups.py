@@ -0,0 +1,44 @@
+import sys
+import os
+from sqlalchemy import text
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import engine, SessionLocal
+from app.crud import crud_folder
+
+def add_rollup_columns():
+    """
+    Adds the folder rollup columns if they don't exist.
+    This is a non-destructive operation and is safe to run multiple times.
+    """
+    alter_command = text("""
+    ALTER TABLE folders
+        ADD COLUMN IF NOT EXISTS total_size BIGINT NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS file_count INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS folder_count INTEGER NOT NULL DEFAULT 0;
+    """)
+    with engine.connect() as connection:
+        connection.execute(alter_command)
+        connection.commit()
+
+def repair_rollups():
+    """
+    Recomputes every folder's total_size, file_count and folder_count.
+    """
+    print("Starting folder rollup repair...")
+    db = SessionLocal()
+    try:
+        add_rollup_columns()
+        updated = crud_folder.recompute_rollups(db)
+        print(f"Recomputed rollups for {updated} folders.")
+    except Exception as e:
+        print(f"An error occurred during rollup repair: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # Run after the initial backfill and whenever drift is suspected:
+    # python scripts/repair_folder_rollups.py
+    repair_rollups()